@@ -1,31 +1,49 @@
 import os
 import sys
+
+if __name__ == "__main__" and "--tui" in sys.argv[1:]:
+    # Same engine in a curses interface; decided before the Qt imports, so it runs without PySide6
+    from cyphergate_core.cli import main
+    sys.exit(main(["tui"] + [arg for arg in sys.argv[1:] if arg != "--tui"]))
+
 import subprocess
-import requests
-import csv
-import base64
+import shutil
 from plyer import notification
+from cyphergate_core import control
+from cyphergate_core.engine import Engine
+from cyphergate_core.racer import race_report
+from cyphergate_core.sampler import describe
 from PySide6.QtWidgets import (
-    QApplication, QWidget, QVBoxLayout, QTableWidget, QTableWidgetItem,
+    QApplication, QWidget, QVBoxLayout, QTableView, QHeaderView,
     QPushButton, QLabel, QMessageBox, QHBoxLayout, QComboBox, QSystemTrayIcon,
     QMenu, QSizePolicy
 )
 from PySide6.QtGui import QIcon, QAction, QFont
-from PySide6.QtCore import Qt
-import time
+from PySide6.QtCore import Qt, QObject, Signal, QTimer, QLockFile, QFileSystemWatcher, QAbstractTableModel, QAbstractProxyModel, QModelIndex
+from PySide6.QtNetwork import QLocalServer
+import threading
 
-API_URL = "http://www.vpngate.net/api/iphone/"
 VPN_ROOT=os.path.expanduser("~/.config/cyphergate")
-VPN_DIR = os.path.expanduser(f"{VPN_ROOT}/servers")
-CACHE_FILE = os.path.join(f"{VPN_ROOT}/cache", "serverlist.csv")
-COUNTRIES_CONF = os.path.join(f"{VPN_ROOT}","countries.conf")
-os.makedirs(VPN_DIR, exist_ok=True)
-os.makedirs(os.path.dirname(CACHE_FILE), exist_ok=True)
-os.makedirs(os.path.dirname(COUNTRIES_CONF), exist_ok=True)
-
-if not os.path.exists(COUNTRIES_CONF):
-    with open(COUNTRIES_CONF, "w") as f:
-        f.write("# Example:\nJapan\nUnited States\nIndia\nGermany")
+SORT_ORDERS = {
+    "Sort: Best Score": "score",
+    "Sort: Reported Ping": "ping",
+    "Sort: Speed": "speed",
+    "Sort: Measured RTT": "rtt",
+}
+
+STATE_LABELS = {
+    "LAUNCHING": "Starting OpenVPN",
+    "RESOLVE": "Resolving server",
+    "TCP_CONNECT": "Opening TCP connection",
+    "CONNECTING": "Connecting",
+    "WAIT": "Waiting for server",
+    "AUTH": "Authenticating",
+    "GET_CONFIG": "Fetching tunnel config",
+    "ASSIGN_IP": "Assigning IP",
+    "ADD_ROUTES": "Adding routes",
+    "RECONNECTING": "Reconnecting",
+    "EXITING": "Exiting",
+}
 
 if getattr(sys, 'frozen', False):
     APP_DIR = os.path.dirname(sys.executable)
@@ -34,13 +52,274 @@ else:
 
 ICON_PATH = os.path.join(APP_DIR,"Assets","icon.png")
 
+# Race probes run with --dev null and need no root, so they skip pkexec;
+# openvpn usually lives in sbin, which isn't on a regular user's PATH
+RACE_COMMAND = [shutil.which("openvpn", path=os.pathsep.join([os.environ.get("PATH", ""), "/usr/sbin", "/sbin"])) or "openvpn"]
+
+class BackgroundTask(QObject):
+    # Runs a blocking callable on a daemon thread and hands the result back to the UI thread via signals
+    succeeded = Signal(object)
+    failed = Signal(object)
+    finished = Signal()
+
+    def __init__(self, fn, *args, parent=None):
+        super().__init__(parent)
+        self.fn = fn
+        self.args = args
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def run(self):
+        try:
+            result = self.fn(*self.args)
+        except Exception as e:
+            self.failed.emit(e)
+        else:
+            self.succeeded.emit(result)
+        self.finished.emit()
+
+class SessionEvents(QObject):
+    # Marshals Engine callbacks (fired on worker threads) onto the UI thread
+    state_changed = Signal(object, str, str)
+    connected = Signal(object, float)
+    failed = Signal(object, str)
+    exited = Signal(object, object)
+    race_won = Signal(object, object)
+    race_failed = Signal(object)
+    verify_result = Signal(object, object)
+    verify_done = Signal(object)
+    log_event = Signal(object, object)
+    sampled = Signal(object, object)
+    failover = Signal(object, object, object, str)
+
+class ControlServer(QObject):
+    # Serves the local control API (cyphergate_core/control.py) on the UI
+    # thread; connect and disconnect go through the same paths as the buttons
+    def __init__(self, window, name):
+        super().__init__(window)
+        self.window = window
+        self.subscribers = set()
+        self.server = QLocalServer(self)
+        self.server.setSocketOptions(QLocalServer.UserAccessOption)
+        self.server.newConnection.connect(self.on_new_connection)
+        # Only the instance lock holder gets here, so a leftover socket belongs to a crashed instance
+        QLocalServer.removeServer(name)
+        if not self.server.listen(name):
+            # The window works without it; only `cyphergate ctl` and a second launch can't reach it
+            message = f"Control socket unavailable: {self.server.errorString()}"
+            window.engine.log.append(message)
+            window.status_label.setToolTip(message)
+
+    def on_new_connection(self):
+        while self.server.hasPendingConnections():
+            client = self.server.nextPendingConnection()
+            client.readyRead.connect(lambda client=client: self.on_ready_read(client))
+            client.disconnected.connect(lambda client=client: self.on_disconnected(client))
+
+    def on_disconnected(self, client):
+        self.subscribers.discard(client)
+        client.deleteLater()
+
+    def on_ready_read(self, client):
+        while client.canReadLine():
+            try:
+                reply = self.handle(client, control.decode(bytes(client.readLine())))
+            except Exception as e:
+                reply = {"ok": False, "error": str(e)}
+            client.write(control.encode(reply))
+
+    def handle(self, client, request):
+        window, engine = self.window, self.window.engine
+        cmd = request.get("cmd")
+        if cmd == "list":
+            return control.list_reply(engine, request)
+        if cmd == "status":
+            return control.engine_status(engine)
+        if cmd == "subscribe":
+            self.subscribers.add(client)
+            return {"ok": True}
+        if cmd == "show":
+            window.tray_restore()
+            return {"ok": True}
+        if cmd == "disconnect":
+            if not engine.busy() and window.prepare_task is None:
+                return {"ok": False, "error": "not connected"}
+            window.stop_vpn()
+            return {"ok": True}
+        if cmd == "connect":
+            if engine.busy() or window.prepare_task is not None:
+                return {"ok": False, "error": "Disconnect the current VPN session first."}
+            if request.get("server"):
+                server = control.find_server(engine.store, request["server"])
+                if server is None:
+                    return {"ok": False, "error": f"no server {request['server']!r} in the current list"}
+                # Deferred so the reply doesn't wait on an error dialog
+                QTimer.singleShot(0, lambda: window.start_vpn_connection(server))
+                return {"ok": True, "server": control.server_row(server)}
+            country = control.match_country(engine.store, request.get("country") or "")
+            if country is None:
+                return {"ok": False, "error": "give a server, or a country from the list"}
+            window.country_dropdown.setCurrentText(country)
+            QTimer.singleShot(0, window.auto_connect_fastest)
+            return {"ok": True, "country": country}
+        return {"ok": False, "error": f"unknown command {cmd!r}"}
+
+    def publish(self, event):
+        data = control.encode(event)
+        for client in list(self.subscribers):
+            client.write(data)
+
+class ServerTableModel(QAbstractTableModel):
+    # Every record in the store, one row each; the view only asks for the cells it paints
+    COLUMNS = ("Country", "Ping", "RTT", "Speed", "Users")
+    CELLS = (
+        lambda server: server.country,
+        lambda server: server.ping_text,
+        lambda server: server.rtt_text,
+        lambda server: server.speed_text,
+        lambda server: server.users_text,
+    )
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.records = []
+
+    def set_records(self, records):
+        self.beginResetModel()
+        self.records = records
+        self.endResetModel()
+
+    def refresh(self):
+        # Measurements were written into the records in place
+        if self.records:
+            self.dataChanged.emit(self.index(0, 0), self.index(len(self.records) - 1, len(self.COLUMNS) - 1))
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.records)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            return self.CELLS[index.column()](self.records[index.row()])
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.COLUMNS[section]
+        return super().headerData(section, orientation, role)
+
+class CountryProxyModel(QAbstractProxyModel):
+    # One country in one sort order, mapped straight onto the store's prebuilt
+    # index, so switching country or order doesn't walk the whole list
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rows = []
+        self.positions = None
+
+    def setSourceModel(self, model):
+        super().setSourceModel(model)
+        model.modelAboutToBeReset.connect(self.on_source_about_to_reset)
+        model.modelReset.connect(self.endResetModel)
+        model.dataChanged.connect(self.on_source_changed)
+
+    def on_source_about_to_reset(self):
+        self.beginResetModel()
+        self.rows = []
+        self.positions = None
+
+    def on_source_changed(self, top_left, bottom_right, roles=()):
+        if self.rows:
+            self.dataChanged.emit(self.index(0, 0), self.index(len(self.rows) - 1, self.columnCount() - 1))
+
+    def set_view(self, store, country, order):
+        self.beginResetModel()
+        self.rows = store.ids(country, order)
+        self.positions = None
+        self.endResetModel()
+
+    def server(self, row):
+        return self.sourceModel().records[self.rows[row]]
+
+    def mapToSource(self, proxy_index):
+        if not proxy_index.isValid():
+            return QModelIndex()
+        return self.sourceModel().index(self.rows[proxy_index.row()], proxy_index.column())
+
+    def mapFromSource(self, source_index):
+        if not source_index.isValid():
+            return QModelIndex()
+        if self.positions is None:
+            self.positions = {source: row for row, source in enumerate(self.rows)}
+        row = self.positions.get(source_index.row())
+        if row is None:
+            return QModelIndex()
+        return self.index(row, source_index.column())
+
+    def index(self, row, column, parent=QModelIndex()):
+        if parent.isValid() or not (0 <= row < len(self.rows)) or not (0 <= column < self.columnCount()):
+            return QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, index=None):
+        if index is None:
+            return super().parent()  # QObject.parent()
+        return QModelIndex()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() or self.sourceModel() is None else self.sourceModel().columnCount()
+
 class CypherGate(QWidget):
     def __init__(self):
         super().__init__()
         self.setWindowFlag(Qt.FramelessWindowHint)
         self.setWindowTitle("CypherGate")
         self.setGeometry(100, 100, 800, 550)
-        self.vpn_process = None
+        self.session = None
+        self.session_events = SessionEvents(self)
+        self.session_events.state_changed.connect(self.on_session_state)
+        self.session_events.connected.connect(self.on_session_connected)
+        self.session_events.failed.connect(self.on_session_failed)
+        self.session_events.exited.connect(self.on_session_exited)
+        self.session_events.race_won.connect(self.on_race_won)
+        self.session_events.race_failed.connect(self.on_race_failed)
+        self.session_events.verify_result.connect(self.on_verify_result)
+        self.session_events.verify_done.connect(self.on_verify_done)
+        self.session_events.log_event.connect(self.on_log_event)
+        self.session_events.sampled.connect(self.on_sample)
+        self.session_events.failover.connect(self.on_failover)
+        self.race = None
+        self.verification = None
+        self.control = None  # ControlServer, once __main__ has taken the instance lock
+        self.engine = Engine(
+            VPN_ROOT, ["pkexec", "openvpn"], race_command=RACE_COMMAND,
+            race_popen_kwargs={"stdout": subprocess.DEVNULL, "stderr": subprocess.DEVNULL},
+            kill=lambda process: subprocess.run(["pkexec", "kill", str(process.pid)])
+        )
+        events = self.session_events
+        self.engine.on_state = events.state_changed.emit
+        self.engine.on_connected = events.connected.emit
+        self.engine.on_failed = events.failed.emit
+        self.engine.on_exit = events.exited.emit
+        self.engine.on_race_won = events.race_won.emit
+        self.engine.on_race_failed = events.race_failed.emit
+        self.engine.on_log_event = events.log_event.emit
+        self.engine.on_sample = events.sampled.emit
+        self.engine.on_failover = events.failover.emit
+        self.server_model = ServerTableModel(self)
+        self.server_view = CountryProxyModel(self)
+        self.server_view.setSourceModel(self.server_model)
+        self.fetch_task = None
+        self.probe_task = None
+        self.prepare_task = None
+        self.from_cache = False
 
         self.setStyleSheet("""
             QWidget {
@@ -64,7 +343,7 @@ class CypherGate(QWidget):
             QPushButton:hover {
                 background-color: #e6c200;
             }
-            QTableWidget::item:selected {
+            QTableView::item:selected {
                 background-color: #FFD700;
                 color: #000000;
                 font-weight: bold;
@@ -117,20 +396,29 @@ class CypherGate(QWidget):
         title.setStyleSheet("font-weight: bold; font-size: 18px;")
         layout.addWidget(title)
 
+        filter_layout = QHBoxLayout()
         self.country_dropdown = QComboBox()
         self.country_dropdown.currentTextChanged.connect(self.filter_servers)
-        layout.addWidget(self.country_dropdown)
-
-        self.table = QTableWidget()
-        self.table.setColumnCount(4)
-        self.table.setHorizontalHeaderLabels(["Country", "Ping", "Speed", "Users"])
-        self.table.setSelectionBehavior(QTableWidget.SelectRows)
-        self.table.setSelectionMode(QTableWidget.SingleSelection)
+        filter_layout.addWidget(self.country_dropdown, 1)
+
+        self.sort_dropdown = QComboBox()
+        self.sort_dropdown.addItems(SORT_ORDERS)
+        self.sort_dropdown.currentTextChanged.connect(self.on_sort_changed)
+        filter_layout.addWidget(self.sort_dropdown)
+        layout.addLayout(filter_layout)
+
+        self.table = QTableView()
+        self.table.setModel(self.server_view)
+        self.table.setSelectionBehavior(QTableView.SelectRows)
+        self.table.setSelectionMode(QTableView.SingleSelection)
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        # Sizing to contents would measure every row; stretch instead
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         layout.addWidget(self.table)
 
         btn_layout = QHBoxLayout()
         self.refresh_btn = QPushButton("🔄 Refresh")
-        self.refresh_btn.clicked.connect(self.load_servers)
+        self.refresh_btn.clicked.connect(lambda: self.refresh_servers(force=True))
         btn_layout.addWidget(self.refresh_btn)
 
         self.connect_btn = QPushButton("🔗 Connect")
@@ -152,9 +440,26 @@ class CypherGate(QWidget):
         self.status_label.setAlignment(Qt.AlignCenter)
         layout.addWidget(self.status_label)
 
+        # Live throughput/RTT of the connected tunnel, fed by the engine's sampler
+        self.stats_label = QLabel()
+        self.stats_label.setAlignment(Qt.AlignCenter)
+        self.stats_label.hide()
+        layout.addWidget(self.stats_label)
+
+        self.verify_label = QLabel()
+        self.verify_label.setAlignment(Qt.AlignCenter)
+        self.verify_label.hide()
+        layout.addWidget(self.verify_label)
+
         self.setLayout(layout)
         self.load_servers()
 
+        # countries.conf edits re-filter the loaded list; the folder is watched
+        # too because editors often save by replacing the file
+        self.countries_watcher = QFileSystemWatcher([VPN_ROOT, self.engine.countries_file], self)
+        self.countries_watcher.fileChanged.connect(self.on_countries_changed)
+        self.countries_watcher.directoryChanged.connect(self.on_countries_changed)
+
         self.tray_icon = QSystemTrayIcon(QIcon(ICON_PATH), self)
         self.tray_icon.setToolTip("🌐 CypherGate VPN")
 
@@ -181,155 +486,389 @@ class CypherGate(QWidget):
         self.tray_icon.activated.connect(self.on_tray_icon_activated)
         self.tray_icon.show()
 
-    def load_allowed_countries(self):
-        if os.path.exists(COUNTRIES_CONF):
-            with open(COUNTRIES_CONF, "r", encoding="utf-8") as f:
-                return [line.strip() for line in f if line.strip()]
-        return None  # No filter if config missing
-
     def load_servers(self):
-        try:
-            response = requests.get(API_URL, timeout=30)
-            response.raise_for_status()
-            data = response.text
-            
-            with open(CACHE_FILE, "w", encoding="utf-8") as f:
-                f.write(data)
+        # Render whatever is on disk right away, then revalidate against VPNGate in the background
+        if self.engine.cache.exists():
+            try:
+                self.apply_servers(self.engine.read_cached())
+                self.from_cache = True
+            except Exception:
+                pass
+        self.refresh_servers()
+
+    def refresh_servers(self, force=False):
+        # force: the Refresh button, which asks VPNGate even inside the cache TTL
+        if self.fetch_task is not None:
+            return  # A fetch is already in flight
+        self.refresh_btn.setEnabled(False)
+        self.fetch_task = BackgroundTask(self.engine.fetch, None, force, parent=self)
+        self.fetch_task.succeeded.connect(self.on_servers_fetched)
+        self.fetch_task.failed.connect(self.on_servers_fetch_failed)
+        self.fetch_task.finished.connect(self.on_fetch_finished)
+        self.fetch_task.start()
+
+    def on_servers_fetched(self, store):
+        self.from_cache = False
+        if store is None:
+            # Cached list is still current; only load it if nothing is shown yet
+            if not self.engine.store and self.engine.cache.exists():
+                self.apply_servers(self.engine.read_cached())
+            return
+        self.apply_servers(store)
 
-        except Exception as e:
-            if os.path.exists(CACHE_FILE):
-                with open(CACHE_FILE, "r", encoding="utf-8") as f:
-                    data = f.read()
-                QMessageBox.warning(self, "Offline Mode", "Failed to fetch VPN servers online. Loaded from cache.")
-            else:
-                QMessageBox.critical(self, "Error", f"Failed to fetch VPN servers and no cache found:\n{e}")
+    def on_servers_fetch_failed(self, e):
+        if self.from_cache:
+            QMessageBox.warning(self, "Offline Mode", "Failed to fetch VPN servers online. Loaded from cache.")
+        elif self.engine.cache.exists():
+            try:
+                self.apply_servers(self.engine.read_cached())
+                self.from_cache = True
+            except Exception as cache_error:
+                QMessageBox.critical(self, "Error", f"Failed to fetch VPN servers and cache is unreadable:\n{cache_error}")
                 return
-
-        lines = data.splitlines()[2:]
-        reader = csv.reader(lines)
-        servers = []
-        countries = set()
-
-        allowed_countries = self.load_allowed_countries()
-
-        for row in reader:
-            if len(row) < 15:
-                continue
-            country = row[5]
-            if allowed_countries and country not in allowed_countries:
-                continue  # Skip this country if not allowed
-
-            ping = row[3] + " ms"
-            speed = str(int(int(row[4]) / 1000)) + " kbps"
-            users = row[2]
-            config_b64 = row[-1]
-            servers.append((country, ping, speed, users, config_b64))
-            countries.add(country)
-
-        self.all_servers = servers
+            QMessageBox.warning(self, "Offline Mode", "Failed to fetch VPN servers online. Loaded from cache.")
+        else:
+            QMessageBox.critical(self, "Error", f"Failed to fetch VPN servers and no cache found:\n{e}")
+
+    def on_fetch_finished(self):
+        self.fetch_task.deleteLater()
+        self.fetch_task = None
+        self.refresh_btn.setEnabled(True)
+
+    def apply_servers(self, store):
+        self.engine.apply(store)
+        self.server_model.set_records(store.records)
+        countries = store.countries()
+        current = self.country_dropdown.currentText()
+
+        self.country_dropdown.blockSignals(True)
         self.country_dropdown.clear()
-        self.country_dropdown.addItems(sorted(countries))
+        self.country_dropdown.addItems(countries)
+        if current in countries:
+            self.country_dropdown.setCurrentText(current)
+        self.country_dropdown.blockSignals(False)
         if countries:
             self.filter_servers(self.country_dropdown.currentText())
 
+    def on_countries_changed(self, path):
+        countries_file = self.engine.countries_file
+        if countries_file not in self.countries_watcher.files() and os.path.exists(countries_file):
+            self.countries_watcher.addPath(countries_file)
+        store = self.engine.reload_countries()
+        if store is not None:
+            self.apply_servers(store)
+
+    def current_order(self):
+        return SORT_ORDERS[self.sort_dropdown.currentText()]
+
     def filter_servers(self, country):
-        filtered = [s for s in self.all_servers if s[0] == country]
+        order = self.current_order()
+        self.populate_table(country, order)
+        self.engine.prepare_ahead(country)
+        if order == "rtt":
+            self.measure_latency(country)
 
-        def parse_ping(ping_str):
-            try:
-                return int(ping_str.split()[0])
-            except ValueError:
-                return float('inf')
-
-        filtered.sort(key=lambda s: parse_ping(s[1]))
-        self.populate_table(filtered)
-
-    def populate_table(self, servers):
-        self.table.setRowCount(len(servers))
-        for i, (country, ping, speed, users, _) in enumerate(servers):
-            self.table.setItem(i, 0, QTableWidgetItem(country))
-            self.table.setItem(i, 1, QTableWidgetItem(ping))
-            self.table.setItem(i, 2, QTableWidgetItem(speed))
-            self.table.setItem(i, 3, QTableWidgetItem(users))
-        self.table.resizeColumnsToContents()
-        self.filtered_servers = servers
-
-        if self.table.rowCount() > 0:
+    def on_sort_changed(self, _):
+        self.filter_servers(self.country_dropdown.currentText())
+
+    def measure_latency(self, country):
+        if self.probe_task is not None:
+            return
+        servers = self.engine.servers(country, "ping")
+        if not servers:
+            return
+        self.probe_task = BackgroundTask(self.engine.measure, servers, parent=self)
+        self.probe_task.succeeded.connect(lambda _: self.on_latency_measured(country))
+        self.probe_task.finished.connect(self.on_probe_finished)
+        self.probe_task.start()
+
+    def on_latency_measured(self, country):
+        self.server_model.refresh()
+        if country == self.country_dropdown.currentText() and self.current_order() in ("rtt", "score"):
+            self.populate_table(country, self.current_order())
+
+    def on_probe_finished(self):
+        self.probe_task.deleteLater()
+        self.probe_task = None
+
+    def populate_table(self, country, order):
+        self.server_view.set_view(self.engine.store, country, order)
+        if self.server_view.rowCount() > 0:
             self.table.selectRow(0)
 
     def connect_vpn(self):
-        selected = self.table.currentRow()
+        selected = self.table.currentIndex().row()
         if selected == -1:
             QMessageBox.warning(self, "No Selection", "Please select a VPN server.")
             return
-        self.start_vpn_connection(self.filtered_servers[selected])
+        self.start_vpn_connection(self.server_view.server(selected))
 
     def auto_connect_fastest(self):
-        if not self.filtered_servers:
+        if self.server_view.rowCount() == 0:
             QMessageBox.warning(self, "No Servers", "No servers available to auto-connect.")
             return
-        self.start_vpn_connection(self.filtered_servers[0])
+        # Best composite score, whatever order the table is currently showing
+        candidates = self.engine.best(
+            self.country_dropdown.currentText(), self.engine.settings.getint("connection", "race_candidates")
+        )
+        if len(candidates) > 1:
+            self.race_servers(candidates)
+        else:
+            self.start_vpn_connection(candidates[0] if candidates else self.server_view.server(0))
+
+    def race_servers(self, servers):
+        if self.engine.busy() or self.prepare_task is not None:
+            QMessageBox.warning(self, "Already Connected", "Disconnect the current VPN session first.")
+            return
+        prepared = [(server, self.engine.preparer.cached(server)) for server in servers]
+        if all(config is not None for _, config in prepared):
+            self.launch_race(prepared)
+            return
+        # Candidates that weren't prepared ahead are prepared off the UI thread
+        task = self.prepare_task = BackgroundTask(self.engine.prepare_all, servers, parent=self)
+        task.succeeded.connect(lambda prepared: self.on_race_prepared(task, prepared))
+        task.failed.connect(lambda e: self.on_prepare_failed(task, e))
+        task.finished.connect(task.deleteLater)
+        self.status_label.setText(f"⏳ Preparing {len(servers)} servers in {servers[0].country}...")
+        self.connect_btn.setEnabled(False)
+        self.disconnect_btn.setEnabled(True)
+        task.start()
+
+    def on_race_prepared(self, task, prepared):
+        if task is not self.prepare_task:
+            return  # cancelled with Disconnect
+        self.prepare_task = None
+        self.launch_race(prepared)
+
+    def on_prepare_failed(self, task, e):
+        if task is not self.prepare_task:
+            return
+        self.prepare_task = None
+        self.reset_connection_ui()
+        QMessageBox.critical(self, "Connection Failed", str(e))
 
-    def start_vpn_connection(self, server):
-        country, ping, speed, users, config_b64 = server
-        ovpn_path = os.path.join(VPN_DIR, f"{country}.ovpn")
+    def launch_race(self, prepared):
+        try:
+            self.race = self.engine.start_race(prepared)
+        except Exception as e:
+            self.reset_connection_ui()
+            QMessageBox.critical(self, "Connection Failed", str(e))
+            return
+        self.status_label.setText(f"🏁 Racing {len(self.race.entries)} servers in {prepared[0][0].country}...")
+        self.connect_btn.setEnabled(False)
+        self.disconnect_btn.setEnabled(True)
 
-        config = base64.b64decode(config_b64).decode(errors='ignore')
-        if "data-ciphers" not in config:
-            config += "\ndata-ciphers AES-256-GCM:AES-128-GCM:CHACHA20-POLY1305:AES-128-CBC\n"
-        if "cipher" not in config:
-            config += "\ncipher AES-128-CBC\n"
+    def on_race_won(self, race, winner):
+        if race is not self.race:
+            return
+        self.race = None
+        self.status_label.setToolTip(race_report(race.entries))
+        self.start_vpn_connection(winner.server)
 
-        with open(ovpn_path, "w") as f:
-            f.write(config)
+    def on_race_failed(self, race):
+        if race is not self.race:
+            return
+        self.race = None
+        self.publish({"event": "failed", "reason": "None of the candidates completed a handshake"})
+        self.reset_connection_ui()
+        QMessageBox.critical(
+            self, "Connection Failed",
+            "None of the candidates completed a handshake:\n\n" + race_report(race.entries)
+        )
+
+    def start_vpn_connection(self, server):
+        if self.engine.busy() or self.prepare_task is not None:
+            QMessageBox.warning(self, "Already Connected", "Disconnect the current VPN session first.")
+            return
 
         try:
-            self.vpn_process = subprocess.Popen(
-                ["pkexec","openvpn", "--config", ovpn_path],
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL
-            )
-            time.sleep(5)
-            self.status_label.setText(f"🔒 Connected to {country}")
-            self.connect_btn.setEnabled(False)
-            self.disconnect_btn.setEnabled(True)
-            self.show_connection_info(country, ping, speed, users)
+            self.session = self.engine.connect(server)
         except Exception as e:
             QMessageBox.critical(self, "Connection Failed", str(e))
+            return
 
-    def show_connection_info(self, country, ping, speed, users):
-        try:
-            ip = requests.get("https://ipinfo.io/ip", timeout=10).text.strip()
-        except:
-            ip = "Unknown"
-        msg = (f"🌐 Connected to {country}\n"
-               f"🏓 Ping: {ping}\n"
-               f"🚀 Speed: {speed}\n"
-               f"👥 Users: {users}\n"
-               f"🔑 Your new IP: {ip}")
-        QMessageBox.information(self, "VPN Connected", msg)
+        self.active_server = server
+        self.status_label.setText(f"⏳ Connecting to {server.country}...")
+        self.connect_btn.setEnabled(False)
+        self.disconnect_btn.setEnabled(True)
+
+    def on_session_state(self, session, state, detail):
+        if session is not self.session:
+            return  # late event from a session we already dropped
+        self.publish({"event": "state", "state": state, "detail": detail})
+        country = self.active_server.country
+        if session.connected:
+            if state == "RECONNECTING":
+                self.status_label.setText(f"🔄 Reconnecting to {country}...")
+            elif state == "CONNECTED":
+                self.status_label.setText(f"🔒 Connected to {country}")
+            return
+        self.status_label.setText(f"⏳ {country}: {STATE_LABELS.get(state, state.title())}...")
+
+    def on_session_connected(self, session, handshake_time):
+        if session is not self.session:
+            return
+        self.publish({
+            "event": "connected", "server": control.server_row(self.active_server), "handshake_time": round(handshake_time, 2)
+        })
+        self.status_label.setText(f"🔒 Connected to {self.active_server.country} ({handshake_time:.1f}s)")
+        self.start_verification(session)
+
+    def on_session_failed(self, session, reason):
+        if session is not self.session:
+            return
+        self.publish({"event": "failed", "reason": reason})
+        self.reset_connection_ui()
+        # The reason already carries openvpn's last error; the recent log goes under "Show Details"
+        box = QMessageBox(QMessageBox.Critical, "Connection Failed", reason, parent=self)
+        box.setDetailedText("\n".join(self.engine.log.tail(50)))
+        box.exec()
+
+    def on_log_event(self, session, event):
+        if session is not self.session:
+            return
+        if event.is_error:
+            self.status_label.setToolTip(event.line)
+
+    def on_session_exited(self, session, code):
+        if session is not self.session:
+            return
+        self.publish({"event": "exited", "code": code})
+        self.reset_connection_ui()
+        notification.notify(
+            title="CypherGate VPN Disconnected",
+            message=f"OpenVPN exited unexpectedly (code {code}).",
+            app_name="CypherGate"
+        )
+
+    def reset_connection_ui(self):
+        self.session = None
+        self.stop_verification()
+        self.stats_label.clear()
+        self.stats_label.hide()
+        self.tray_icon.setToolTip("🌐 CypherGate VPN")
+        self.status_label.setText("🔓 Disconnected")
+        self.connect_btn.setEnabled(True)
+        self.disconnect_btn.setEnabled(False)
+
+    def on_failover(self, old_session, new_session, server, reason):
+        # The engine's watchdog gave up on the tunnel and picked the next server itself
+        if old_session is not self.session:
+            return
+        reason = reason.splitlines()[0]
+        self.publish({"event": "failover", "reason": reason, "server": control.server_row(server) if server else None})
+        if new_session is None:
+            self.reset_connection_ui()
+            notification.notify(
+                title="CypherGate VPN Disconnected",
+                message=f"Connection lost ({reason}) and no other server could take over.",
+                app_name="CypherGate"
+            )
+            return
+        self.stop_verification()
+        self.session = new_session
+        self.active_server = server
+        self.status_label.setText(f"🔁 {reason}; switching to {server.country} ({server.host})...")
+        notification.notify(
+            title="CypherGate VPN Failover",
+            message=f"{reason}. Switching to {server.country} ({server.host}).",
+            app_name="CypherGate"
+        )
+
+    def on_sample(self, session, sample):
+        if session is not self.session:
+            return
+        self.publish(dict(control.sample_row(sample), event="sample"))
+        stats = describe(sample)
+        self.stats_label.setText(stats)
+        self.stats_label.show()
+        self.tray_icon.setToolTip(f"🌐 CypherGate VPN\n🔒 {self.active_server.country}\n{stats}")
+
+    def start_verification(self, session):
+        # IPv4/IPv6/DNS/route checks run concurrently off the UI thread; each
+        # line shows up under the status as soon as its check finishes
+        events = self.session_events
+        self.verify_label.setText("🔎 Verifying connection...")
+        self.verify_label.show()
+        self.verification = self.engine.verify(
+            session, self.active_server,
+            on_result=events.verify_result.emit,
+            on_done=events.verify_done.emit
+        )
+
+    def stop_verification(self):
+        if self.verification:
+            self.verification.cancel()
+            self.verification = None
+        self.verify_label.clear()
+        self.verify_label.hide()
+
+    def on_verify_result(self, verification, result):
+        if verification is not self.verification:
+            return
+        self.verify_label.setText(verification.summary())
+
+    def on_verify_done(self, verification):
+        if verification is not self.verification:
+            return
+        self.publish({
+            "event": "verified",
+            "checks": {name: {"ok": result.ok, "value": str(result.value)} for name, result in verification.results.items()}
+        })
+        self.show_connection_info(self.active_server, verification)
+
+    def show_connection_info(self, server, verification):
+        country = server.country
+        ipv4 = verification.results["ipv4"]
+        ip = ipv4.value if ipv4.ok is not False else "Unknown"
         notification.notify(
             title="CypherGate VPN Connected",
             message=f"{country} | New IP: {ip}",
             app_name="CypherGate"
         )
+        msg = (f"🌐 Connected to {country}\n"
+               f"🏓 Ping: {server.ping_text}\n"
+               f"🚀 Speed: {server.speed_text}\n"
+               f"👥 Users: {server.users_text}\n\n"
+               f"{verification.summary()}")
+        QMessageBox.information(self, "VPN Connected", msg)
 
     def disconnect_vpn(self):
-        if self.vpn_process:
-            try:
-                subprocess.run(["pkexec", "kill", str(self.vpn_process.pid)])
-                self.vpn_process = None
-                self.status_label.setText("🔓 Disconnected")
-                self.connect_btn.setEnabled(True)
-                self.disconnect_btn.setEnabled(False)
+        try:
+            if self.stop_vpn():
                 QMessageBox.information(self, "VPN Disconnected", "VPN connection has been terminated.")
-                notification.notify(
-                    title="CypherGate VPN Disconnected",
-                    message="VPN connection has been terminated.",
-                    app_name="CypherGate"
-                )
-            except Exception as e:
-                QMessageBox.critical(self, "Error", f"Failed to disconnect:\n{e}")
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Failed to disconnect:\n{e}")
+
+    def stop_vpn(self):
+        # Cancels a race or its preparation, or ends the tunnel (True); raises if openvpn won't exit
+        if self.prepare_task is not None:
+            self.prepare_task = None
+            self.reset_connection_ui()
+            self.publish({"event": "disconnected"})
+            return False
+        if self.race:
+            self.engine.disconnect()
+            self.race = None
+            self.reset_connection_ui()
+            self.publish({"event": "disconnected"})
+            return False
+        if not self.session:
+            return False
+        self.engine.disconnect()
+        self.reset_connection_ui()
+        self.publish({"event": "disconnected"})
+        notification.notify(
+            title="CypherGate VPN Disconnected",
+            message="VPN connection has been terminated.",
+            app_name="CypherGate"
+        )
+        return True
+
+    def publish(self, event):
+        # Pushes an event to `ctl subscribe` clients
+        if self.control is not None:
+            self.control.publish(event)
 
     def closeEvent(self, event):
         event.ignore()
@@ -353,10 +892,27 @@ class CypherGate(QWidget):
         if reason == QSystemTrayIcon.DoubleClick:
             self.show()
 
+    def tray_restore(self):
+        self.setVisible(True)
+        self.showNormal()
+        self.raise_()
+        self.activateWindow()
+
 if __name__ == "__main__":
+    # One window per user: a second launch brings the running one to the front and exits
+    if control.forward(VPN_ROOT, "show") is not None:
+        sys.exit(0)
     app = QApplication(sys.argv)
+    os.makedirs(VPN_ROOT, exist_ok=True)
+    instance_lock = QLockFile(os.path.join(VPN_ROOT, "instance.lock"))
+    instance_lock.setStaleLockTime(0)  # only a dead owner frees it, however long the window has been open
+    if not instance_lock.tryLock(0):
+        control.forward(VPN_ROOT, "show", wait=10)  # the other one is still starting up
+        sys.exit(0)
     app.setWindowIcon(QIcon(ICON_PATH))
     window = CypherGate()
+    window.control = ControlServer(window, control.server_name(VPN_ROOT))
+    app.aboutToQuit.connect(window.engine.close)
     window.show()
     frame = window.frameGeometry()
     center_point = QApplication.primaryScreen().availableGeometry().center()
@@ -0,0 +1,179 @@
+# On-disk cache of the VPNGate server list.
+#
+# Alongside CACHE_FILE we keep a small JSON sidecar describing the last fetch
+# (time, validators, size, hash); it also spots a CSV that no longer matches
+# it. Callers show the cached list straight away and run fetch() in the
+# background to revalidate it:
+# - Inside the TTL, fetch() only sends a conditional request (If-None-Match /
+#   If-Modified-Since), so an unchanged list costs a 304. A list without
+#   validators is not downloaded again until the TTL runs out.
+# - Past the TTL, or with force=True (a refresh the user asked for), it
+#   always asks, still conditionally whenever validators exist.
+# A binary snapshot of the parsed list (see snapshot.py) sits next to the CSV
+# for fast startup. Every write goes to a temp file that is renamed into place.
+
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from .serverlist import iter_terminated, parse_lines, read_server_list
+
+CHUNK_SIZE = 64 * 1024
+DEFAULT_TTL = 15 * 60
+
+
+@contextmanager
+def atomic_open(path, mode="wb"):
+    # Unique per thread too: the config preparer writes from several at once
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, mode) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class HashingWriter:
+    def __init__(self, f):
+        self.f = f
+        self.sha = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self.f.write(data)
+        self.sha.update(data)
+        self.size += len(data)
+
+
+def file_sha256(path):
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+class ServerListCache:
+    def __init__(self, path, ttl=DEFAULT_TTL):
+        self.path = path
+        self.meta_path = os.path.splitext(path)[0] + ".meta.json"
+        self.snapshot_path = os.path.splitext(path)[0] + ".snapshot"
+        self.ttl = ttl
+        self.meta = self.load_meta()
+
+    def load_meta(self):
+        try:
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        # A CSV that doesn't match its sidecar (e.g. replaced by hand or by an
+        # older build) can't be trusted for conditional requests.
+        try:
+            if os.path.getsize(self.path) != meta.get("size"):
+                return {}
+        except OSError:
+            return {}
+        return meta
+
+    def save_meta(self):
+        with atomic_open(self.meta_path, "w") as f:
+            json.dump(self.meta, f, indent=2)
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def age(self):
+        fetched_at = self.meta.get("fetched_at")
+        if fetched_at is None:
+            return None
+        return max(0.0, time.time() - fetched_at)
+
+    def is_fresh(self):
+        age = self.age()
+        return self.exists() and age is not None and age < self.ttl
+
+    def conditional_headers(self):
+        headers = {}
+        if not self.exists():
+            return headers
+        if self.meta.get("etag"):
+            headers["If-None-Match"] = self.meta["etag"]
+        if self.meta.get("last_modified"):
+            headers["If-Modified-Since"] = self.meta["last_modified"]
+        return headers
+
+    def read(self):
+        return read_server_list(self.path)
+
+    def csv_sha256(self):
+        if not self.meta.get("sha256"):
+            # CSV without a usable sidecar (placed by hand, older build): hash it
+            # once and remember it, so the next start can go straight to the snapshot
+            self.meta = {"size": os.path.getsize(self.path), "sha256": file_sha256(self.path)}
+            self.save_meta()
+        return self.meta["sha256"]
+
+    def load(self):
+        # (records, country index) from the snapshot when it still matches the
+        # CSV; otherwise parse the CSV and refresh the snapshot.
+        # The index is None when it had to be rebuilt from the CSV.
+        from .snapshot import read_snapshot
+
+        sha256 = self.csv_sha256()
+        loaded = read_snapshot(self.snapshot_path, self.path, sha256)
+        if loaded is not None:
+            return loaded
+        servers = self.read()
+        self.save_snapshot(servers, sha256)
+        return servers, None
+
+    def save_snapshot(self, servers, sha256):
+        from .snapshot import write_snapshot
+
+        try:
+            write_snapshot(self.snapshot_path, servers, sha256)
+        except OSError:
+            pass  # only a startup shortcut; the CSV is still there
+
+    def fetch(self, get, url, timeout=30, force=False):
+        # Returns the freshly parsed servers, or None when the cached copy is
+        # still current (the server answered 304, or it is inside the TTL and
+        # has no validators to revalidate with).
+        headers = self.conditional_headers()
+        if not force and self.is_fresh() and not headers:
+            return None
+
+        with get(url, timeout=timeout, stream=True, headers=headers) as response:
+            if response.status_code == 304 and self.exists():
+                self.meta["fetched_at"] = time.time()
+                self.save_meta()
+                return None
+            response.raise_for_status()
+
+            with atomic_open(self.path) as f:
+                out = HashingWriter(f)
+                servers = parse_lines(
+                    iter_terminated(response.iter_lines(chunk_size=CHUNK_SIZE)),
+                    self.path,
+                    out
+                )
+
+            self.meta = {
+                "fetched_at": time.time(),
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "size": out.size,
+                "sha256": out.sha.hexdigest(),
+            }
+        self.save_meta()
+        self.save_snapshot(servers, self.meta["sha256"])
+        return servers
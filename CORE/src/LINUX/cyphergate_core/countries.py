@@ -0,0 +1,56 @@
+# The countries.conf filter: which countries the server list shows.
+#
+# One entry per line: a country name as VPNGate spells it ("Japan",
+# "United States") or its two-letter ISO code ("JP", "US"), in any case.
+# Anything after a # is a comment. No entries (or no file) means every
+# country. Entries are compiled into two sets, so checking a country is a
+# couple of hash lookups however long the file is.
+#
+# The filter is applied to the parsed list in memory (ServerStore.filtered),
+# not while parsing, so an edited file takes effect without a new download.
+
+DEFAULT_COUNTRIES = (
+    "# Countries to show, one per line: full name or two-letter code. Empty shows all.\n"
+    "Japan\n"
+    "United States\n"
+    "India\n"
+    "Germany\n"
+)
+
+
+class CountryFilter:
+    def __init__(self, names=(), codes=()):
+        self.names = frozenset(name.casefold() for name in names)
+        self.codes = frozenset(code.upper() for code in codes)
+
+    @classmethod
+    def parse(cls, text):
+        names, codes = [], []
+        for line in text.splitlines():
+            entry = " ".join(line.split("#", 1)[0].split())
+            if not entry:
+                continue
+            if len(entry) == 2 and entry.isalpha():
+                codes.append(entry)
+            else:
+                names.append(entry)
+        return cls(names, codes)
+
+    @classmethod
+    def load(cls, path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return cls.parse(f.read())
+        except FileNotFoundError:
+            return cls()
+
+    def __bool__(self):
+        return bool(self.names or self.codes)
+
+    def __eq__(self, other):
+        return isinstance(other, CountryFilter) and self.names == other.names and self.codes == other.codes
+
+    def matches(self, country, code):
+        if not self:
+            return True
+        return country.casefold() in self.names or code.upper() in self.codes
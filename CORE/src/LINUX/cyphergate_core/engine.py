@@ -0,0 +1,581 @@
+# The Qt-free engine behind both the GUI and the `cyphergate` CLI.
+#
+# Owns the server list (fetch, cache, rank, latency probes), config patching
+# (done ahead of time for the likely picks) and the lifecycle of the one OpenVPN session or handshake race that may be
+# running, recording every attempt in the history database along the way.
+# Platform details (openvpn command, Popen flags, kill) are passed in; the
+# patch options and, on Windows, the IPv6 switch (see ipv6.py) default to
+# the same ones for every front end. The tunnel's output always goes through the log pipeline. While
+# connected, the sampler feeds a health watchdog; when it (or openvpn exiting)
+# says the tunnel is gone, the engine fails over to the next-best server in
+# the same country by itself. The on_* callbacks run on worker threads.
+# The session, race, sampler and watchdog modules are imported by the methods
+# that start them, so listing servers never loads them.
+
+import os
+import subprocess
+import threading
+
+from .cache import ServerListCache
+from .countries import DEFAULT_COUNTRIES, CountryFilter
+from .history import HistoryStore
+from .logpipe import LogPipeline
+from .patching import PatchedConfigCache
+from .preparer import ConfigPreparer, PreparedConfig
+from .prober import LatencyProber
+from .ranking import ranker_from_settings
+from .resolver import Resolver, ddns_name
+from .settings import load_settings
+from .store import ServerStore
+
+API_URL = "http://www.vpngate.net/api/iphone/"
+STANDBY_CANDIDATES = 3
+# pkexec's exit status when its password prompt is dismissed
+PKEXEC_DISMISSED = 126
+
+
+class Engine:
+    def __init__(self, root, openvpn_command, race_command=None, popen_kwargs=None, race_popen_kwargs=None,
+                 kill=None, patch_options=None):
+        self.root = root
+        self.servers_dir = os.path.join(root, "servers")
+        self.cache_file = os.path.join(root, "cache", "serverlist.csv")
+        self.countries_file = os.path.join(root, "countries.conf")
+        self.settings_file = os.path.join(root, "cyphergate.conf")
+        self.history_file = os.path.join(root, "history.db")
+        self.log_file = os.path.join(root, "logs", "openvpn.log")
+        os.makedirs(self.servers_dir, exist_ok=True)
+        os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+        if not os.path.exists(self.countries_file):
+            with open(self.countries_file, "w") as f:
+                f.write(DEFAULT_COUNTRIES)
+
+        self.openvpn_command = list(openvpn_command)
+        self.race_command = list(race_command or openvpn_command)
+        self.popen_kwargs = popen_kwargs or {}
+        self.race_popen_kwargs = self.popen_kwargs if race_popen_kwargs is None else race_popen_kwargs
+        self.kill = kill
+        # server -> options for PatchedConfigCache.path_for (e.g. fast_io, ipv6)
+        self.patch_options = patch_options or self.default_patch_options
+
+        settings = self.settings = load_settings(self.settings_file)
+        self.cache = ServerListCache(self.cache_file, ttl=settings.getint("cache", "ttl"))
+        self.prober = LatencyProber(
+            timeout=settings.getfloat("prober", "timeout"),
+            concurrency=settings.getint("prober", "concurrency"),
+            ttl=settings.getint("prober", "ttl")
+        )
+        self.ranker = ranker_from_settings(settings)
+        self.patched_configs = PatchedConfigCache(self.servers_dir, max_entries=settings.getint("patching", "cache_entries"))
+        self.history = HistoryStore(self.history_file)
+        self.resolver = Resolver(ttl=settings.getint("resolver", "ttl"), negative_ttl=settings.getint("resolver", "negative_ttl"))
+        # Prepared options can't outlive the DNS answer they were based on
+        self.preparer = ConfigPreparer(
+            self.prepare_config,
+            capacity=settings.getint("patching", "prepared_entries"),
+            ttl=settings.getint("resolver", "ttl")
+        )
+        self.log = LogPipeline(
+            self.log_file,
+            max_bytes=settings.getint("logging", "max_bytes"),
+            backups=settings.getint("logging", "backups"),
+            lines=settings.getint("logging", "lines")
+        )
+        self.ipv6_switch = None
+        if os.name == "nt":
+            from .ipv6 import IPv6Switch
+            self.ipv6_switch = IPv6Switch(log=self.log.append)
+        self.country_filter = CountryFilter.load(self.countries_file)
+        self.store = ServerStore()
+        self.http = None
+
+        self.lock = threading.Lock()
+        self.session = None
+        self.server = None
+        self.options = None  # the session's patch options
+        self.attempt_id = None
+        self.race = None
+        self.log_reader = None
+        self.last_error = None
+        self.tun_device = None
+        self.sampler = None
+        self.watchdog = None
+        self.standby = None
+        self.failing_over = False
+        self.recovering = None  # session being replaced right now
+        self.failover_tried = set()
+        self.failovers_left = 0
+
+        self.on_state = None  # (session, state, detail)
+        self.on_connected = None  # (session, handshake_time)
+        self.on_failed = None  # (session, reason)
+        self.on_exit = None  # (session, exit code)
+        self.on_race_won = None  # (race, winning entry)
+        self.on_race_failed = None  # (race)
+        self.on_log_event = None  # (session, LogEvent)
+        self.on_sample = None  # (session, Sample)
+        self.on_failover = None  # (old session, new session or None if out of servers, new server, reason)
+
+    def make_store(self, servers, index=None):
+        # The whole list is parsed; the store handed out is its countries.conf selection
+        self.history.annotate(servers)
+        return ServerStore(servers, index=index).filtered(self.country_filter.matches, self.ranker)
+
+    def reload_countries(self):
+        # Store re-filtered for an edited countries.conf (not applied yet), or None if the filter is unchanged
+        country_filter = CountryFilter.load(self.countries_file)
+        if country_filter == self.country_filter:
+            return None
+        self.country_filter = country_filter
+        return self.store.filtered(country_filter.matches, self.ranker)
+
+    def http_client(self):
+        # Created on first use, so offline commands never import requests
+        with self.lock:
+            if self.http is None:
+                from .httpclient import HttpClient
+                settings = self.settings
+                self.http = HttpClient(
+                    retries=settings.getint("http", "retries"),
+                    backoff=settings.getfloat("http", "backoff"),
+                    breaker_threshold=settings.getint("http", "breaker_threshold"),
+                    breaker_cooldown=settings.getfloat("http", "breaker_cooldown")
+                )
+            return self.http
+
+    def fetch(self, get=None, force=False):
+        # New store, or None when the cached list is still current
+        client = self.http_client()
+        servers = self.cache.fetch(get or client.get, API_URL, timeout=client.timeout_for(API_URL), force=force)
+        return self.make_store(servers) if servers is not None else None
+
+    def read_cached(self):
+        return self.make_store(*self.cache.load())
+
+    def load(self, refresh=True, get=None):
+        # For one-shot callers: a fresh cache as-is, otherwise revalidate and
+        # fall back to whatever is on disk when VPNGate can't be reached
+        store = None
+        if refresh and not self.cache.is_fresh():
+            try:
+                store = self.fetch(get)
+            except Exception:
+                if not self.cache.exists():
+                    raise
+        if store is None:
+            store = self.read_cached()
+        self.apply(store)
+        return store
+
+    def apply(self, store):
+        self.store = store
+        if self.prober.annotate(store.records):
+            store.rerank(self.ranker)
+
+    def servers(self, country, order="score"):
+        return self.store.servers(country, order)
+
+    def best(self, country, count=1):
+        records = self.store.records
+        return [records[i] for i in self.store.ids(country, "score")[:count]]
+
+    def measure(self, servers):
+        # Blocking; probes RTTs and re-ranks the store with them
+        self.prober.probe_servers(servers)
+        self.store.rerank(self.ranker)
+
+    def supports_ipv6(self, server):
+        # Whether VPNGate publishes an IPv6 address for the server; an unanswered lookup counts as no
+        from concurrent.futures import TimeoutError
+
+        try:
+            return bool(self.resolver.lookup(ddns_name(server), self.settings.getfloat("resolver", "timeout")).ipv6)
+        except TimeoutError:
+            return False
+
+    def default_patch_options(self, server):
+        # Windows gets the IPv6 directives only for servers with IPv6 (the rest
+        # run with IPv6 switched off); fast-io only exists elsewhere
+        if os.name == "nt":
+            return {"ipv6": self.supports_ipv6(server)}
+        return {"fast_io": self.settings.getboolean("patching", "fast_io")}
+
+    def prepare_config(self, server):
+        # Decode, resolve and patch; runs on the preparer's workers
+        options = self.patch_options(server)
+        return PreparedConfig(self.patched_configs.path_for(server.config, **options), options)
+
+    def prepare(self, server):
+        # Blocking; usually a cache hit once prepare_ahead() has run
+        return self.preparer.get(server)
+
+    def prepare_ahead(self, country=None):
+        # Prepares the top servers of every country in the background, `country` first
+        count = self.settings.getint("patching", "prepare_ahead")
+        countries = self.store.countries()
+        if country in countries:
+            countries.remove(country)
+            countries.insert(0, country)
+        self.preparer.prefetch(server for name in countries for server in self.best(name, count))
+
+    def prepare_all(self, servers):
+        # Blocking; prepares the servers that aren't cached in parallel and returns
+        # (server, PreparedConfig) pairs, in order, for those whose config could be read
+        jobs = [(server, self.preparer.cached(server) or self.preparer.submit(server)) for server in servers]
+        prepared = []
+        for server, job in jobs:
+            try:
+                prepared.append((server, job if isinstance(job, PreparedConfig) else job.result()))
+            except (OSError, ValueError):
+                continue
+        return prepared
+
+    def config_path(self, server, options=None):
+        if options is None:
+            return self.prepare(server).path
+        return self.patched_configs.path_for(server.config, **options)
+
+    def busy(self):
+        return self.session is not None or self.race is not None
+
+    def connect(self, server, popen_kwargs=None, patch_options=None, failover=False):
+        from .session import OpenVPNSession
+
+        if patch_options is None:
+            prepared = self.prepare(server)
+            config_path, patch_options = prepared.path, prepared.options
+        else:
+            config_path = self.config_path(server, patch_options)
+        popen_kwargs = dict(self.popen_kwargs if popen_kwargs is None else popen_kwargs)
+        popen_kwargs.update(stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        session = OpenVPNSession(
+            self.openvpn_command, config_path,
+            popen_kwargs=popen_kwargs,
+            connect_timeout=self.settings.getint("connection", "timeout"),
+            kill=self.kill,
+            # Byte counts double as the sampler's fallback source, so keep them as fresh as its samples
+            bytecount_interval=max(1, round(self.settings.getfloat("sampler", "interval")))
+        )
+        with self.lock:
+            if self.busy():
+                raise RuntimeError("Disconnect the current VPN session first.")
+            if failover:
+                if not self.failing_over:
+                    raise RuntimeError("Failover was cancelled.")
+            else:
+                self.failing_over = False
+                self.failover_tried = {server.host}
+                self.failovers_left = self.settings.getint("watchdog", "max_failovers")
+            attempt_id = self.history.start_attempt(server, "failover" if failover else "tunnel")
+            self.session, self.server, self.attempt_id = session, server, attempt_id
+            self.options = patch_options
+            self.last_error = None
+            self.tun_device = None
+
+        session.on_state = lambda state, detail: self.handle_state(session, state, detail)
+        session.on_connected = lambda elapsed: self.handle_connected(session, attempt_id, elapsed)
+        session.on_failed = lambda reason: self.handle_failed(session, attempt_id, reason)
+        session.on_exit = lambda code: self.handle_exit(session, attempt_id, code)
+        if self.ipv6_switch is not None:
+            self.ipv6_switch.set(patch_options.get("ipv6", False))
+        try:
+            session.start()
+        except Exception as e:
+            self.history.failed(attempt_id, f"could not start openvpn: {e}")
+            self.release(session)
+            raise
+        self.log_reader = self.log.attach(
+            session.process.stdout,
+            banner=f"{server.country} {server.host} ({server.ip})",
+            on_event=lambda event: self.handle_log_event(session, event)
+        )
+        return session
+
+    def handle_log_event(self, session, event):
+        if session is self.session:
+            if event.is_error:
+                self.last_error = event.data.get("error") or event.line
+            elif event.kind == "tun_device":
+                self.tun_device = event.data["device"]
+        self.emit(self.on_log_event, session, event)
+
+    def handle_state(self, session, state, detail):
+        watchdog = self.watchdog
+        if watchdog is not None and session is self.session:
+            watchdog.observe_state(state)
+        self.emit(self.on_state, session, state, detail)
+
+    def handle_connected(self, session, attempt_id, handshake_time):
+        from .watchdog import HealthWatchdog
+
+        self.history.connected(attempt_id, handshake_time)
+        settings = self.settings
+        with self.lock:
+            if self.session is session:
+                self.failing_over = False
+                if settings.getboolean("watchdog", "enabled"):
+                    self.watchdog = HealthWatchdog(
+                        rtt_timeout=settings.getfloat("watchdog", "rtt_timeout"),
+                        stall_seconds=settings.getfloat("watchdog", "stall_seconds"),
+                        reconnect_grace=settings.getfloat("watchdog", "reconnect_grace")
+                    )
+        self.start_sampler(session)
+        self.emit(self.on_connected, session, handshake_time)
+        if settings.getboolean("watchdog", "hot_standby"):
+            self.start_standby(session)
+
+    def handle_sample(self, session, sample):
+        self.emit(self.on_sample, session, sample)
+        watchdog = self.watchdog
+        if watchdog is not None and session is self.session:
+            reason = watchdog.check(sample)
+            if reason:
+                self.start_failover(session, reason)
+
+    def start_failover(self, session, reason):
+        # Replaces `session` with the next-best server on a worker thread;
+        # False if it isn't the current session (nothing to do)
+        with self.lock:
+            if session is not self.session:
+                return False
+            if self.recovering is session:
+                return True  # already on it
+            self.recovering = session
+            self.failing_over = True
+        threading.Thread(target=self.fail_over, args=(session, reason), daemon=True).start()
+        return True
+
+    def fail_over(self, session, reason):
+        with self.lock:
+            server, attempt_id = self.server, self.attempt_id
+            sampler, self.sampler, self.watchdog = self.sampler, None, None
+        if sampler is not None:
+            sampler.stop()
+        if not session.finished:
+            # Watchdog verdict on a still-running tunnel; exits and failed handshakes are already recorded
+            session.stop()
+            self.history.ended(attempt_id, session.uptime(), session.bytes_in, session.bytes_out, f"watchdog: {reason}")
+        self.release(session)
+
+        try:
+            while True:
+                with self.lock:
+                    if not self.failing_over:
+                        return  # the user disconnected meanwhile
+                    candidate = self.next_candidate(server.country) if self.failovers_left > 0 else None
+                    if candidate is None:
+                        self.failing_over = False
+                    else:
+                        self.failovers_left -= 1
+                        self.failover_tried.add(candidate.host)
+                if candidate is None:
+                    self.stop_standby()
+                    self.emit(self.on_failover, session, None, None, reason)
+                    return
+                try:
+                    new_session = self.connect(candidate, failover=True)
+                except Exception:
+                    continue
+                self.emit(self.on_failover, session, new_session, candidate, reason)
+                return
+        finally:
+            with self.lock:
+                if self.recovering is session:
+                    self.recovering = None
+
+    def next_candidate(self, country):
+        # The hot standby's server if its handshake is up, otherwise the best one not tried yet
+        if self.standby is not None:
+            server = self.standby.take()
+            if server is not None and server.host not in self.failover_tried:
+                return server
+        for server in self.store.servers(country, "score"):
+            if server.host not in self.failover_tried:
+                return server
+        return None
+
+    def start_standby(self, session):
+        from .watchdog import HotStandby
+
+        with self.lock:
+            if self.session is not session:
+                return
+            server, tried = self.server, set(self.failover_tried)
+        if self.standby is None:
+            self.standby = HotStandby(
+                self.race_command, self.config_path,
+                popen_kwargs=self.race_popen_kwargs,
+                timeout=self.settings.getint("connection", "timeout")
+            )
+        candidates = [s for s in self.store.servers(server.country, "score") if s.host not in tried]
+        self.standby.start(candidates[:STANDBY_CANDIDATES])
+
+    def stop_standby(self, wait=False):
+        if self.standby is not None:
+            self.standby.stop(wait)
+
+    def counters_for(self, session):
+        # Exact per-interface counters where the OS exposes them, management byte counts otherwise
+        from .sampler import ManagementCounters, SysfsCounters
+
+        device = self.tun_device
+        if device and os.path.exists(f"/sys/class/net/{device}/statistics/rx_bytes"):
+            return SysfsCounters(device)
+        return ManagementCounters(session)
+
+    def start_sampler(self, session, counters=None, probe=None):
+        from .sampler import TunnelSampler, tcp_rtt_probe
+
+        settings = self.settings
+        host, _, port = settings.get("sampler", "rtt_target").rpartition(":")
+        sampler = TunnelSampler(
+            counters or self.counters_for(session),
+            probe=probe or tcp_rtt_probe((host, int(port)), timeout=settings.getfloat("prober", "timeout")),
+            interval=settings.getfloat("sampler", "interval"),
+            rtt_interval=settings.getfloat("sampler", "rtt_interval"),
+            capacity=settings.getint("sampler", "history"),
+            on_sample=lambda sample: self.handle_sample(session, sample)
+        )
+        with self.lock:
+            if self.session is not session:
+                return None
+            old, self.sampler = self.sampler, sampler
+        if old is not None:
+            old.stop()
+        sampler.start()
+        return sampler
+
+    def prompt_dismissed(self, session):
+        return os.path.basename(self.openvpn_command[0]) == "pkexec" and session.process.poll() == PKEXEC_DISMISSED
+
+    def handle_failed(self, session, attempt_id, reason):
+        if self.prompt_dismissed(session):
+            # The user said no, which says nothing about the server; no failover either
+            self.history.cancelled(attempt_id, "password prompt")
+            with self.lock:
+                self.failing_over = False
+            self.release(session)
+            self.emit(self.on_failed, session, "The password prompt was dismissed.")
+            return
+        # openvpn's last words usually explain the failure; let the reader catch up on them
+        reader = self.log_reader
+        if reader is not None:
+            reader.join(1)
+        if self.last_error and session is self.session:
+            reason = f"{reason}\nLast OpenVPN error: {self.last_error}"
+        self.history.failed(attempt_id, reason)
+        if self.failing_over and self.start_failover(session, reason):
+            return  # a failover candidate that didn't come up; try the next one
+        self.release(session)
+        self.emit(self.on_failed, session, reason)
+
+    def handle_exit(self, session, attempt_id, code):
+        self.history.ended(attempt_id, session.uptime(), session.bytes_in, session.bytes_out, f"openvpn exited ({code})")
+        if self.watchdog is not None and self.start_failover(session, f"OpenVPN exited (code {code})"):
+            return
+        self.release(session)
+        self.emit(self.on_exit, session, code)
+
+    def release(self, session):
+        with self.lock:
+            if self.session is not session:
+                return
+            self.session = self.server = self.options = self.attempt_id = self.watchdog = None
+            sampler, self.sampler = self.sampler, None
+        if sampler is not None:
+            sampler.stop()
+        if self.ipv6_switch is not None:
+            self.ipv6_switch.set(True)
+
+    def start_race(self, prepared):
+        # Handshake race across prepare_all()'s pairs; connect() to the winner from on_race_won
+        from .racer import ConnectRace, RaceEntry
+
+        entries = [RaceEntry(server, config.path) for server, config in prepared]
+        if not entries:
+            raise ValueError("None of the candidate configs could be read.")
+
+        race = ConnectRace(
+            entries, self.race_command,
+            popen_kwargs=self.race_popen_kwargs,
+            timeout=self.settings.getint("connection", "timeout"),
+            on_winner=lambda winner, _: self.handle_race_done(race, self.on_race_won, winner),
+            on_failed=lambda _: self.handle_race_done(race, self.on_race_failed)
+        )
+        with self.lock:
+            if self.busy():
+                raise RuntimeError("Disconnect the current VPN session first.")
+            self.race = race
+        race.start()
+        return race
+
+    def handle_race_done(self, race, callback, *args):
+        with self.lock:
+            if self.race is not race:
+                return  # cancelled
+            self.race = None
+        self.record_race(race)
+        self.emit(callback, race, *args)
+
+    def record_race(self, race):
+        # Losers that were still mid-handshake say nothing about the server, so skip them
+        for entry in race.entries:
+            if entry.elapsed is not None:
+                self.history.connected(self.history.start_attempt(entry.server, "race"), entry.elapsed)
+            elif entry.outcome.startswith("failed: "):
+                self.history.failed(self.history.start_attempt(entry.server, "race"), entry.outcome[len("failed: "):])
+
+    def verify(self, session, server, on_result=None, on_done=None):
+        # Concurrent post-connect checks; results stream to on_result on worker threads
+        from .httpclient import HttpClient
+        from .verify import Verification, default_checks
+
+        # Not the shared client: its pooled connections may predate the tunnel
+        http = HttpClient(retries=0)
+        timeout = self.settings.getfloat("verify", "timeout")
+        options = self.options if session is self.session else None
+        tunnel_ipv6 = bool(options and options.get("ipv6"))
+        verification = Verification(
+            default_checks(http, server.country, session.tunnel_ip, tunnel_ipv6, timeout),
+            timeout=timeout,
+            on_result=on_result,
+            on_done=on_done,
+            close=http.close
+        )
+        verification.start()
+        return verification
+
+    def disconnect(self):
+        # Cancels a race or stops the tunnel; raises if openvpn won't exit
+        with self.lock:
+            race, self.race = self.race, None
+            session, attempt_id = self.session, self.attempt_id
+            self.failing_over = False
+        self.stop_standby()
+        if race is not None:
+            race.cancel()
+            return
+        if session is None:
+            return
+        if not session.stop():
+            raise RuntimeError("OpenVPN did not exit")
+        if session.connected:
+            self.history.ended(attempt_id, session.uptime(), session.bytes_in, session.bytes_out, "user")
+        else:
+            self.history.cancelled(attempt_id, "disconnect")
+        self.release(session)
+
+    def emit(self, callback, *args):
+        if callback:
+            callback(*args)
+
+    def close(self):
+        self.stop_standby(wait=True)
+        if self.ipv6_switch is not None:
+            self.ipv6_switch.close()
+        self.preparer.close()
+        self.resolver.close()
+        self.history.close()
+        self.log.close()
+        if self.http is not None:
+            self.http.close()
@@ -0,0 +1,192 @@
+# Per-server connection history in SQLite.
+#
+# Every attempt (real tunnel or race probe) gets a row keyed by a client-side
+# id, updated as the attempt connects, fails or ends. Writes go through a
+# queue to one writer thread that commits them in batches, so callers on the
+# UI thread never touch the disk. Aggregated success rate and median connect
+# time per server feed back into ranking. Attempts the user cancelled before
+# they connected (a dismissed password prompt, Disconnect mid-handshake) are
+# kept but say nothing about the server, so the stats leave them out.
+
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+
+BATCH_SIZE = 100
+BATCH_WINDOW = 0.5
+STATS_WINDOW = 30 * 24 * 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS attempts (
+    id TEXT PRIMARY KEY,
+    server TEXT NOT NULL,
+    host TEXT,
+    country TEXT,
+    kind TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    connect_time REAL,
+    failure_reason TEXT,
+    ended_at REAL,
+    duration REAL,
+    bytes_in INTEGER,
+    bytes_out INTEGER,
+    disconnect_cause TEXT,
+    cancelled TEXT
+);
+CREATE INDEX IF NOT EXISTS attempts_server_time ON attempts (server, started_at);
+CREATE INDEX IF NOT EXISTS attempts_time ON attempts (started_at);
+"""
+
+SUCCESS_SQL = """
+SELECT server,
+       COUNT(*),
+       SUM(connect_time IS NOT NULL)
+FROM attempts
+WHERE started_at >= ? AND cancelled IS NULL AND (connect_time IS NOT NULL OR failure_reason IS NOT NULL)
+GROUP BY server
+"""
+
+MEDIAN_SQL = """
+WITH ordered AS (
+    SELECT server, connect_time,
+           ROW_NUMBER() OVER (PARTITION BY server ORDER BY connect_time) AS rn,
+           COUNT(*) OVER (PARTITION BY server) AS cnt
+    FROM attempts
+    WHERE started_at >= ? AND connect_time IS NOT NULL
+)
+SELECT server, AVG(connect_time)
+FROM ordered
+WHERE rn IN ((cnt + 1) / 2, (cnt + 2) / 2)
+GROUP BY server
+"""
+
+
+def server_key(server):
+    return server.ip
+
+
+class ServerStats:
+    __slots__ = ("attempts", "successes", "median_connect_time")
+
+    def __init__(self, attempts=0, successes=0, median_connect_time=None):
+        self.attempts = attempts
+        self.successes = successes
+        self.median_connect_time = median_connect_time
+
+    @property
+    def success_rate(self):
+        return self.successes / self.attempts if self.attempts else None
+
+
+class HistoryStore:
+    def __init__(self, path):
+        self.path = path
+        self.queue = queue.Queue()
+        db = self.connect()
+        try:
+            db.executescript(SCHEMA)
+            self.migrate(db)
+        finally:
+            db.close()
+        self.writer = threading.Thread(target=self.write_loop, daemon=True)
+        self.writer.start()
+
+    def connect(self):
+        db = sqlite3.connect(self.path, timeout=10)
+        db.execute("PRAGMA journal_mode=WAL")
+        return db
+
+    def migrate(self, db):
+        # Databases written before cancelled attempts were told apart
+        if "cancelled" not in {row[1] for row in db.execute("PRAGMA table_info(attempts)")}:
+            try:
+                db.execute("ALTER TABLE attempts ADD COLUMN cancelled TEXT")
+            except sqlite3.OperationalError:
+                pass  # another instance just added it
+
+    # ── writes (queued) ─────────────────────────────────
+
+    def execute(self, sql, params):
+        self.queue.put((sql, params))
+
+    def start_attempt(self, server, kind="tunnel"):
+        attempt_id = uuid.uuid4().hex
+        self.execute(
+            "INSERT INTO attempts (id, server, host, country, kind, started_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (attempt_id, server_key(server), server.host, server.country, kind, time.time())
+        )
+        return attempt_id
+
+    def connected(self, attempt_id, connect_time):
+        self.execute("UPDATE attempts SET connect_time = ? WHERE id = ?", (connect_time, attempt_id))
+
+    def failed(self, attempt_id, reason):
+        self.execute("UPDATE attempts SET failure_reason = ? WHERE id = ?", (reason, attempt_id))
+
+    def cancelled(self, attempt_id, how):
+        self.execute("UPDATE attempts SET ended_at = ?, cancelled = ? WHERE id = ?", (time.time(), how, attempt_id))
+
+    def ended(self, attempt_id, duration, bytes_in, bytes_out, cause):
+        self.execute(
+            "UPDATE attempts SET ended_at = ?, duration = ?, bytes_in = ?, bytes_out = ?, disconnect_cause = ? "
+            "WHERE id = ?",
+            (time.time(), duration, bytes_in, bytes_out, cause, attempt_id)
+        )
+
+    def write_loop(self):
+        db = self.connect()
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = time.monotonic() + BATCH_WINDOW
+            stop = False
+            while len(batch) < BATCH_SIZE:
+                try:
+                    item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            try:
+                with db:
+                    for sql, params in batch:
+                        db.execute(sql, params)
+            except sqlite3.Error:
+                pass  # history is best effort; never take the app down over it
+            if stop:
+                break
+        db.close()
+
+    def close(self, timeout=2):
+        self.queue.put(None)
+        self.writer.join(timeout)
+
+    # ── reads ───────────────────────────────────────────
+
+    def stats(self, window=STATS_WINDOW):
+        since = time.time() - window
+        stats = {}
+        db = self.connect()
+        try:
+            for server, attempts, successes in db.execute(SUCCESS_SQL, (since,)):
+                stats[server] = ServerStats(attempts, successes or 0)
+            for server, median in db.execute(MEDIAN_SQL, (since,)):
+                stats.setdefault(server, ServerStats()).median_connect_time = median
+        finally:
+            db.close()
+        return stats
+
+    def annotate(self, records):
+        stats = self.stats()
+        for record in records:
+            entry = stats.get(server_key(record))
+            if entry:
+                record.success_rate = entry.success_rate
+                record.connect_time = entry.median_connect_time
+        return records
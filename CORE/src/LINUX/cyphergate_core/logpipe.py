@@ -0,0 +1,142 @@
+# OpenVPN output pipeline.
+#
+# openvpn's stdout and stderr are merged into one pipe that a reader thread
+# drains line by line, so the process never stalls on a full pipe and no UI
+# thread ever touches it. Every line goes to three places:
+#   - a ring buffer with the last `lines` lines, for showing recent output;
+#   - openvpn.log, which is rolled over at `max_bytes` into gzip-compressed
+#     openvpn.log.1.gz .. openvpn.log.N.gz, so disk use stays bounded;
+#   - a parser that turns the lines we care about into LogEvents.
+
+import gzip
+import os
+import re
+import shutil
+import threading
+import time
+from collections import deque
+
+DEFAULT_MAX_BYTES = 1024 * 1024
+DEFAULT_BACKUPS = 5
+DEFAULT_LINES = 500
+
+# kind, pattern; named groups end up in LogEvent.data
+EVENT_PATTERNS = (
+    ("handshake", re.compile(r"Initialization Sequence Completed")),
+    ("tun_device", re.compile(r"TUN/TAP device (?P<device>\S+) opened")),
+    ("peer", re.compile(r"Peer Connection Initiated with \[AF_INET6?\](?P<peer>\S+)")),
+    ("tls_error", re.compile(r"(?P<error>TLS Error: .*|TLS handshake failed|VERIFY ERROR: .*|tls-crypt unwrap error.*)")),
+    ("auth_failed", re.compile(r"AUTH_FAILED")),
+    ("reconnect", re.compile(r"SIGUSR1\[(?:soft|hard),(?P<reason>[^\]]*)\] received, process restarting")),
+    ("fatal", re.compile(r"(?P<error>Exiting due to fatal error|Options error: .*|Cannot open TUN/TAP dev .*)")),
+    ("bytes", re.compile(r"(?P<layer>TUN/TAP|TCP/UDP) (?P<direction>read|write) bytes,(?P<bytes>\d+)")),
+)
+ERROR_KINDS = {"tls_error", "auth_failed", "fatal"}
+
+
+class LogEvent:
+    def __init__(self, kind, line, data):
+        self.kind = kind
+        self.line = line
+        self.data = data
+        self.time = time.time()
+
+    @property
+    def is_error(self):
+        return self.kind in ERROR_KINDS
+
+
+def parse_line(line):
+    for kind, pattern in EVENT_PATTERNS:
+        match = pattern.search(line)
+        if match:
+            data = match.groupdict()
+            if "bytes" in data:
+                data["bytes"] = int(data["bytes"])
+            return LogEvent(kind, line, data)
+    return None
+
+
+class RotatingLog:
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES, backups=DEFAULT_BACKUPS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.f = None
+        self.size = 0
+
+    def backup_path(self, n):
+        return f"{self.path}.{n}.gz"
+
+    def open(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.f = open(self.path, "a", encoding="utf-8", errors="replace", buffering=1)
+        self.size = self.f.tell()
+
+    def write(self, line):
+        if self.f is None:
+            self.open()
+        data = line + "\n"
+        if self.size and self.size + len(data) > self.max_bytes:
+            self.rotate()
+        self.f.write(data)
+        self.size += len(data)
+
+    def rotate(self):
+        self.f.close()
+        if self.backups > 0:
+            for n in range(self.backups - 1, 0, -1):
+                if os.path.exists(self.backup_path(n)):
+                    os.replace(self.backup_path(n), self.backup_path(n + 1))
+            with open(self.path, "rb") as src, gzip.open(self.backup_path(1), "wb") as dst:
+                shutil.copyfileobj(src, dst)
+        self.f = open(self.path, "w", encoding="utf-8", errors="replace", buffering=1)
+        self.size = 0
+
+    def close(self):
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+
+
+class LogPipeline:
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES, backups=DEFAULT_BACKUPS, lines=DEFAULT_LINES):
+        self.file = RotatingLog(path, max_bytes, backups)
+        self.buffer = deque(maxlen=lines)
+        self.lock = threading.Lock()
+
+    def attach(self, stream, banner=None, on_event=None):
+        # Drains `stream` (a binary pipe) on a daemon thread until EOF; returns the thread
+        if banner:
+            self.append(f"===== {time.strftime('%Y-%m-%d %H:%M:%S')} {banner} =====")
+        reader = threading.Thread(target=self.read, args=(stream, on_event), daemon=True)
+        reader.start()
+        return reader
+
+    def read(self, stream, on_event):
+        with stream:
+            for raw in iter(stream.readline, b""):
+                line = raw.decode("utf-8", errors="replace").rstrip("\r\n")
+                if not line:
+                    continue
+                self.append(line)
+                event = parse_line(line)
+                if event and on_event:
+                    on_event(event)
+
+    def append(self, line):
+        with self.lock:
+            self.buffer.append(line)
+            try:
+                self.file.write(line)
+            except OSError:
+                pass  # a full or read-only disk shouldn't take the tunnel down
+
+    def tail(self, n=None):
+        with self.lock:
+            lines = list(self.buffer)
+        return lines if n is None else lines[-n:]
+
+    def close(self):
+        with self.lock:
+            self.file.close()
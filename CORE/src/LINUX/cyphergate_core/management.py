@@ -0,0 +1,149 @@
+# Client for the OpenVPN management interface.
+#
+# openvpn is started with `--management ... --management-hold`, so it opens
+# a local socket and waits for us before doing anything. openvpn runs as root
+# and the interface can signal or kill it, so nobody else may reach it: on
+# Unix it is a socket in a directory only we can enter and openvpn accepts
+# only our user on it; on Windows, which has no Unix sockets here, it is a
+# localhost port that wants a one-time password first. The client reads the
+# socket on its own thread (blocking reads, so it costs no CPU while idle),
+# turns `>STATE:` notifications into state callbacks and passes every other
+# real-time message (`>HOLD:`, `>BYTECOUNT:`, ...) to on_event.
+
+import os
+import re
+import secrets
+import shutil
+import socket
+import tempfile
+import threading
+import time
+
+STATES = (
+    "CONNECTING", "WAIT", "AUTH", "GET_CONFIG", "ASSIGN_IP", "ADD_ROUTES",
+    "CONNECTED", "RECONNECTING", "EXITING", "RESOLVE", "TCP_CONNECT", "AUTH_PENDING",
+)
+
+# Lines printed in reply to the `state` command, e.g. "1700000000,CONNECTED,SUCCESS,10.8.0.6,..."
+STATE_HISTORY_RE = re.compile(r"^\d+,[A-Z_]+,")
+
+# Where Windows management ports are picked from (the dynamic range)
+PORT_RANGE = (49152, 65535)
+
+
+class ManagementEndpoint:
+    # A private place for one openvpn's management interface, in a fresh
+    # 0700 directory that close() removes again
+    def __init__(self, runtime_dir=None):
+        self.dir = tempfile.mkdtemp(prefix="cyphergate-", dir=runtime_dir or os.environ.get("XDG_RUNTIME_DIR"))
+        if os.name == "nt":
+            self.address = ("127.0.0.1", PORT_RANGE[0] + secrets.randbelow(PORT_RANGE[1] - PORT_RANGE[0]))
+            self.password = secrets.token_urlsafe(24)
+            self.password_file = os.path.join(self.dir, "mgmt.pw")
+            fd = os.open(self.password_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            with os.fdopen(fd, "w") as f:
+                f.write(self.password + "\n")
+        else:
+            self.address = os.path.join(self.dir, "mgmt.sock")
+            self.password = None
+            self.password_file = None
+
+    def args(self):
+        if self.password_file is not None:
+            host, port = self.address
+            return ["--management", host, str(port), self.password_file]
+        import pwd
+
+        user = pwd.getpwuid(os.getuid()).pw_name
+        return ["--management", self.address, "unix", "--management-client-user", user]
+
+    def close(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+
+class ManagementClient:
+    def __init__(self, address, password=None, on_state=None, on_event=None, on_close=None):
+        self.address = address  # socket path, or (host, port)
+        self.password = password
+        self.on_state = on_state
+        self.on_event = on_event
+        self.on_close = on_close
+        self.sock = None
+        self.send_lock = threading.Lock()
+        self.closed = False
+
+    def connect(self, timeout, alive=lambda: True, interval=0.2):
+        # openvpn only opens the socket once it's running (and, under pkexec,
+        # once the user has authenticated), so keep trying until it shows up.
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                self.sock = self.open(interval * 5)
+            except OSError:
+                if self.closed or not alive() or time.monotonic() >= deadline:
+                    raise
+                time.sleep(interval)
+                continue
+            if self.password is not None:
+                # Answers the "ENTER PASSWORD:" prompt; a wrong one makes openvpn hang up
+                self.send(self.password)
+            return
+
+    def open(self, timeout):
+        if isinstance(self.address, tuple):
+            sock = socket.create_connection(self.address, timeout=timeout)
+        else:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.settimeout(timeout)
+                sock.connect(self.address)
+            except OSError:
+                sock.close()
+                raise
+        sock.settimeout(None)
+        return sock
+
+    def start(self):
+        threading.Thread(target=self.read_loop, daemon=True).start()
+
+    def send(self, command):
+        with self.send_lock:
+            if self.sock is None:
+                raise OSError("Management interface is not connected")
+            self.sock.sendall(command.encode() + b"\n")
+
+    def close(self):
+        self.closed = True
+        if self.sock is not None:
+            try:
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self.sock.close()
+
+    def read_loop(self):
+        try:
+            with self.sock.makefile("rb") as lines:
+                for raw in lines:
+                    self.handle_line(raw.decode("utf-8", errors="replace").rstrip("\r\n"))
+        except OSError:
+            pass
+        finally:
+            if self.on_close:
+                self.on_close()
+
+    def handle_line(self, line):
+        if line.startswith(">STATE:"):
+            self.handle_state(line[len(">STATE:"):])
+        elif line.startswith(">"):
+            kind, _, payload = line[1:].partition(":")
+            if self.on_event:
+                self.on_event(kind, payload)
+        elif STATE_HISTORY_RE.match(line):
+            self.handle_state(line)
+
+    def handle_state(self, payload):
+        # time,state,detail,local_ip,remote_ip,remote_port,...
+        fields = payload.split(",")
+        if len(fields) >= 2 and self.on_state:
+            self.on_state(fields[1], fields[2] if len(fields) > 2 else "", fields)
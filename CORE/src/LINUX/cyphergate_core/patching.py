@@ -0,0 +1,185 @@
+# OpenVPN config fixes applied before every connect.
+#
+# A config is parsed once into a list of directives, every rule edits that
+# list in a single pass and the result is rendered back out. Patched configs
+# are cached on disk under a hash of the original config plus the rule set,
+# so reconnecting to a known server is a lookup rather than a rewrite.
+
+import base64
+import hashlib
+import json
+import os
+import re
+
+from .cache import atomic_open
+
+DATA_CIPHERS = "AES-256-GCM:AES-128-GCM:CHACHA20-POLY1305:AES-128-CBC"
+FALLBACK_CIPHER = "AES-128-CBC"
+
+# Bump when a rule changes what it writes, so old cache entries stop matching
+RULES_VERSION = 1
+DEFAULT_MAX_ENTRIES = 256
+
+BLOCK_START_RE = re.compile(r"^[ \t]*<([\w-]+)>[ \t]*$")
+
+
+class Directive:
+    # One config line, or one whole inline <block>; comments and blank lines have no name
+    __slots__ = ("name", "args", "raw")
+
+    def __init__(self, name, args=(), raw=None):
+        self.name = name
+        self.args = tuple(args)
+        self.raw = raw
+
+    def render(self):
+        if self.raw is not None:
+            return self.raw
+        return " ".join((self.name,) + self.args)
+
+
+class OpenVPNConfig:
+    def __init__(self, directives, newline="\n"):
+        self.directives = directives
+        self.newline = newline
+
+    @classmethod
+    def parse(cls, text):
+        newline = "\r\n" if "\r\n" in text else "\n"
+        directives = []
+        lines = iter(text.splitlines())
+        for line in lines:
+            block = BLOCK_START_RE.match(line)
+            if block:
+                # Keep inline certs and keys verbatim, up to the closing tag
+                end = f"</{block.group(1)}>"
+                body = [line]
+                for inner in lines:
+                    body.append(inner)
+                    if inner.strip() == end:
+                        break
+                directives.append(Directive(f"<{block.group(1)}>", raw=newline.join(body)))
+                continue
+            tokens = line.split()
+            if not tokens or tokens[0].startswith(("#", ";")):
+                directives.append(Directive(None, raw=line))
+            else:
+                directives.append(Directive(tokens[0], tokens[1:], raw=line))
+        return cls(directives, newline)
+
+    def has(self, name):
+        return any(directive.name == name for directive in self.directives)
+
+    def get(self, name):
+        # Arguments of the first occurrence, or None
+        for directive in self.directives:
+            if directive.name == name:
+                return directive.args
+        return None
+
+    def add(self, name, *args):
+        self.directives.append(Directive(name, args))
+
+    def remove(self, name):
+        self.directives = [directive for directive in self.directives if directive.name != name]
+
+    def render(self):
+        return self.newline.join(directive.render() for directive in self.directives) + self.newline
+
+
+def patch_ciphers(config, options):
+    # VPNGate configs predate OpenVPN 2.5's cipher negotiation
+    if not config.has("data-ciphers"):
+        config.add("data-ciphers", DATA_CIPHERS)
+    if not config.has("cipher"):
+        config.add("cipher", FALLBACK_CIPHER)
+
+
+def patch_ipv6(config, options):
+    # Only when the caller found the server reachable over IPv6
+    if options.get("ipv6") and not config.has("tun-ipv6"):
+        config.add("tun-ipv6")
+        config.add("push-peer-info")
+        config.add("redirect-gateway", "def1", "ipv6")
+        config.add("route-ipv6", "2000::/3", "::1")
+
+
+def patch_performance(config, options):
+    # fast-io only helps (and is only supported) for UDP on non-Windows hosts
+    proto = config.get("proto")
+    if options.get("fast_io") and proto and proto[0].startswith("udp") and not config.has("fast-io"):
+        config.add("fast-io")
+
+
+DEFAULT_RULES = (
+    ("ciphers", patch_ciphers),
+    ("ipv6", patch_ipv6),
+    ("performance", patch_performance),
+)
+
+
+def patch_config(text, options=None, rules=DEFAULT_RULES):
+    config = OpenVPNConfig.parse(text)
+    options = options or {}
+    for _, rule in rules:
+        rule(config, options)
+    return config.render()
+
+
+class PatchedConfigCache:
+    # Patched configs stored as <hash>.ovpn in `directory`, keyed by the base64
+    # config straight from the server list plus the rules and their options
+    def __init__(self, directory, rules=DEFAULT_RULES, max_entries=DEFAULT_MAX_ENTRIES):
+        self.directory = directory
+        self.rules = rules
+        self.max_entries = max_entries
+        os.makedirs(directory, exist_ok=True)
+
+    def signature(self, options):
+        return json.dumps(
+            [RULES_VERSION, [name for name, _ in self.rules], sorted(options.items())],
+            separators=(",", ":")
+        ).encode()
+
+    def key(self, config_b64, options):
+        digest = hashlib.sha256(config_b64)
+        digest.update(b"\0")
+        digest.update(self.signature(options))
+        return digest.hexdigest()
+
+    def path_for(self, config_ref, **options):
+        # Returns the path of the patched config, building it on a miss
+        config_b64 = config_ref.read_b64()
+        path = os.path.join(self.directory, f"{self.key(config_b64, options)}.ovpn")
+        try:
+            os.utime(path)  # a hit counts as use; prune() goes by mtime
+            return path
+        except OSError:
+            pass  # a miss
+        text = base64.b64decode(config_b64).decode(errors="ignore")
+        with atomic_open(path) as f:
+            f.write(patch_config(text, options, self.rules).encode())
+        self.prune()
+        return path
+
+    def prune(self):
+        # Oldest entries go first once the directory holds more than max_entries;
+        # another thread may be pruning too, so files can vanish underneath us
+        entries = []
+        try:
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith(".ovpn"):
+                    try:
+                        entries.append((entry.stat().st_mtime, entry.path))
+                    except OSError:
+                        pass
+        except OSError:
+            return
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort()
+        for _, path in entries[:len(entries) - self.max_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
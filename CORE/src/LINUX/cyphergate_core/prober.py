@@ -0,0 +1,151 @@
+# Active latency probing of VPN servers.
+#
+# VPNGate's Ping column is measured from VPNGate's side, so we measure our own
+# round trip to each server's OpenVPN endpoint: a TCP connect for TCP configs,
+# and for UDP configs an OpenVPN HARD_RESET_CLIENT_V2 packet, which a server
+# without tls-auth answers with a HARD_RESET_SERVER. Probes run on a bounded
+# thread pool with a per-probe timeout and results are cached with a TTL.
+
+import os
+import re
+import socket
+import struct
+import threading
+import time
+
+DEFAULT_PORT = 1194
+DEFAULT_TIMEOUT = 2.0
+DEFAULT_CONCURRENCY = 32
+DEFAULT_TTL = 5 * 60
+
+P_CONTROL_HARD_RESET_CLIENT_V2 = 7
+
+REMOTE_RE = re.compile(r"^[ \t]*remote[ \t]+(\S+)(?:[ \t]+(\d+))?(?:[ \t]+(\S+))?", re.MULTILINE)
+PROTO_RE = re.compile(r"^[ \t]*proto[ \t]+(\S+)", re.MULTILINE)
+PORT_RE = re.compile(r"^[ \t]*r?port[ \t]+(\d+)", re.MULTILINE)
+
+
+def normalize_proto(proto):
+    return "tcp" if proto and proto.startswith("tcp") else "udp"
+
+
+def extract_remotes(config):
+    # All `remote host [port] [proto]` lines, falling back to the global
+    # `proto` / `port` directives the same way openvpn does.
+    match = PROTO_RE.search(config)
+    default_proto = normalize_proto(match.group(1) if match else "udp")
+    match = PORT_RE.search(config)
+    default_port = int(match.group(1)) if match else DEFAULT_PORT
+
+    remotes = []
+    for host, port, proto in REMOTE_RE.findall(config):
+        remotes.append((
+            host,
+            int(port) if port else default_port,
+            normalize_proto(proto) if proto else default_proto
+        ))
+    return remotes
+
+
+def probe_tcp(host, port, timeout):
+    start = time.perf_counter()
+    with socket.create_connection((host, port), timeout=timeout):
+        return time.perf_counter() - start
+
+
+def hard_reset_packet():
+    # opcode/key_id, 8-byte session id, empty ack array, packet id 0
+    return struct.pack("!B8sBI", P_CONTROL_HARD_RESET_CLIENT_V2 << 3, os.urandom(8), 0, 0)
+
+
+def probe_udp(host, port, timeout):
+    family, type_, proto, _, address = socket.getaddrinfo(host, port, type=socket.SOCK_DGRAM)[0]
+    with socket.socket(family, type_, proto) as sock:
+        sock.settimeout(timeout)
+        sock.connect(address)
+        start = time.perf_counter()
+        sock.send(hard_reset_packet())
+        sock.recv(2048)
+        return time.perf_counter() - start
+
+
+PROBES = {"tcp": probe_tcp, "udp": probe_udp}
+
+
+class LatencyProber:
+    def __init__(self, timeout=DEFAULT_TIMEOUT, concurrency=DEFAULT_CONCURRENCY, ttl=DEFAULT_TTL):
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self.ttl = ttl
+        self.results = {}  # (host, port, proto) -> (rtt in ms or None, measured_at)
+        self.targets = {}  # server IP -> target, remembered so reloads needn't decode configs
+        self.lock = threading.Lock()
+
+    def cached(self, target):
+        with self.lock:
+            entry = self.results.get(target)
+        if entry and time.monotonic() - entry[1] < self.ttl:
+            return entry
+        return None
+
+    def probe(self, target):
+        host, port, proto = target
+        try:
+            rtt = PROBES[proto](host, port, self.timeout) * 1000
+        except OSError:
+            rtt = None  # unreachable or timed out
+        with self.lock:
+            self.results[target] = (rtt, time.monotonic())
+        return rtt
+
+    def probe_many(self, targets):
+        # Returns {target: rtt_ms or None}; fresh cache entries are not re-probed
+        results = {}
+        pending = []
+        for target in dict.fromkeys(targets):
+            entry = self.cached(target)
+            if entry:
+                results[target] = entry[0]
+            else:
+                pending.append(target)
+        if pending:
+            from concurrent.futures import ThreadPoolExecutor  # keeps `cyphergate list` startup lean
+            workers = min(self.concurrency, len(pending))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                for target, rtt in zip(pending, pool.map(self.probe, pending)):
+                    results[target] = rtt
+        return results
+
+    def target_for(self, record):
+        try:
+            remotes = extract_remotes(record.config.decode())
+        except (OSError, ValueError):
+            return None
+        return remotes[0] if remotes else None
+
+    def probe_servers(self, records):
+        # Measures every record and stores the result on record.rtt
+        targets = {}
+        for record in records:
+            target = self.target_for(record)
+            if target:
+                targets[record] = target
+                self.targets[record.ip] = target
+        results = self.probe_many(targets.values())
+        for record, target in targets.items():
+            record.rtt = results.get(target)
+        return records
+
+    def annotate(self, records):
+        # Copies still-fresh measurements onto a newly loaded set of records and
+        # reports whether any were found
+        found = False
+        if not self.targets:
+            return found
+        for record in records:
+            target = self.targets.get(record.ip)
+            entry = self.cached(target) if target else None
+            if entry:
+                record.rtt = entry[0]
+                found = True
+        return found
@@ -0,0 +1,108 @@
+# Parallel handshake racing across several candidate servers.
+#
+# Every candidate gets its own openvpn process with `--dev null` and no
+# ifconfig/route changes, so the racers need no privileges and can't fight
+# over the routing table. The first one to reach CONNECTED wins; the rest are
+# torn down and each candidate's outcome is reported. The caller then opens
+# the real tunnel to the winner, which is known to be answering right now.
+
+import threading
+
+from .session import OpenVPNSession
+
+RACE_ARGS = (
+    "--dev", "null",
+    "--ifconfig-noexec",
+    "--route-noexec",
+    "--connect-retry-max", "1",
+    "--resolv-retry", "0",
+)
+
+
+class RaceEntry:
+    def __init__(self, server, config_path):
+        self.server = server
+        self.config_path = config_path
+        self.session = None
+        self.outcome = "pending"
+        self.elapsed = None
+
+
+class ConnectRace:
+    def __init__(self, entries, command, popen_kwargs=None, timeout=30, on_winner=None, on_failed=None):
+        self.entries = list(entries)
+        self.command = command
+        self.popen_kwargs = popen_kwargs or {}
+        self.timeout = timeout
+        self.on_winner = on_winner  # (entry, entries)
+        self.on_failed = on_failed  # (entries)
+        self.winner = None
+        self.done = False
+        self.lock = threading.Lock()
+
+    def start(self):
+        for entry in self.entries:
+            entry.session = OpenVPNSession(
+                self.command, entry.config_path,
+                popen_kwargs=self.popen_kwargs,
+                connect_timeout=self.timeout,
+                extra_args=RACE_ARGS,
+                on_connected=lambda elapsed, e=entry: self.handle_connected(e, elapsed),
+                on_failed=lambda reason, e=entry: self.handle_failed(e, reason),
+            )
+            try:
+                entry.session.start()
+            except OSError as e:
+                self.handle_failed(entry, f"could not start openvpn: {e}")
+
+    def handle_connected(self, entry, elapsed):
+        with self.lock:
+            if self.winner is not None or self.done:
+                entry.outcome = f"handshake done in {elapsed:.1f}s, after the winner"
+                winner = None
+            else:
+                self.winner = winner = entry
+                self.done = True
+                entry.outcome = "won"
+            entry.elapsed = elapsed
+        if winner is None:
+            threading.Thread(target=entry.session.stop, daemon=True).start()
+            return
+
+        for other in self.entries:
+            if other is not entry and other.outcome == "pending":
+                other.outcome = f"lost to {entry.server.ip} ({elapsed:.1f}s)"
+        self.stop_all()
+        if self.on_winner:
+            self.on_winner(entry, self.entries)
+
+    def handle_failed(self, entry, reason):
+        with self.lock:
+            if entry.outcome == "pending":
+                entry.outcome = f"failed: {reason}"
+            all_failed = not self.done and all(e.outcome.startswith("failed") for e in self.entries)
+            if all_failed:
+                self.done = True
+        if all_failed and self.on_failed:
+            self.on_failed(self.entries)
+
+    def stop_all(self):
+        # Includes the winner: its probe tunnel has no routes, the caller reconnects for real
+        for entry in self.entries:
+            if entry.session is not None:
+                threading.Thread(target=entry.session.stop, daemon=True).start()
+
+    def cancel(self):
+        with self.lock:
+            self.done = True
+        for entry in self.entries:
+            if entry.outcome == "pending":
+                entry.outcome = "cancelled"
+        self.stop_all()
+
+
+def race_report(entries):
+    lines = []
+    for entry in entries:
+        lines.append(f"{entry.server.country} {entry.server.ip}: {entry.outcome}")
+    return "\n".join(lines)
@@ -0,0 +1,102 @@
+# In-process DNS resolution with a TTL cache.
+#
+# Lookups are plain getaddrinfo calls on a small thread pool, so nothing
+# spawns nslookup and nothing waits on the UI thread unless it asks to.
+# Results (A and AAAA together, or "no such name") are cached for `ttl`
+# seconds, failures for `negative_ttl`; concurrent requests for the same name
+# share one lookup. The config preparer looks up the servers the user is
+# likely to pick ahead of time, so the lookup at connect time is normally a
+# cache hit.
+#
+# VPNGate configs point `remote` at the server's IPv4 address, so asking
+# that literal for AAAA can't find anything. The IPv6 address, if the server
+# has one, is published under its DDNS name, <host>.opengw.net.
+
+import socket
+import threading
+import time
+
+DDNS_SUFFIX = ".opengw.net"
+DEFAULT_TTL = 5 * 60
+DEFAULT_NEGATIVE_TTL = 60
+DEFAULT_WORKERS = 8
+
+
+def ddns_name(server):
+    return server.host if "." in server.host else server.host + DDNS_SUFFIX
+
+
+class Addresses:
+    def __init__(self, ipv4=(), ipv6=()):
+        self.ipv4 = list(ipv4)
+        self.ipv6 = list(ipv6)
+
+
+class Resolver:
+    def __init__(self, ttl=DEFAULT_TTL, negative_ttl=DEFAULT_NEGATIVE_TTL, workers=DEFAULT_WORKERS):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.workers = workers
+        self.cache = {}  # host -> (Addresses, expires_at)
+        self.pending = {}  # host -> Future of the lookup in flight
+        self.executor = None
+        self.lock = threading.Lock()
+
+    def cached(self, host):
+        with self.lock:
+            entry = self.cache.get(host)
+            if entry is None:
+                return None
+            if entry[1] <= time.monotonic():
+                del self.cache[host]
+                return None
+            return entry[0]
+
+    def resolve(self, host):
+        # Future of the host's Addresses; shares a lookup already in flight
+        from concurrent.futures import Future, ThreadPoolExecutor
+
+        addresses = self.cached(host)
+        if addresses is not None:
+            future = Future()
+            future.set_result(addresses)
+            return future
+        with self.lock:
+            future = self.pending.get(host)
+            if future is None:
+                if self.executor is None:
+                    self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="resolver")
+                future = self.pending[host] = self.executor.submit(self.query, host)
+        return future
+
+    def query(self, host):
+        try:
+            try:
+                infos = socket.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+            except (OSError, ValueError):
+                infos = []  # no such name, resolver trouble or a name getaddrinfo won't take
+            addresses = Addresses(
+                dict.fromkeys(info[4][0] for info in infos if info[0] == socket.AF_INET),
+                dict.fromkeys(info[4][0] for info in infos if info[0] == socket.AF_INET6)
+            )
+            ttl = self.ttl if infos else self.negative_ttl
+            with self.lock:
+                self.cache[host] = (addresses, time.monotonic() + ttl)
+            return addresses
+        finally:
+            # Even if something else went wrong, so the next resolve() starts a new lookup
+            with self.lock:
+                self.pending.pop(host, None)
+
+    def lookup(self, host, timeout=None):
+        # Blocking; raises concurrent.futures.TimeoutError after `timeout` seconds
+        addresses = self.cached(host)
+        if addresses is not None:
+            return addresses
+        return self.resolve(host).result(timeout)
+
+    def close(self):
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
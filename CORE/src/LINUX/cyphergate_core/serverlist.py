@@ -0,0 +1,89 @@
+# Streaming VPNGate CSV ingestion.
+#
+# The OpenVPN config column is by far the largest part of every row, and only
+# the one server we connect to ever needs it. Rows are parsed line by line
+# while the raw bytes are copied to the cache file, and each server keeps a
+# ConfigRef (byte offset + length into that file) instead of the base64 blob.
+
+import base64
+import csv
+import zlib
+
+from .store import ServerRecord
+
+
+class ConfigRef:
+    __slots__ = ("path", "offset", "length", "crc")
+
+    def __init__(self, path, offset, length, crc):
+        self.path = path
+        self.offset = offset
+        self.length = length
+        self.crc = crc
+
+    def read_b64(self):
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            data = f.read(self.length)
+        if len(data) != self.length or zlib.crc32(data) != self.crc:
+            raise ValueError("Server list changed on disk, please refresh and try again.")
+        return data
+
+    def decode(self):
+        return base64.b64decode(self.read_b64()).decode(errors="ignore")
+
+
+def parse_row(fields):
+    return next(csv.reader([fields.decode("utf-8", errors="replace")]))
+
+
+def parse_lines(lines, path, out=None):
+    # `lines` yields raw lines including their line terminator. When `out` is
+    # given every line is copied into it, so offsets always refer to `path`.
+    servers = []
+    offset = 0
+    for raw in lines:
+        if out is not None:
+            out.write(raw)
+        start = offset
+        offset += len(raw)
+
+        line = raw.rstrip(b"\r\n")
+        if not line or line[:1] in (b"*", b"#"):
+            continue
+        split = line.rfind(b",")
+        if split == -1:
+            continue
+        row = parse_row(line[:split])
+        if len(row) < 14:
+            continue
+
+        config = line[split + 1:]
+        try:
+            ping = int(row[3]) if row[3].strip().isdigit() else None
+            speed = int(row[4])
+            sessions = int(row[7])
+            score = int(row[2] or 0)
+            uptime = int(row[8] or 0)
+            total_users = int(row[9] or 0)
+            total_traffic = int(row[10] or 0)
+        except ValueError:
+            continue
+        ref = ConfigRef(path, start + split + 1, len(config), zlib.crc32(config))
+        servers.append(ServerRecord(
+            row[0], row[1], row[5], row[6], ping, speed, sessions, ref,
+            score, uptime, total_users, total_traffic, row[12]
+        ))
+    return servers
+
+
+def iter_terminated(lines):
+    # requests' iter_lines() strips terminators; put one back so byte offsets
+    # into the cache copy stay exact.
+    for line in lines:
+        yield line + b"\n"
+
+
+def read_server_list(cache_path):
+    with open(cache_path, "rb") as f:
+        return parse_lines(f, cache_path)
@@ -0,0 +1,174 @@
+# One openvpn process driven through its management interface.
+#
+# The session reports real transitions instead of guessing: on_state for every
+# `>STATE:` change, on_connected once CONNECTED arrives (with the measured
+# handshake time), on_failed if the process dies, the tunnel exits or the
+# timeout passes before that, and on_exit when a connected tunnel goes away.
+# Callbacks run on background threads; GUIs should marshal them themselves.
+
+import subprocess
+import threading
+import time
+
+from .management import ManagementClient, ManagementEndpoint
+
+DEFAULT_CONNECT_TIMEOUT = 60
+BYTECOUNT_INTERVAL = 5
+STOP_TIMEOUT = 5
+
+
+class OpenVPNSession:
+    def __init__(self, command, config_path, popen_kwargs=None, connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                 on_state=None, on_connected=None, on_failed=None, on_exit=None, extra_args=(), kill=None,
+                 bytecount_interval=BYTECOUNT_INTERVAL):
+        self.command = list(command)
+        self.config_path = config_path
+        self.popen_kwargs = popen_kwargs or {}
+        self.connect_timeout = connect_timeout
+        self.extra_args = list(extra_args)
+        self.kill = kill or (lambda process: process.terminate())
+        self.bytecount_interval = bytecount_interval
+        self.on_state = on_state
+        self.on_connected = on_connected
+        self.on_failed = on_failed
+        self.on_exit = on_exit
+
+        self.process = None
+        self.endpoint = None
+        self.client = None
+        self.state = "LAUNCHING"
+        self.connected = False
+        self.finished = False
+        self.stopping = False
+        self.started_at = None
+        self.connected_at = None
+        self.handshake_time = None
+        self.tunnel_ip = None
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.lock = threading.Lock()
+
+    def args(self, endpoint):
+        return self.command + ["--config", self.config_path] + endpoint.args() + ["--management-hold"] + self.extra_args
+
+    def start(self):
+        self.endpoint = ManagementEndpoint()
+        self.started_at = time.monotonic()
+        try:
+            self.process = subprocess.Popen(self.args(self.endpoint), **self.popen_kwargs)
+        except OSError:
+            self.endpoint.close()
+            raise
+        self.client = ManagementClient(
+            self.endpoint.address, self.endpoint.password, on_state=self.handle_state, on_event=self.handle_event
+        )
+        threading.Thread(target=self.attach, daemon=True).start()
+        threading.Thread(target=self.wait_for_exit, daemon=True).start()
+
+        timer = threading.Timer(self.connect_timeout, self.check_timeout)
+        timer.daemon = True
+        timer.start()
+
+    def attach(self):
+        try:
+            self.client.connect(self.connect_timeout, alive=lambda: self.process.poll() is None)
+            # Set up before reading, so the >HOLD that releases openvpn is only seen after this
+            self.client.send("state on")
+            self.client.send(f"bytecount {self.bytecount_interval}")
+            self.client.start()
+        except OSError as e:
+            if not self.stopping:
+                self.fail(f"Could not reach the OpenVPN management interface: {e}")
+
+    def handle_event(self, kind, payload):
+        if kind == "HOLD":
+            # Only release once state notifications are on, so none are missed
+            self.client.send("hold release")
+        elif kind == "BYTECOUNT":
+            received, _, sent = payload.partition(",")
+            try:
+                self.bytes_in, self.bytes_out = int(received), int(sent)
+            except ValueError:
+                pass
+
+    def handle_state(self, state, detail, fields):
+        with self.lock:
+            if self.finished:
+                return
+            self.state = state
+            just_connected = state == "CONNECTED" and not self.connected
+            if state == "CONNECTED" and len(fields) > 3:
+                self.tunnel_ip = fields[3] or None  # local address of the tun interface
+            if just_connected:
+                self.connected = True
+                self.connected_at = time.monotonic()
+                self.handshake_time = self.connected_at - self.started_at
+        if self.on_state:
+            self.on_state(state, detail)
+        if just_connected and self.on_connected:
+            self.on_connected(self.handshake_time)
+        elif state == "EXITING" and not self.connected and not self.stopping:
+            self.fail(f"OpenVPN exited before connecting ({detail or 'no reason given'})")
+
+    def wait_for_exit(self):
+        code = self.process.wait()
+        if self.client:
+            self.client.close()
+        self.endpoint.close()
+        with self.lock:
+            was_connected = self.connected
+            already_done = self.finished
+            self.finished = True
+        if already_done or self.stopping:
+            return
+        if was_connected:
+            if self.on_exit:
+                self.on_exit(code)
+        elif self.on_failed:
+            self.on_failed(f"OpenVPN exited with code {code} before connecting")
+
+    def check_timeout(self):
+        if not self.connected and not self.finished and not self.stopping:
+            self.fail(f"No connection after {self.connect_timeout}s (last state: {self.state})")
+
+    def fail(self, reason):
+        with self.lock:
+            if self.finished:
+                return
+            self.finished = True
+        self.shutdown()
+        if self.on_failed:
+            self.on_failed(reason)
+
+    def terminate(self):
+        # Ask openvpn to shut down cleanly; it's usually running as root, so
+        # the management socket is the one channel we can always signal on.
+        try:
+            self.client.send("signal SIGTERM")
+        except (OSError, AttributeError):
+            pass
+
+    def shutdown(self, timeout=STOP_TIMEOUT):
+        # SIGTERM over management first, the platform kill if that didn't work
+        if self.process is None:
+            return True
+        self.terminate()
+        try:
+            self.process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            self.kill(self.process)
+            try:
+                self.process.wait(timeout)
+            except subprocess.TimeoutExpired:
+                return False
+        return True
+
+    def stop(self, timeout=STOP_TIMEOUT):
+        # User-initiated disconnect. Returns True once the process is gone.
+        self.stopping = True
+        return self.shutdown(timeout)
+
+    def uptime(self):
+        if self.connected_at is None:
+            return 0.0
+        return time.monotonic() - self.connected_at
@@ -0,0 +1,106 @@
+# User settings stored in ~/.config/cyphergate/cyphergate.conf (INI format).
+
+import configparser
+import os
+
+DEFAULTS = {
+    "cache": {
+        # Seconds before the server list is downloaded again; until then it is only
+        # revalidated, if VPNGate sent an ETag or Last-Modified (Refresh always asks)
+        "ttl": "900",
+    },
+    "prober": {
+        # Seconds before a connect/handshake probe counts as a failure
+        "timeout": "2.0",
+        # Probes in flight at once
+        "concurrency": "32",
+        # Seconds a measured RTT is reused before probing again
+        "ttl": "300",
+    },
+    "connection": {
+        # Seconds to wait for openvpn to report CONNECTED (includes the pkexec prompt)
+        "timeout": "60",
+        # Auto-Connect races handshakes to this many top-ranked servers (1 = no race)
+        "race_candidates": "3",
+    },
+    "patching": {
+        # Add fast-io to UDP configs (ignored on Windows, where OpenVPN doesn't support it)
+        "fast_io": "yes",
+        # Patched configs kept in servers/ before the oldest are removed
+        "cache_entries": "256",
+        # Top-ranked servers per country whose configs are decoded, resolved and patched in the background
+        "prepare_ahead": "3",
+        # Prepared servers kept in memory before the least recently used are dropped
+        "prepared_entries": "128",
+    },
+    "http": {
+        # Extra attempts after a connection error, timeout or 429/5xx answer
+        "retries": "3",
+        # Base delay in seconds; each retry waits a random time up to base * 2^attempt
+        "backoff": "0.5",
+        # Straight failures before a host is skipped for breaker_cooldown seconds
+        "breaker_threshold": "5",
+        "breaker_cooldown": "60",
+    },
+    "verify": {
+        # Seconds the post-connect checks (IPv4, IPv6, DNS, route) get before they count as timed out
+        "timeout": "8",
+    },
+    "logging": {
+        # openvpn.log is gzipped into openvpn.log.1.gz.. once it reaches max_bytes
+        "max_bytes": "1048576",
+        "backups": "5",
+        # Recent lines kept in memory for error details
+        "lines": "500",
+    },
+    "sampler": {
+        # Seconds between throughput samples of the connected tunnel
+        "interval": "1",
+        # Seconds between in-tunnel latency probes (TCP connect to rtt_target)
+        "rtt_interval": "5",
+        "rtt_target": "1.1.1.1:443",
+        # Samples kept for the live readout
+        "history": "300",
+    },
+    "watchdog": {
+        # Replace a connected tunnel that stops working with the next-best server of the same country
+        "enabled": "yes",
+        # Seconds without a latency reply or any incoming byte / with traffic going out but nothing back / outside CONNECTED
+        "rtt_timeout": "30",
+        "stall_seconds": "20",
+        "reconnect_grace": "30",
+        # Servers tried before giving up (reset by every manual connect)
+        "max_failovers": "3",
+        # Keep a route-less handshake open to the next server so failover knows where to go
+        "hot_standby": "no",
+    },
+    "resolver": {
+        # Seconds a DNS answer (or a failed lookup) is reused
+        "ttl": "300",
+        "negative_ttl": "60",
+        # Seconds a connect waits on a lookup that wasn't prefetched
+        "timeout": "2",
+    },
+    "ranking": {
+        # Relative weight of each metric in the composite server score (0 disables it)
+        "ping": "1.0",
+        "rtt": "2.0",
+        "speed": "1.0",
+        "score": "0.5",
+        "uptime": "0.5",
+        "load": "0.5",
+        "success": "1.5",
+        "connect_time": "0.5",
+    },
+}
+
+
+def load_settings(path):
+    settings = configparser.ConfigParser()
+    settings.read_dict(DEFAULTS)
+    if os.path.exists(path):
+        settings.read(path, encoding="utf-8")
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            settings.write(f)
+    return settings
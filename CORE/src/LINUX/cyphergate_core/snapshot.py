@@ -0,0 +1,121 @@
+# Binary snapshot of the parsed server list, written next to the CSV cache.
+#
+# Holds the typed records (numbers as numbers, configs as ConfigRefs into the
+# CSV) and the static per-country orderings, stamped with the CSV's sha256.
+# Loading it is an mmap and a few struct.iter_unpack passes instead of
+# csv.reader over every row; a stamp mismatch means the CSV changed and the
+# caller parses it again.
+#
+# Layout (little endian):
+#   header   magic, version, csv sha256, record/string/country counts
+#   strings  one u32 length per string, then the UTF-8 bytes back to back
+#   records  fixed-width RECORD structs
+#   index    per country: name string id, row count, ping order, speed order (u32 ids)
+
+import mmap
+import struct
+from array import array
+
+from .cache import atomic_open
+from .serverlist import ConfigRef
+from .store import ServerRecord, country_index
+
+MAGIC = b"CGSNAP\0\0"
+VERSION = 2
+
+HEADER = struct.Struct("<8sH32sIII")
+# host, ip, country, country_code, operator (string ids), ping (-1 = unknown),
+# speed, sessions, score, uptime, total_users, total_traffic, config offset/length/crc
+RECORD = struct.Struct("<5Iiqiqqqq QII")
+COUNTRY = struct.Struct("<II")
+
+
+def write_snapshot(path, records, csv_sha256, index=None):
+    if index is None:
+        index = country_index(records)
+    strings = {}
+
+    def string_id(text):
+        sid = strings.get(text)
+        if sid is None:
+            sid = strings[text] = len(strings)
+        return sid
+
+    packed_records = bytearray()
+    for record in records:
+        config = record.config
+        packed_records += RECORD.pack(
+            string_id(record.host), string_id(record.ip), string_id(record.country),
+            string_id(record.country_code), string_id(record.operator),
+            -1 if record.ping is None else record.ping,
+            record.speed, record.sessions, record.score, record.uptime,
+            record.total_users, record.total_traffic,
+            config.offset, config.length, config.crc
+        )
+
+    packed_index = bytearray()
+    for country, orders in index.items():
+        packed_index += COUNTRY.pack(string_id(country), len(orders["ping"]))
+        packed_index += array("I", orders["ping"]).tobytes()
+        packed_index += array("I", orders["speed"]).tobytes()
+
+    encoded = [text.encode() for text in strings]
+    with atomic_open(path) as f:
+        f.write(HEADER.pack(
+            MAGIC, VERSION, bytes.fromhex(csv_sha256), len(records), len(encoded), len(index)
+        ))
+        f.write(array("I", [len(data) for data in encoded]).tobytes())
+        f.write(b"".join(encoded))
+        f.write(packed_records)
+        f.write(packed_index)
+
+
+def read_snapshot(path, csv_path, csv_sha256):
+    # Returns (records, index), or None if the snapshot is missing, stale or unreadable
+    try:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return unpack(mm, csv_path, csv_sha256)
+    except (OSError, ValueError, struct.error):
+        return None
+
+
+def unpack(mm, csv_path, csv_sha256):
+    magic, version, csv_digest, count, string_count, country_count = HEADER.unpack_from(mm, 0)
+    if magic != MAGIC or version != VERSION or csv_digest != bytes.fromhex(csv_sha256):
+        return None
+
+    offset = HEADER.size
+    lengths = array("I")
+    lengths.frombytes(mm[offset:offset + 4 * string_count])
+    offset += 4 * string_count
+    strings = []
+    for length in lengths:
+        strings.append(mm[offset:offset + length].decode())
+        offset += length
+
+    end = offset + RECORD.size * count
+    records = [
+        ServerRecord(
+            strings[host], strings[ip], strings[country], strings[code],
+            None if ping < 0 else ping, speed, sessions,
+            ConfigRef(csv_path, config_offset, config_length, crc),
+            score, uptime, total_users, total_traffic, strings[operator]
+        )
+        for (host, ip, country, code, operator, ping, speed, sessions, score, uptime,
+             total_users, total_traffic, config_offset, config_length, crc)
+        in RECORD.iter_unpack(mm[offset:end])
+    ]
+    offset = end
+
+    index = {}
+    for _ in range(country_count):
+        name, rows = COUNTRY.unpack_from(mm, offset)
+        offset += COUNTRY.size
+        ping_order, speed_order = array("I"), array("I")
+        ping_order.frombytes(mm[offset:offset + 4 * rows])
+        speed_order.frombytes(mm[offset + 4 * rows:offset + 8 * rows])
+        offset += 8 * rows
+        index[strings[name]] = {"ping": ping_order.tolist(), "speed": speed_order.tolist()}
+    if offset != len(mm):
+        raise ValueError("trailing data")
+    return records, index
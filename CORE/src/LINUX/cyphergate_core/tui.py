@@ -0,0 +1,527 @@
+# Full-screen terminal interface: `cyphergate tui`, or `cyphergate.py --tui`.
+#
+# Runs on the same engine as the GUI: the typed server store with its
+# prebuilt per-country orders, the ranker, the config preparer and the
+# OpenVPN session. Countries are on the left, the selected country's servers
+# on the right, and `/` filters the focused list as you type. Lists are kept
+# as row ids into the store and only the rows that fit on screen are
+# formatted, so a redraw costs the same however long the server list is.
+#
+# Engine callbacks arrive on worker threads; they are queued and handled on
+# the main thread, the only one that touches curses.
+
+import os
+import queue
+import threading
+import time
+
+try:
+    import curses
+except ImportError:
+    curses = None  # Windows without the windows-curses package
+
+from .sampler import describe
+
+ORDERS = ("score", "ping", "speed", "rtt")
+COUNTRY_WIDTH = 28
+SERVER_HEADER = f"{'HOST':<22} {'IP':<16} {'PING':>7} {'RTT':>7} {'SPEED':>12} {'USERS':>6} {'RANK':>6}"
+HELP = "Enter connect  a auto  d disconnect  / filter  o order  p probe  r refresh  Tab pane  q quit"
+COUNTRIES, SERVERS = 0, 1
+COUNTRIES_POLL = 1.0  # seconds between countries.conf checks
+
+
+def server_line(server):
+    rank = "-" if server.rank is None else f"{server.rank:.3f}"
+    return (f"{server.host:<22} {server.ip:<16} {server.ping_text:>7} {server.rtt_text:>7} "
+            f"{server.speed_text:>12} {server.users_text:>6} {rank:>6}")
+
+
+def needs_password_prompt():
+    # pkexec falls back to a password prompt on the terminal without a desktop session
+    if os.name == "nt" or os.geteuid() == 0:
+        return False
+    return not (os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY"))
+
+
+class TerminalUI:
+    def __init__(self, engine, offline=False):
+        self.engine = engine
+        self.offline = offline
+        self.events = queue.Queue()
+        self.screen = None
+
+        self.countries = []  # country names passing the filter
+        self.counts = {}
+        self.country = None
+        self.ids = []  # row ids of the selected country passing the filter
+        self.order = "score"
+        self.focus = COUNTRIES
+        self.cursor = [0, 0]
+        self.top = [0, 0]
+        self.filters = ["", ""]
+        self.typing = False  # keys go to the focused pane's filter
+        self.tasks = set()  # background jobs in flight: fetch, probe, disconnect
+
+        self.session = None
+        self.server = None
+        self.race = None
+        self.suspended = False  # curses is paused for the pkexec prompt
+        self.status = "Disconnected"
+        self.stats = ""
+        self.message = ""
+        self.countries_checked = time.monotonic()
+
+        for kind in ("state", "connected", "failed", "exit", "race_won", "race_failed",
+                     "log_event", "sample", "failover"):
+            setattr(engine, f"on_{kind}", self.post(kind))
+
+    def post(self, kind):
+        return lambda *args: self.events.put((kind, args))
+
+    def dispatch(self, event):
+        kind, args = event
+        getattr(self, f"on_{kind}")(*args)
+
+    def drain(self):
+        while True:
+            try:
+                self.dispatch(self.events.get_nowait())
+            except queue.Empty:
+                return
+
+    def run_task(self, name, fn, *args):
+        # Blocking engine call on a daemon thread; the result comes back as a task_done event
+        def target():
+            try:
+                result, error = fn(*args), None
+            except Exception as e:
+                result, error = None, e
+            self.events.put(("task_done", (name, result, error)))
+
+        self.tasks.add(name)
+        threading.Thread(target=target, daemon=True).start()
+
+    def on_task_done(self, name, result, error):
+        self.tasks.discard(name)
+        getattr(self, f"{name}_done")(result, error)
+
+    def load(self):
+        # Whatever is on disk right away, then revalidate against VPNGate in the background
+        engine = self.engine
+        if engine.cache.exists():
+            try:
+                self.apply(engine.read_cached())
+            except Exception as e:
+                self.message = f"Cached server list is unreadable: {e}"
+        if not self.offline:
+            self.refresh()
+        elif not engine.cache.exists():
+            self.message = "No cached server list yet; start without --offline once."
+
+    def refresh(self, force=False):
+        # force: the user asked, so skip the cache TTL
+        if "fetch" not in self.tasks:
+            self.message = "Fetching the server list..."
+            self.run_task("fetch", self.engine.fetch, None, force)
+
+    def fetch_done(self, store, error):
+        if error is not None:
+            source = "showing the cached list" if self.engine.store else "no cached list either"
+            self.message = f"Could not fetch the server list ({error}); {source}."
+        elif store is None:
+            self.message = "Server list is up to date."
+            if not self.engine.store and self.engine.cache.exists():
+                self.apply(self.engine.read_cached())
+        else:
+            self.message = f"Loaded {len(store)} servers."
+            self.apply(store)
+
+    def apply(self, store):
+        self.engine.apply(store)
+        self.counts = {country: len(store.ids(country)) for country in store.countries()}
+        self.update_countries()
+        if self.country is not None:
+            self.engine.prepare_ahead(self.country)
+
+    def check_countries(self):
+        # No file watcher in a terminal; countries.conf is small enough to just re-read
+        now = time.monotonic()
+        if now - self.countries_checked < COUNTRIES_POLL:
+            return
+        self.countries_checked = now
+        store = self.engine.reload_countries()
+        if store is not None:
+            self.message = f"countries.conf changed; showing {len(store)} servers."
+            self.apply(store)
+
+    def update_countries(self):
+        text = self.filters[COUNTRIES].lower()
+        self.countries = [country for country in self.engine.store.countries() if text in country.lower()]
+        if self.country in self.countries:
+            self.cursor[COUNTRIES] = self.countries.index(self.country)
+        else:
+            self.cursor[COUNTRIES] = 0
+            self.select_country(self.countries[0] if self.countries else None)
+            return
+        self.update_servers()
+
+    def select_country(self, country):
+        if country == self.country:
+            return
+        self.country = country
+        self.cursor[SERVERS] = self.top[SERVERS] = 0
+        self.update_servers()
+        if country is not None:
+            self.engine.prepare_ahead(country)
+            if self.order == "rtt":
+                self.probe()
+
+    def update_servers(self):
+        store = self.engine.store
+        ids = store.ids(self.country, self.order) if self.country else []
+        text = self.filters[SERVERS].lower()
+        if text:
+            records = store.records
+            ids = [i for i in ids if text in records[i].host.lower() or text in records[i].ip]
+        self.ids = ids
+        self.cursor[SERVERS] = min(self.cursor[SERVERS], max(len(ids) - 1, 0))
+
+    def selected_server(self):
+        if not self.ids:
+            return None
+        return self.engine.store.records[self.ids[self.cursor[SERVERS]]]
+
+    def cycle_order(self):
+        self.order = ORDERS[(ORDERS.index(self.order) + 1) % len(ORDERS)]
+        self.update_servers()
+        self.message = f"Sorted by {self.order}."
+        if self.order == "rtt":
+            self.probe()
+
+    def probe(self):
+        if self.country is None or "probe" in self.tasks:
+            return
+        self.message = f"Measuring RTTs in {self.country}..."
+        self.run_task("probe", self.engine.measure, self.engine.servers(self.country, "ping"))
+
+    def probe_done(self, result, error):
+        self.message = f"RTT probe failed: {error}" if error else "RTTs measured."
+        self.update_servers()
+
+    def connect(self, server):
+        if self.engine.busy():
+            self.message = "Disconnect the current VPN session first (d)."
+            return
+        self.suspend()
+        try:
+            self.session = self.engine.connect(server)
+        except Exception as e:
+            self.resume()
+            self.message = f"Connection failed: {e}"
+            return
+        self.server = server
+        self.stats = ""
+        self.status = f"Connecting to {server.country} ({server.host})..."
+
+    def auto_connect(self):
+        if self.country is None:
+            return
+        if self.engine.busy():
+            self.message = "Disconnect the current VPN session first (d)."
+            return
+        # Best composite score, whatever order the list is showing
+        candidates = self.engine.best(self.country, self.engine.settings.getint("connection", "race_candidates"))
+        if len(candidates) == 1:
+            self.connect(candidates[0])
+            return
+        if "prepare_race" in self.tasks:
+            return
+        self.status = f"Preparing {len(candidates)} servers in {self.country}..."
+        self.run_task("prepare_race", self.engine.prepare_all, candidates)
+
+    def prepare_race_done(self, prepared, error):
+        if error is None:
+            try:
+                self.race = self.engine.start_race(prepared)
+            except Exception as e:
+                error = e
+        if error is not None:
+            if not self.engine.busy():
+                self.status = "Disconnected"
+            self.message = f"Connection failed: {error}"
+            return
+        self.status = f"Racing {len(self.race.entries)} servers in {prepared[0][0].country}..."
+
+    def disconnect(self):
+        if not self.engine.busy() or "disconnect" in self.tasks:
+            return
+        self.session = self.race = None
+        self.status = "Disconnecting..."
+        self.run_task("disconnect", self.engine.disconnect)
+
+    def disconnect_done(self, result, error):
+        self.status = "Disconnected"
+        self.stats = ""
+        if error is not None:
+            self.message = f"Could not stop OpenVPN: {error}"
+
+    def suspend(self):
+        # Hands the terminal to pkexec's password prompt until the session reports back
+        if self.screen is None or not needs_password_prompt():
+            return
+        curses.endwin()
+        print("pkexec needs your password to start OpenVPN; the interface returns once it is running.", flush=True)
+        self.suspended = True
+
+    def resume(self):
+        if self.suspended:
+            self.suspended = False
+            self.screen.refresh()
+
+    def on_state(self, session, state, detail):
+        if session is not self.session:
+            return  # late event from a session we already dropped
+        self.resume()
+        country = self.server.country
+        if session.connected:
+            if state == "RECONNECTING":
+                self.status = f"Reconnecting to {country}..."
+            elif state == "CONNECTED":
+                self.status = f"Connected to {country} ({self.server.host})"
+        else:
+            self.status = f"{country}: {state.replace('_', ' ').title()}..."
+
+    def on_connected(self, session, handshake_time):
+        if session is not self.session:
+            return
+        self.resume()
+        self.status = f"Connected to {self.server.country} ({self.server.host})"
+        self.message = f"Handshake completed in {handshake_time:.1f}s."
+
+    def on_failed(self, session, reason):
+        if session is not self.session:
+            return
+        self.resume()
+        self.session = None
+        self.status = "Disconnected"
+        self.message = "Connection failed: " + " | ".join(reason.splitlines())
+
+    def on_exit(self, session, code):
+        if session is not self.session:
+            return
+        self.resume()
+        self.session = None
+        self.status = "Disconnected"
+        self.stats = ""
+        self.message = f"OpenVPN exited unexpectedly (code {code})."
+
+    def on_race_won(self, race, winner):
+        if race is not self.race:
+            return
+        self.race = None
+        self.connect(winner.server)
+
+    def on_race_failed(self, race):
+        if race is not self.race:
+            return
+        self.race = None
+        self.status = "Disconnected"
+        self.message = "None of the candidates completed a handshake."
+
+    def on_log_event(self, session, event):
+        if session is self.session and event.is_error:
+            self.message = event.line
+
+    def on_sample(self, session, sample):
+        if session is self.session:
+            self.stats = describe(sample)
+
+    def on_failover(self, old_session, new_session, server, reason):
+        # The engine's watchdog gave up on the tunnel and picked the next server itself
+        if old_session is not self.session:
+            return
+        reason = reason.splitlines()[0]
+        self.stats = ""
+        if new_session is None:
+            self.session = None
+            self.status = "Disconnected"
+            self.message = f"Connection lost ({reason}) and no other server could take over."
+            return
+        self.session, self.server = new_session, server
+        self.status = f"Failing over to {server.country} ({server.host})..."
+        self.message = f"{reason}."
+
+    def put(self, y, x, text, width, attr=0):
+        try:
+            self.screen.addnstr(y, x, text.ljust(width), width, attr)
+        except curses.error:
+            pass  # writing the bottom-right cell moves the cursor off screen
+
+    def scroll(self, pane, height):
+        top = self.top[pane]
+        cursor = self.cursor[pane]
+        if cursor < top:
+            top = cursor
+        elif cursor >= top + height:
+            top = cursor - height + 1
+        self.top[pane] = top
+        return top
+
+    def draw(self):
+        screen = self.screen
+        screen.erase()
+        height, width = screen.getmaxyx()
+        if height < 8 or width < COUNTRY_WIDTH + 40:
+            self.put(0, 0, "Terminal too small for CypherGate", width)
+            screen.refresh()
+            return
+
+        self.put(0, 0, f" CypherGate  {self.status}", width, curses.A_REVERSE)
+        self.put(1, 1, self.stats, width - 1)
+        rows = height - 5
+        store = self.engine.store
+        pane_width = width - COUNTRY_WIDTH - 1
+
+        focused = curses.A_BOLD | curses.A_UNDERLINE
+        self.put(2, 0, f" Countries ({len(self.countries)})", COUNTRY_WIDTH,
+                 focused if self.focus == COUNTRIES else curses.A_BOLD)
+        self.put(2, COUNTRY_WIDTH + 1, SERVER_HEADER + f"  by {self.order}", pane_width,
+                 focused if self.focus == SERVERS else curses.A_BOLD)
+
+        top = self.scroll(COUNTRIES, rows)
+        for row, country in enumerate(self.countries[top:top + rows]):
+            attr = curses.A_REVERSE if country == self.country else 0
+            self.put(3 + row, 0, f" {country[:COUNTRY_WIDTH - 8]:<{COUNTRY_WIDTH - 8}} {self.counts.get(country, 0):>5}",
+                     COUNTRY_WIDTH, attr)
+
+        top = self.scroll(SERVERS, rows)
+        records = store.records
+        connected = self.server.host if self.session is not None else None
+        for row, i in enumerate(self.ids[top:top + rows]):
+            server = records[i]
+            attr = curses.A_REVERSE if self.focus == SERVERS and top + row == self.cursor[SERVERS] else 0
+            if server.host == connected:
+                attr |= curses.A_BOLD
+            self.put(3 + row, COUNTRY_WIDTH + 1, server_line(server), pane_width, attr)
+        if not self.ids:
+            self.put(3, COUNTRY_WIDTH + 1, "No servers" if self.country else "No countries", pane_width)
+
+        busy = ", ".join(sorted(self.tasks))
+        self.put(height - 2, 0, f" {self.message}" + (f"  [{busy}]" if busy else ""), width)
+        if self.typing:
+            pane = "countries" if self.focus == COUNTRIES else "servers"
+            self.put(height - 1, 0, f" Filter {pane}: {self.filters[self.focus]}_", width, curses.A_REVERSE)
+        else:
+            self.put(height - 1, 0, f" {HELP}", width, curses.A_REVERSE)
+        screen.refresh()
+
+    def move(self, delta):
+        pane = self.focus
+        size = len(self.countries) if pane == COUNTRIES else len(self.ids)
+        if not size:
+            return
+        self.cursor[pane] = max(0, min(size - 1, self.cursor[pane] + delta))
+        if pane == COUNTRIES:
+            self.select_country(self.countries[self.cursor[COUNTRIES]])
+
+    def set_filter(self, text):
+        self.filters[self.focus] = text
+        if self.focus == COUNTRIES:
+            self.update_countries()
+        else:
+            self.cursor[SERVERS] = self.top[SERVERS] = 0
+            self.update_servers()
+
+    def edit_filter(self, key):
+        text = self.filters[self.focus]
+        if key in ("\n", "\r", curses.KEY_ENTER):
+            self.typing = False
+        elif key == "\x1b":
+            self.typing = False
+            self.set_filter("")
+        elif key in ("\b", "\x7f", curses.KEY_BACKSPACE):
+            self.set_filter(text[:-1])
+        elif isinstance(key, str) and key.isprintable():
+            self.set_filter(text + key)
+
+    def handle_key(self, key):
+        # False to quit
+        if self.typing:
+            self.edit_filter(key)
+            return True
+        page = max(self.screen.getmaxyx()[0] - 6, 1)
+        moves = {curses.KEY_UP: -1, "k": -1, curses.KEY_DOWN: 1, "j": 1, curses.KEY_PPAGE: -page, curses.KEY_NPAGE: page}
+        if key in moves:
+            self.move(moves[key])
+        elif key == curses.KEY_HOME:
+            self.move(-self.cursor[self.focus])
+        elif key == curses.KEY_END:
+            self.move(len(self.countries) + len(self.ids))
+        elif key in ("\t", curses.KEY_LEFT, curses.KEY_RIGHT, "h", "l"):
+            self.focus = SERVERS if self.focus == COUNTRIES else COUNTRIES
+        elif key in ("\n", "\r", curses.KEY_ENTER):
+            if self.focus == COUNTRIES:
+                self.focus = SERVERS
+            elif self.selected_server() is not None:
+                self.connect(self.selected_server())
+        elif key == "/":
+            self.typing = True
+        elif key == "\x1b":
+            self.set_filter("")
+        elif key == "a":
+            self.auto_connect()
+        elif key == "d":
+            self.disconnect()
+        elif key == "o":
+            self.cycle_order()
+        elif key == "p":
+            self.probe()
+        elif key == "r":
+            self.refresh(force=True)
+        elif key == "q":
+            return False
+        elif key == curses.KEY_RESIZE:
+            curses.update_lines_cols()
+        return True
+
+    def main(self, screen):
+        self.screen = screen
+        try:
+            curses.curs_set(0)
+            curses.use_default_colors()
+        except curses.error:
+            pass
+        screen.keypad(True)
+        screen.timeout(200)  # also how often live stats are redrawn
+        self.load()
+        while True:
+            if self.suspended:
+                try:
+                    self.dispatch(self.events.get(timeout=0.5))
+                except queue.Empty:
+                    pass
+                continue
+            self.drain()
+            self.check_countries()
+            self.draw()
+            try:
+                key = screen.get_wch()
+            except curses.error:
+                continue  # no key within the timeout
+            if not self.handle_key(key):
+                break
+        if self.engine.busy():
+            self.status = "Disconnecting..."
+            self.draw()
+            self.engine.disconnect()
+
+
+def run(engine, offline=False):
+    if curses is None:
+        raise SystemExit("The terminal interface needs curses (on Windows: pip install windows-curses).")
+    import locale
+
+    locale.setlocale(locale.LC_ALL, "")
+    os.environ.setdefault("ESCDELAY", "25")  # Esc clears a filter without a one-second lag
+    curses.wrapper(TerminalUI(engine, offline).main)
+    return 0
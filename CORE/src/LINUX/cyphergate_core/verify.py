@@ -0,0 +1,161 @@
+# Post-connect verification: public IPv4, IPv6, DNS resolver and default route.
+#
+# Every check runs on its own thread with its own deadline, and each result
+# is handed to on_result the moment it is known, so a slow or dead lookup
+# only delays its own line. The whole run takes as long as the slowest check
+# (capped by `timeout`), not the sum of them. Checks that are still running
+# at the deadline are reported as timed out and their late answers dropped.
+# The checks get an HTTP client of their own, without connections opened
+# before the tunnel came up, which could still go around it.
+
+import secrets
+import socket
+import threading
+import time
+
+IPV4_URL = "https://ipinfo.io/ip"
+IPV6_URL = "https://api6.ipify.org"
+# Answers with the resolver that looked the name up, i.e. who sees our DNS queries.
+# The name is new every time, so no cache on the way can answer in its place
+# (ip-api serves these random names over plain HTTP).
+DNS_URL = "http://{}.edns.ip-api.com/json"
+ROUTE_PROBE = ("1.1.1.1", 53)
+DEFAULT_TIMEOUT = 8
+CHECK_LABELS = {"ipv4": "IPv4", "ipv6": "IPv6", "dns": "DNS", "route": "Route"}
+
+
+class CheckResult:
+    def __init__(self, name, ok, value, elapsed):
+        self.name = name
+        self.ok = ok  # True passed, False failed, None informational
+        self.value = value
+        self.elapsed = elapsed
+
+    @property
+    def label(self):
+        return CHECK_LABELS.get(self.name, self.name)
+
+    @property
+    def icon(self):
+        return {True: "✅", False: "⚠️", None: "ℹ️"}[self.ok]
+
+
+def check_ipv4(http, timeout):
+    return None, http.get_text(IPV4_URL, timeout=timeout, retries=0)
+
+
+def check_ipv6(http, timeout, tunnel_ipv6):
+    # tunnel_ipv6: whether the config routes IPv6 through the tunnel; if it
+    # doesn't, any IPv6 that still works goes around it
+    import requests
+
+    try:
+        address = http.get_text(IPV6_URL, timeout=timeout, retries=0)
+    except requests.ConnectionError:
+        if tunnel_ipv6:
+            return None, "not reachable"
+        return True, "not reachable (no IPv6 leak)"
+    if tunnel_ipv6:
+        return None, address
+    return False, f"{address}, possible IPv6 leak"
+
+
+def check_dns(http, timeout, country):
+    response = http.get(DNS_URL.format(secrets.token_hex(16)), timeout=timeout, retries=0)
+    response.raise_for_status()
+    dns = response.json().get("dns", {})
+    resolver = f"{dns.get('ip', '?')} ({dns.get('geo', 'unknown')})"
+    if country.lower() in dns.get("geo", "").lower():
+        return True, resolver
+    return False, f"{resolver}, possible DNS leak"
+
+
+def check_route(tunnel_ip):
+    # Which local address the routing table picks for the internet; UDP connect sends nothing
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        s.connect(ROUTE_PROBE)
+        source = s.getsockname()[0]
+    if not tunnel_ip:
+        return None, f"via {source}"
+    if source == tunnel_ip:
+        return True, f"via tunnel ({source})"
+    return False, f"via {source}, not the tunnel ({tunnel_ip})"
+
+
+def default_checks(http, country, tunnel_ip, tunnel_ipv6=False, timeout=DEFAULT_TIMEOUT):
+    request_timeout = (min(3, timeout), timeout)
+    return {
+        "ipv4": lambda: check_ipv4(http, request_timeout),
+        "ipv6": lambda: check_ipv6(http, request_timeout, tunnel_ipv6),
+        "dns": lambda: check_dns(http, request_timeout, country),
+        "route": lambda: check_route(tunnel_ip),
+    }
+
+
+class Verification:
+    def __init__(self, checks, timeout=DEFAULT_TIMEOUT, on_result=None, on_done=None, close=None):
+        self.checks = checks  # name -> callable returning (ok, value)
+        self.close = close  # called once the run is over, e.g. to close its HTTP client
+        self.timeout = timeout
+        self.on_result = on_result  # (verification, CheckResult)
+        self.on_done = on_done  # (verification)
+        self.results = {}
+        self.cancelled = False
+        self.started_at = None
+        self.timer = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        self.started_at = time.monotonic()
+        self.timer = threading.Timer(self.timeout, self.expire)
+        self.timer.daemon = True
+        self.timer.start()
+        for name, check in self.checks.items():
+            threading.Thread(target=self.run, args=(name, check), daemon=True).start()
+
+    def run(self, name, check):
+        try:
+            ok, value = check()
+        except Exception as e:
+            ok, value = False, f"failed ({type(e).__name__})"
+        self.report(CheckResult(name, ok, value, time.monotonic() - self.started_at))
+
+    def expire(self):
+        for name in self.checks:
+            self.report(CheckResult(name, False, "timed out", self.timeout))
+
+    def report(self, result):
+        with self.lock:
+            if self.cancelled or result.name in self.results:
+                return
+            self.results[result.name] = result
+            done = len(self.results) == len(self.checks)
+        if self.on_result:
+            self.on_result(self, result)
+        if done:
+            self.timer.cancel()
+            self.finish()
+            if self.on_done:
+                self.on_done(self)
+
+    def cancel(self):
+        with self.lock:
+            self.cancelled = True
+        if self.timer:
+            self.timer.cancel()
+        self.finish()
+
+    def finish(self):
+        with self.lock:
+            close, self.close = self.close, None
+        if close:
+            close()
+
+    def summary(self):
+        # Finished checks, in the order they were given
+        lines = []
+        for name in self.checks:
+            result = self.results.get(name)
+            if result:
+                lines.append(f"{result.icon} {result.label}: {result.value}")
+        return "\n".join(lines)
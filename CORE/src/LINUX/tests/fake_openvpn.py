@@ -0,0 +1,93 @@
+# Stand-in for the openvpn binary: serves the management interface the way
+# openvpn does and plays out one scenario, chosen by FAKE_OPENVPN_MODE:
+#   ok           hold, then the usual states up to CONNECTED, then byte counts
+#   auth_failed  AUTH_FAILED in the log, then EXITING,auth-failure
+#   tls_error    TLS errors in the log, then exits with code 1
+#   hang         hold released but never connects
+# It accepts the same --management forms OpenVPNSession passes: a Unix socket
+# with --management-client-user, or host/port with a password file. Whatever
+# it was asked to do is printed as `FAKE <args>` lines for the tests to check.
+
+import os
+import socket
+import sys
+import time
+
+MODE = os.environ.get("FAKE_OPENVPN_MODE", "ok")
+CONNECT_STATES = ("RESOLVE", "WAIT", "AUTH", "GET_CONFIG", "ASSIGN_IP", "ADD_ROUTES")
+
+
+def log(line):
+    print(time.strftime("%Y-%m-%d %H:%M:%S ") + line, flush=True)
+
+
+def listen(args):
+    i = args.index("--management")
+    if args[i + 2] == "unix":
+        client_user = args[args.index("--management-client-user") + 1]
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(args[i + 1])
+        print(f"FAKE mode={oct(os.stat(os.path.dirname(args[i + 1])).st_mode & 0o777)} user={client_user}", flush=True)
+        password = None
+    else:
+        server = socket.socket()
+        server.bind((args[i + 1], int(args[i + 2])))
+        with open(args[i + 3]) as f:
+            password = f.read().strip()
+    server.listen(1)
+    conn, _ = server.accept()
+    server.close()
+    lines = conn.makefile("rb")
+    if password is not None:
+        conn.sendall(b"ENTER PASSWORD:")
+        if lines.readline().decode().strip() != password:
+            conn.sendall(b"ERROR: bad password\r\n")
+            sys.exit(1)
+        conn.sendall(b"SUCCESS: password is correct\r\n")
+    return conn, lines
+
+
+def main(args):
+    conn, lines = listen(args)
+
+    def send(line):
+        conn.sendall(line.encode() + b"\r\n")
+
+    def state(name, detail="", local_ip=""):
+        send(f">STATE:{int(time.time())},{name},{detail},{local_ip},,,,")
+
+    send(">INFO:OpenVPN Management Interface Version 5 -- type 'help' for more info")
+    send(">HOLD:Waiting for hold release:0")
+    for raw in lines:
+        command = raw.decode().strip()
+        print(f"FAKE command={command}", flush=True)
+        if command == "state on":
+            send("SUCCESS: real-time state notification set to ON")
+        elif command.startswith("bytecount"):
+            send("SUCCESS: bytecount interval changed")
+        elif command == "hold release":
+            send("SUCCESS: hold release succeeded")
+            for name in CONNECT_STATES:
+                state(name)
+            if MODE == "auth_failed":
+                log("AUTH: Received control message: AUTH_FAILED")
+                state("EXITING", "auth-failure")
+                return 1
+            if MODE == "tls_error":
+                log("TLS Error: TLS key negotiation failed to occur within 60 seconds (check your network connectivity)")
+                log("TLS Error: TLS handshake failed")
+                return 1
+            if MODE == "hang":
+                continue
+            log("Initialization Sequence Completed")
+            state("CONNECTED", "SUCCESS", "10.8.0.6")
+            send(">BYTECOUNT:5000,1000")
+        elif command == "signal SIGTERM":
+            send("SUCCESS: signal SIGTERM thrown")
+            state("EXITING", "SIGTERM")
+            return 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,113 @@
+import os
+import tempfile
+import time
+import unittest
+
+from cyphergate_core.bench import generate_csv
+from cyphergate_core.cache import ServerListCache
+
+URL = "http://vpngate.test/api/iphone/"
+
+
+class Response:
+    def __init__(self, status_code, body=b"", headers=None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers or {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise OSError(f"HTTP {self.status_code}")
+
+    def iter_lines(self, chunk_size=None):
+        # Like requests: terminators stripped
+        return iter(self.body.splitlines())
+
+
+class FakeGet:
+    # Plays back one response per request and keeps the request headers
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def __call__(self, url, timeout=None, stream=False, headers=None):
+        self.requests.append(dict(headers or {}))
+        return self.responses.pop(0)
+
+
+class ServerListCacheTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "servers.csv")
+        self.body = generate_csv(20)
+
+    def test_download_parses_and_records_validators(self):
+        cache = ServerListCache(self.path)
+        get = FakeGet(Response(200, self.body, {"ETag": '"v1"', "Last-Modified": "Sun, 18 Oct 2026 10:00:00 GMT"}))
+        servers = cache.fetch(get, URL)
+        self.assertEqual(len(servers), 20)
+        self.assertEqual(get.requests, [{}])
+        self.assertEqual(cache.meta["etag"], '"v1"')
+        # Config offsets point into the cached copy
+        self.assertIn("remote", servers[0].config.decode())
+        # A fresh instance trusts the sidecar written next to the CSV
+        self.assertEqual(ServerListCache(self.path).meta["sha256"], cache.meta["sha256"])
+
+    def test_forced_refresh_is_conditional(self):
+        cache = ServerListCache(self.path)
+        cache.fetch(FakeGet(Response(200, self.body, {"ETag": '"v1"'})), URL)
+        get = FakeGet(Response(304))
+        self.assertIsNone(cache.fetch(get, URL, force=True))
+        self.assertEqual(get.requests[0]["If-None-Match"], '"v1"')
+
+    def test_fresh_list_is_revalidated_in_the_background(self):
+        cache = ServerListCache(self.path)
+        cache.fetch(FakeGet(Response(200, self.body, {"ETag": '"v1"'})), URL)
+        get = FakeGet(Response(304))
+        self.assertIsNone(cache.fetch(get, URL))
+        self.assertEqual(get.requests, [{"If-None-Match": '"v1"'}])
+        # A newer list inside the TTL replaces the cached one
+        get = FakeGet(Response(200, generate_csv(5), {"ETag": '"v2"'}))
+        self.assertEqual(len(cache.fetch(get, URL)), 5)
+        self.assertEqual(cache.meta["etag"], '"v2"')
+
+    def test_fresh_list_without_validators_is_not_refetched(self):
+        cache = ServerListCache(self.path)
+        cache.fetch(FakeGet(Response(200, self.body)), URL)
+        get = FakeGet()
+        self.assertIsNone(cache.fetch(get, URL))
+        self.assertEqual(get.requests, [])
+
+    def test_expired_list_is_revalidated(self):
+        cache = ServerListCache(self.path)
+        cache.fetch(FakeGet(Response(200, self.body, {"ETag": '"v1"'})), URL)
+        cache.meta["fetched_at"] = time.time() - cache.ttl - 1
+        get = FakeGet(Response(304))
+        self.assertIsNone(cache.fetch(get, URL))
+        self.assertEqual(get.requests[0]["If-None-Match"], '"v1"')
+        self.assertTrue(cache.is_fresh())
+
+    def test_force_and_expiry_fetch_again(self):
+        cache = ServerListCache(self.path)
+        cache.fetch(FakeGet(Response(200, self.body)), URL)
+        self.assertEqual(len(cache.fetch(FakeGet(Response(200, self.body)), URL, force=True)), 20)
+        cache.meta["fetched_at"] = time.time() - cache.ttl - 1
+        self.assertEqual(len(cache.fetch(FakeGet(Response(200, self.body)), URL)), 20)
+
+    def test_failed_download_keeps_the_cached_list(self):
+        cache = ServerListCache(self.path)
+        cache.fetch(FakeGet(Response(200, self.body)), URL)
+        with self.assertRaises(OSError):
+            cache.fetch(FakeGet(Response(503)), URL, force=True)
+        self.assertEqual(len(cache.read()), 20)
+
+
+if __name__ == "__main__":
+    unittest.main()
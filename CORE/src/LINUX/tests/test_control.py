@@ -0,0 +1,114 @@
+import os
+import socket
+import tempfile
+import threading
+import unittest
+
+from cyphergate_core import control
+from cyphergate_core.store import ServerRecord, ServerStore
+
+
+class FakeEngine:
+    def __init__(self, store):
+        self.store = store
+        self.race = self.session = self.server = self.sampler = None
+
+    def servers(self, country, order="score"):
+        return self.store.servers(country, order)
+
+
+class FakeWindow:
+    # The GUI's side of the protocol, minus Qt: one JSON line in, one out
+    def __init__(self, root, engine):
+        self.engine = engine
+        self.connected = []
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(control.control_address(root))
+        self.sock.listen(4)
+        threading.Thread(target=self.serve, daemon=True).start()
+
+    def serve(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            with conn, conn.makefile("rwb") as stream:
+                for line in stream:
+                    try:
+                        reply = self.handle(control.decode(line))
+                    except ValueError as e:
+                        reply = {"ok": False, "error": str(e)}
+                    stream.write(control.encode(reply))
+                    stream.flush()
+
+    def handle(self, request):
+        store = self.engine.store
+        if request["cmd"] == "list":
+            return control.list_reply(self.engine, request)
+        if request["cmd"] == "status":
+            return control.engine_status(self.engine)
+        if request["cmd"] == "connect":
+            server = control.find_server(store, request["server"])
+            if server is None:
+                return {"ok": False, "error": "no such server"}
+            self.connected.append(server)
+            return {"ok": True, "server": control.server_row(server)}
+        return {"ok": False, "error": "unknown command"}
+
+    def close(self):
+        self.sock.close()
+
+
+def record(host, ip, country, ping):
+    return ServerRecord(host, ip, country, country[:2].upper(), ping, 1000, 1, None)
+
+
+@unittest.skipUnless(hasattr(socket, "AF_UNIX"), "control socket is a named pipe here")
+class ControlTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = directory.name
+        self.store = ServerStore([
+            record("vpn1", "10.0.0.1", "Japan", 30),
+            record("vpn2", "10.0.0.2", "Japan", 10),
+            record("vpn3", "10.0.0.3", "Korea", 20),
+        ])
+        self.window = FakeWindow(self.root, FakeEngine(self.store))
+        self.addCleanup(self.window.close)
+
+    def test_list(self):
+        self.assertEqual(control.forward(self.root, "list"), {"ok": True, "countries": {"Japan": 2, "Korea": 1}})
+        reply = control.forward(self.root, "list", country="japan", order="ping")
+        self.assertEqual([row["host"] for row in reply["servers"]], ["vpn2", "vpn1"])
+        self.assertEqual(reply["servers"][0]["ping"], "10 ms")
+        self.assertFalse(control.forward(self.root, "list", country="Narnia")["ok"])
+        self.assertFalse(control.forward(self.root, "list", country="Japan", order="name")["ok"])
+
+    def test_connect_by_host_or_ip(self):
+        self.assertEqual(control.forward(self.root, "connect", server="10.0.0.3")["server"]["host"], "vpn3")
+        self.assertEqual(control.forward(self.root, "connect", server="vpn1")["server"]["ip"], "10.0.0.1")
+        self.assertFalse(control.forward(self.root, "connect", server="vpn9")["ok"])
+        self.assertEqual([server.host for server in self.window.connected], ["vpn3", "vpn1"])
+
+    def test_status_and_several_requests_per_connection(self):
+        with control.ControlClient(control.control_address(self.root)) as client:
+            self.assertEqual(client.request("status"), {"ok": True, "state": "disconnected"})
+            self.assertEqual(client.request("show"), {"ok": False, "error": "unknown command"})
+
+    def test_lookups(self):
+        self.assertEqual(control.match_country(self.store, "KOREA"), "Korea")
+        self.assertIsNone(control.match_country(self.store, "Narnia"))
+        self.assertIs(control.find_server(self.store, "vpn2"), self.store.records[1])
+        self.assertIsNone(control.find_server(self.store, "10.0.0.9"))
+
+    def test_nobody_listening(self):
+        self.window.close()
+        os.remove(control.control_address(self.root))
+        self.assertIsNone(control.forward(self.root, "status"))
+        self.assertIsNone(control.forward(os.path.join(self.root, "missing"), "status", wait=0.2))
+
+
+if __name__ == "__main__":
+    unittest.main()
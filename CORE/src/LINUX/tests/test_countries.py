@@ -0,0 +1,50 @@
+import unittest
+
+from cyphergate_core.control import match_country
+from cyphergate_core.countries import DEFAULT_COUNTRIES, CountryFilter
+from cyphergate_core.store import ServerRecord, ServerStore
+
+
+def record(host, country, code):
+    return ServerRecord(host, "10.0.0.1", country, code, 10, 1000, 1, None)
+
+
+class CountryFilterTest(unittest.TestCase):
+    def test_names_codes_and_comments(self):
+        country_filter = CountryFilter.parse("# header\n  united   states \nJP  # Japan\n\n")
+        self.assertTrue(country_filter.matches("United States", "US"))
+        self.assertTrue(country_filter.matches("Japan", "jp"))
+        self.assertFalse(country_filter.matches("Germany", "DE"))
+
+    def test_empty_filter_matches_everything(self):
+        self.assertTrue(CountryFilter.parse("# nothing yet\n").matches("Germany", "DE"))
+        self.assertEqual(CountryFilter.load("/nonexistent/countries.conf"), CountryFilter())
+
+    def test_default_file(self):
+        self.assertEqual(CountryFilter.parse(DEFAULT_COUNTRIES).names, {"japan", "united states", "india", "germany"})
+
+
+class FilteredStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.store = ServerStore([
+            record("a", "Japan", "JP"), record("b", "Korea Republic of", "KR"),
+            record("c", "Japan", "JP"), record("d", "United States", "US"),
+        ])
+
+    def test_filtered_shares_records(self):
+        view = self.store.filtered(CountryFilter.parse("jp\nUnited States").matches)
+        self.assertEqual(view.countries(), ["Japan", "United States"])
+        self.assertEqual([server.host for server in view.servers("Japan")], ["a", "c"])
+        self.assertIs(view.servers("Japan")[0], self.store.records[0])
+        # Re-filtering a view starts again from the whole list
+        self.assertEqual(view.filtered(CountryFilter().matches).countries(), self.store.countries())
+
+    def test_match_country_by_name_or_code(self):
+        self.assertEqual(match_country(self.store, "jp"), "Japan")
+        self.assertEqual(match_country(self.store, "korea republic of"), "Korea Republic of")
+        self.assertIsNone(match_country(self.store, "de"))
+        self.assertIsNone(match_country(self.store, ""))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from cyphergate_core.history import STATS_WINDOW, HistoryStore
+from cyphergate_core.store import ServerRecord
+
+
+def server(ip):
+    return ServerRecord(f"vpn-{ip}", ip, "Japan", "JP", 10, 1000, 1, None)
+
+
+class HistoryStoreTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "history.db")
+        self.history = HistoryStore(self.path)
+        self.addCleanup(self.history.close)
+
+    def attempt(self, target, connect_time=None, failure=None):
+        attempt_id = self.history.start_attempt(target)
+        if connect_time is not None:
+            self.history.connected(attempt_id, connect_time)
+        if failure is not None:
+            self.history.failed(attempt_id, failure)
+        return attempt_id
+
+    def flush(self):
+        # close() returns once the writer has committed everything queued
+        self.history.close()
+
+    def test_success_rate_and_median(self):
+        a, b = server("10.0.0.1"), server("10.0.0.2")
+        for seconds in (3.0, 1.0, 2.0):
+            self.attempt(a, connect_time=seconds)
+        self.attempt(a, failure="TLS handshake failed")
+        self.attempt(a)  # still connecting: counts for neither
+        for seconds in (1.0, 10.0, 2.0, 3.0):
+            self.attempt(b, connect_time=seconds)
+        self.flush()
+
+        stats = self.history.stats()
+        self.assertEqual((stats["10.0.0.1"].attempts, stats["10.0.0.1"].successes), (4, 3))
+        self.assertEqual(stats["10.0.0.1"].success_rate, 0.75)
+        self.assertEqual(stats["10.0.0.1"].median_connect_time, 2.0)
+        # Even count: the mean of the middle two
+        self.assertEqual(stats["10.0.0.2"].median_connect_time, 2.5)
+        self.assertEqual(stats["10.0.0.2"].success_rate, 1.0)
+
+    def test_only_failures(self):
+        self.attempt(server("10.0.0.3"), failure="AUTH_FAILED")
+        self.flush()
+        stats = self.history.stats()["10.0.0.3"]
+        self.assertEqual(stats.success_rate, 0.0)
+        self.assertIsNone(stats.median_connect_time)
+
+    def test_old_attempts_drop_out(self):
+        old = self.attempt(server("10.0.0.4"), failure="timeout")
+        self.attempt(server("10.0.0.4"), connect_time=1.5)
+        self.flush()
+        db = sqlite3.connect(self.path)
+        with db:
+            db.execute("UPDATE attempts SET started_at = started_at - ? WHERE id = ?", (STATS_WINDOW + 60, old))
+        db.close()
+        self.assertEqual(self.history.stats()["10.0.0.4"].success_rate, 1.0)
+
+    def test_cancelled_attempts_are_left_out(self):
+        target = server("10.0.0.7")
+        self.attempt(target, connect_time=2.0)
+        self.history.cancelled(self.attempt(target), "password prompt")
+        # A failure reported while the user was cancelling doesn't count either
+        self.history.cancelled(self.attempt(target, failure="OpenVPN exited with code 126 before connecting"), "disconnect")
+        self.flush()
+        stats = self.history.stats()["10.0.0.7"]
+        self.assertEqual((stats.attempts, stats.successes), (1, 1))
+        db = sqlite3.connect(self.path)
+        rows = db.execute("SELECT cancelled FROM attempts WHERE cancelled IS NOT NULL ORDER BY cancelled").fetchall()
+        db.close()
+        self.assertEqual(rows, [("disconnect",), ("password prompt",)])
+
+    def test_older_database_gains_the_cancelled_column(self):
+        old_path = os.path.join(os.path.dirname(self.path), "old.db")
+        db = sqlite3.connect(old_path)
+        db.execute("CREATE TABLE attempts (id TEXT PRIMARY KEY, server TEXT NOT NULL, host TEXT, country TEXT, "
+                   "kind TEXT NOT NULL, started_at REAL NOT NULL, connect_time REAL, failure_reason TEXT, "
+                   "ended_at REAL, duration REAL, bytes_in INTEGER, bytes_out INTEGER, disconnect_cause TEXT)")
+        db.execute("INSERT INTO attempts (id, server, kind, started_at, failure_reason) "
+                   "VALUES ('a', '10.0.0.8', 'tunnel', strftime('%s', 'now'), 'timeout')")
+        db.commit()
+        db.close()
+        history = HistoryStore(old_path)
+        history.cancelled(history.start_attempt(server("10.0.0.8")), "disconnect")
+        history.close()
+        stats = history.stats()["10.0.0.8"]
+        self.assertEqual((stats.attempts, stats.successes), (1, 0))
+
+    def test_annotate(self):
+        known, unknown = server("10.0.0.5"), server("10.0.0.6")
+        self.attempt(known, connect_time=4.0)
+        self.attempt(known, failure="timeout")
+        self.flush()
+        self.history.annotate([known, unknown])
+        self.assertEqual((known.success_rate, known.connect_time), (0.5, 4.0))
+        self.assertEqual((unknown.success_rate, unknown.connect_time), (None, None))
+
+
+if __name__ == "__main__":
+    unittest.main()
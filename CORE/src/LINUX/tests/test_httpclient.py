@@ -0,0 +1,118 @@
+import socket
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from cyphergate_core.httpclient import CircuitOpenError, HttpClient
+
+
+class ScriptedServer:
+    # Local HTTP server answering each GET with the next status in `statuses`
+    # (the last one repeats) and counting the requests
+    def __init__(self, *statuses):
+        self.statuses = list(statuses)
+        self.requests = 0
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with server.lock:
+                    server.requests += 1
+                    status = server.statuses.pop(0) if len(server.statuses) > 1 else server.statuses[0]
+                body = str(status).encode()
+                self.send_response(status)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/"
+        threading.Thread(target=self.httpd.serve_forever, args=(0.05,), daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class HttpClientTest(unittest.TestCase):
+    def serve(self, *statuses):
+        server = ScriptedServer(*statuses)
+        self.addCleanup(server.close)
+        return server
+
+    def client(self, **kwargs):
+        kwargs.setdefault("backoff", 0)
+        client = HttpClient(**kwargs)
+        self.addCleanup(client.close)
+        return client
+
+    def test_retries_server_errors(self):
+        server = self.serve(503, 429, 200)
+        response = self.client(retries=3).get(server.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(server.requests, 3)
+
+    def test_gives_up_with_the_last_answer(self):
+        server = self.serve(500)
+        response = self.client(retries=2).get(server.url)
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(server.requests, 3)
+
+    def test_client_errors_are_not_retried(self):
+        server = self.serve(404)
+        response = self.client(retries=3).get(server.url)
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(server.requests, 1)
+        with self.assertRaises(requests.HTTPError):
+            self.client().get_text(server.url)
+
+    def test_connection_errors_are_retried(self):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            url = f"http://127.0.0.1:{sock.getsockname()[1]}/"
+        client = self.client(retries=2, breaker_threshold=10)
+        with self.assertRaises(requests.ConnectionError):
+            client.get(url)
+        self.assertEqual(client.breaker("127.0.0.1").failures, 3)
+
+    def test_breaker_opens_and_half_opens(self):
+        server = self.serve(503, 503, 503, 200)
+        client = self.client(retries=0, breaker_threshold=2, breaker_cooldown=0.3)
+        self.assertEqual(client.get(server.url).status_code, 503)
+        self.assertEqual(client.get(server.url).status_code, 503)
+        # Open: fails without touching the network
+        with self.assertRaises(CircuitOpenError):
+            client.get(server.url)
+        self.assertEqual(server.requests, 2)
+
+        # Half-open after the cooldown: one trial call, and one failure re-opens it
+        time.sleep(0.35)
+        self.assertEqual(client.get(server.url).status_code, 503)
+        with self.assertRaises(CircuitOpenError):
+            client.get(server.url)
+
+        # A successful trial closes it again
+        time.sleep(0.35)
+        self.assertEqual(client.get(server.url).status_code, 200)
+        self.assertEqual(client.get(server.url).status_code, 200)
+        self.assertEqual(server.requests, 5)
+
+    def test_breakers_are_per_host(self):
+        server = self.serve(503)
+        client = self.client(retries=0, breaker_threshold=1)
+        client.get(server.url)
+        with self.assertRaises(CircuitOpenError):
+            client.get(server.url)
+        other = self.serve(200)
+        self.assertEqual(client.get(other.url.replace("127.0.0.1", "localhost")).status_code, 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import subprocess
+import unittest
+from unittest import mock
+
+from cyphergate_core.ipv6 import IPv6Switch
+
+
+def netsh_result(returncode=0, stdout=""):
+    return subprocess.CompletedProcess([], returncode, stdout, "")
+
+
+class IPv6SwitchTest(unittest.TestCase):
+    def setUp(self):
+        # CREATE_NO_WINDOW only exists on Windows
+        patcher = mock.patch.object(subprocess, "CREATE_NO_WINDOW", 0, create=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.lines = []
+
+    def run_switch(self, calls, *results):
+        # The states netsh was asked for, with `results` as its answers
+        with mock.patch("subprocess.run", side_effect=list(results)) as run:
+            switch = IPv6Switch(log=self.lines.append)
+            for enabled in calls:
+                switch.set(enabled)
+            switch.close()
+        return [call.args[0][-1] for call in run.call_args_list]
+
+    def test_only_switches_back_on_what_it_switched_off(self):
+        self.assertEqual(self.run_switch([True, True]), [])
+        self.assertEqual(self.run_switch([False, False, True, True], netsh_result(), netsh_result()),
+                         ["disabled", "enabled"])
+        self.assertEqual(self.lines, [])
+
+    def test_close_switches_it_back_on(self):
+        self.assertEqual(self.run_switch([False], netsh_result(), netsh_result()), ["disabled", "enabled"])
+
+    def test_failures_are_logged(self):
+        calls = self.run_switch([False, True], netsh_result(1, "The requested operation requires elevation."))
+        # It never went off, so nothing to switch back on
+        self.assertEqual(calls, ["disabled"])
+        self.assertEqual(self.lines, [
+            "netsh: could not set IPv6 disabled (exit 1): The requested operation requires elevation."
+        ])
+
+    def test_missing_netsh_is_logged(self):
+        self.assertEqual(self.run_switch([False], FileNotFoundError("netsh")), ["disabled"])
+        self.assertEqual(self.lines, ["netsh: could not set IPv6 disabled: netsh"])
+
+
+if __name__ == "__main__":
+    unittest.main()
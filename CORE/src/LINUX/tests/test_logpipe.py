@@ -0,0 +1,81 @@
+import gzip
+import os
+import tempfile
+import unittest
+
+from cyphergate_core.logpipe import LogPipeline, RotatingLog, parse_line
+
+
+class RotatingLogTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "logs", "openvpn.log")
+
+    def read_backup(self, log, n):
+        with gzip.open(log.backup_path(n), "rt", encoding="utf-8") as f:
+            return f.read().splitlines()
+
+    def test_rotates_into_gzipped_backups(self):
+        log = RotatingLog(self.path, max_bytes=100, backups=2)
+        self.addCleanup(log.close)
+        lines = [f"line {n:02d} " + "x" * 30 for n in range(12)]  # 40 bytes each, two per file
+        for line in lines:
+            log.write(line)
+        log.close()
+
+        with open(self.path, encoding="utf-8") as f:
+            self.assertEqual(f.read().splitlines(), lines[10:])
+        self.assertEqual(self.read_backup(log, 1), lines[8:10])
+        self.assertEqual(self.read_backup(log, 2), lines[6:8])
+        # Older ones fell off the end
+        self.assertFalse(os.path.exists(log.backup_path(3)))
+        self.assertLessEqual(os.path.getsize(self.path), 100)
+
+    def test_appends_across_runs(self):
+        log = RotatingLog(self.path, max_bytes=1000)
+        log.write("first run")
+        log.close()
+        log = RotatingLog(self.path, max_bytes=1000)
+        log.write("second run")
+        log.close()
+        with open(self.path, encoding="utf-8") as f:
+            self.assertEqual(f.read().splitlines(), ["first run", "second run"])
+
+    def test_no_backups(self):
+        log = RotatingLog(self.path, max_bytes=20, backups=0)
+        self.addCleanup(log.close)
+        log.write("a" * 15)
+        log.write("b" * 15)
+        self.assertFalse(os.path.exists(log.backup_path(1)))
+
+
+class LogPipelineTest(unittest.TestCase):
+    def test_events_tail_and_file(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        pipeline = LogPipeline(os.path.join(directory.name, "openvpn.log"), lines=2)
+        events = []
+        read_fd, write_fd = os.pipe()
+        reader = pipeline.attach(os.fdopen(read_fd, "rb"), banner="test", on_event=events.append)
+        with os.fdopen(write_fd, "wb") as out:
+            out.write(b"TLS Error: TLS handshake failed\n\nTCP/UDP read bytes,1234\r\n"
+                      b"Initialization Sequence Completed\n")
+        reader.join(5)
+        pipeline.close()
+
+        self.assertEqual([event.kind for event in events], ["tls_error", "bytes", "handshake"])
+        self.assertTrue(events[0].is_error)
+        self.assertEqual(events[1].data, {"layer": "TCP/UDP", "direction": "read", "bytes": 1234})
+        self.assertEqual(pipeline.tail(), ["TCP/UDP read bytes,1234", "Initialization Sequence Completed"])
+        with open(pipeline.file.path, encoding="utf-8") as f:
+            self.assertEqual(len(f.read().splitlines()), 4)  # banner and three lines; blank ones are dropped
+
+    def test_parse_line(self):
+        self.assertIsNone(parse_line("MANAGEMENT: Client connected"))
+        event = parse_line("SIGUSR1[soft,ping-restart] received, process restarting")
+        self.assertEqual((event.kind, event.data["reason"]), ("reconnect", "ping-restart"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+import base64
+import os
+import tempfile
+import unittest
+
+from cyphergate_core.patching import FALLBACK_CIPHER, OpenVPNConfig, PatchedConfigCache, patch_config
+
+CONFIG = (
+    "client\r\n"
+    "dev tun\r\n"
+    "proto udp\r\n"
+    "remote 10.0.0.1 1194\r\n"
+    "# cipher AES-128-CBC\r\n"
+    "<ca>\r\n"
+    "-----BEGIN CERTIFICATE-----\r\n"
+    "cipher inside a cert is not a directive\r\n"
+    "-----END CERTIFICATE-----\r\n"
+    "</ca>\r\n"
+)
+
+
+class Ref:
+    # Stands in for a ConfigRef into the cached server list
+    def __init__(self, text):
+        self.data = base64.b64encode(text.encode())
+
+    def read_b64(self):
+        return self.data
+
+
+def directives(text):
+    return [directive.name for directive in OpenVPNConfig.parse(text).directives if directive.name]
+
+
+class PatchConfigTest(unittest.TestCase):
+    def test_ciphers(self):
+        patched = patch_config(CONFIG)
+        config = OpenVPNConfig.parse(patched)
+        self.assertEqual(config.get("cipher"), (FALLBACK_CIPHER,))
+        self.assertTrue(config.has("data-ciphers"))
+        # The commented-out cipher and the cert block are left alone, line endings too
+        self.assertIn("# cipher AES-128-CBC\r\n", patched)
+        self.assertIn("cipher inside a cert is not a directive\r\n", patched)
+        self.assertNotIn("\n\n", patched.replace("\r\n", "\n"))
+
+    def test_data_ciphers_doesnt_hide_a_missing_cipher(self):
+        config = OpenVPNConfig.parse(patch_config(CONFIG + "data-ciphers AES-256-GCM\r\n"))
+        self.assertEqual(config.get("data-ciphers"), ("AES-256-GCM",))
+        self.assertEqual(config.get("cipher"), (FALLBACK_CIPHER,))
+
+    def test_patching_is_idempotent(self):
+        options = {"ipv6": True, "fast_io": True}
+        once = patch_config(CONFIG, options)
+        self.assertEqual(patch_config(once, options), once)
+
+    def test_options(self):
+        self.assertNotIn("tun-ipv6", directives(patch_config(CONFIG)))
+        self.assertIn("tun-ipv6", directives(patch_config(CONFIG, {"ipv6": True})))
+        self.assertIn("fast-io", directives(patch_config(CONFIG, {"fast_io": True})))
+        tcp = CONFIG.replace("proto udp", "proto tcp")
+        self.assertNotIn("fast-io", directives(patch_config(tcp, {"fast_io": True})))
+
+
+class PatchedConfigCacheTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.cache = PatchedConfigCache(self.directory, max_entries=3)
+
+    def test_hit_is_not_rewritten(self):
+        ref = Ref(CONFIG)
+        path = self.cache.path_for(ref)
+        with open(path, encoding="utf-8", newline="") as f:
+            self.assertEqual(f.read(), patch_config(CONFIG))
+        with open(path, "w") as f:
+            f.write("marker")
+        self.assertEqual(self.cache.path_for(ref), path)
+        with open(path) as f:
+            self.assertEqual(f.read(), "marker")
+
+    def test_options_are_part_of_the_key(self):
+        ref = Ref(CONFIG)
+        self.assertNotEqual(self.cache.path_for(ref), self.cache.path_for(ref, ipv6=True))
+        self.assertEqual(self.cache.path_for(ref, ipv6=True), self.cache.path_for(ref, ipv6=True))
+
+    def test_oldest_entries_are_pruned(self):
+        paths = []
+        for n in range(4):
+            paths.append(self.cache.path_for(Ref(CONFIG.replace("10.0.0.1", f"10.0.0.{n + 10}"))))
+            os.utime(paths[-1], (100 + n, 100 + n))
+        self.cache.prune()
+        self.assertEqual(sorted(os.listdir(self.directory)), sorted(os.path.basename(path) for path in paths[1:]))
+
+    def test_hit_counts_as_recent_use(self):
+        refs = [Ref(CONFIG.replace("10.0.0.1", f"10.0.0.{n + 10}")) for n in range(4)]
+        paths = [self.cache.path_for(ref) for ref in refs[:3]]
+        for n, path in enumerate(paths):
+            os.utime(path, (100 + n, 100 + n))
+        self.assertEqual(self.cache.path_for(refs[0]), paths[0])  # the oldest, used again
+        self.cache.path_for(refs[3])
+        self.assertTrue(os.path.exists(paths[0]))
+        self.assertFalse(os.path.exists(paths[1]))
+
+
+if __name__ == "__main__":
+    unittest.main()
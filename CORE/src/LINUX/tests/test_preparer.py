@@ -0,0 +1,91 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from cyphergate_core.preparer import ConfigPreparer, PreparedConfig
+from cyphergate_core.serverlist import ConfigRef
+from cyphergate_core.store import ServerRecord
+
+
+def server(host, crc=1):
+    return ServerRecord(host, "10.0.0.1", "Japan", "JP", 10, 1000, 1, ConfigRef("serverlist.csv", 0, 0, crc))
+
+
+class ConfigPreparerTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.built = []
+
+    def build(self, target):
+        self.built.append(target.host)
+        path = os.path.join(self.directory, f"{target.host}-{target.config.crc}.ovpn")
+        with open(path, "w") as f:
+            f.write("client\n")
+        return PreparedConfig(path, {"ipv6": False})
+
+    def preparer(self, **kwargs):
+        preparer = ConfigPreparer(self.build, **kwargs)
+        self.addCleanup(preparer.close)
+        return preparer
+
+    def test_hits_and_lru_cap(self):
+        preparer = self.preparer(capacity=2)
+        a, b, c = server("a"), server("b"), server("c")
+        preparer.get(a)
+        preparer.get(b)
+        self.assertIs(preparer.get(a), preparer.cached(a))  # a is now the most recent
+        preparer.get(c)
+        self.assertEqual(self.built, ["a", "b", "c"])
+        self.assertEqual(list(preparer.entries), [preparer.key(a), preparer.key(c)])
+        self.assertIsNone(preparer.cached(b))
+
+    def test_ttl(self):
+        preparer = self.preparer(ttl=60)
+        a = server("a")
+        prepared = preparer.get(a)
+        prepared.time -= 61
+        self.assertIsNone(preparer.cached(a))
+        preparer.get(a)
+        self.assertEqual(self.built, ["a", "a"])
+
+    def test_new_config_or_missing_file_is_prepared_again(self):
+        preparer = self.preparer()
+        os.remove(preparer.get(server("a")).path)
+        self.assertIsNone(preparer.cached(server("a")))
+        preparer.get(server("a"))
+        preparer.get(server("a", crc=2))
+        self.assertEqual(self.built, ["a", "a", "a"])
+
+    def test_prefetch_and_shared_preparation(self):
+        release = threading.Event()
+
+        def slow_build(target):
+            release.wait(5)
+            return self.build(target)
+
+        preparer = ConfigPreparer(slow_build, workers=2)
+        self.addCleanup(preparer.close)
+        preparer.prefetch([server("a"), server("b")])
+        first, second = preparer.submit(server("a")), preparer.submit(server("a"))
+        self.assertIs(first, second)
+        release.set()
+        self.assertEqual(preparer.get(server("a")).path, first.result(5).path)
+        deadline = time.monotonic() + 5
+        while preparer.pending and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(sorted(self.built), ["a", "b"])
+
+    def test_prefetch_never_exceeds_capacity(self):
+        preparer = self.preparer(capacity=2)
+        preparer.prefetch([server(name) for name in "abcd"])
+        for future in list(preparer.pending.values()):
+            future.result(5)
+        self.assertEqual(sorted(self.built), ["a", "b"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import socket
+import threading
+import unittest
+
+from cyphergate_core.prober import LatencyProber, P_CONTROL_HARD_RESET_CLIENT_V2, extract_remotes
+
+
+class UdpResponder:
+    # Answers every datagram, like an OpenVPN server answering a hard reset
+    def __init__(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("127.0.0.1", 0))
+        self.port = self.sock.getsockname()[1]
+        self.packets = []
+        threading.Thread(target=self.serve, daemon=True).start()
+
+    def serve(self):
+        while True:
+            try:
+                data, peer = self.sock.recvfrom(2048)
+            except OSError:
+                return
+            self.packets.append(data)
+            self.sock.sendto(b"\x40" + data[1:9], peer)
+
+    def close(self):
+        self.sock.close()
+
+
+class LatencyProberTest(unittest.TestCase):
+    def setUp(self):
+        self.prober = LatencyProber(timeout=1.0)
+
+    def closed_port(self):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            return sock.getsockname()[1]
+
+    def test_tcp_listener(self):
+        with socket.socket() as listener:
+            listener.bind(("127.0.0.1", 0))
+            listener.listen(8)
+            target = ("127.0.0.1", listener.getsockname()[1], "tcp")
+            rtt = self.prober.probe(target)
+        self.assertIsNotNone(rtt)
+        self.assertLess(rtt, 1000)
+
+    def test_udp_hard_reset(self):
+        responder = UdpResponder()
+        self.addCleanup(responder.close)
+        rtt = self.prober.probe(("127.0.0.1", responder.port, "udp"))
+        self.assertIsNotNone(rtt)
+        self.assertEqual(responder.packets[0][0] >> 3, P_CONTROL_HARD_RESET_CLIENT_V2)
+
+    def test_unreachable_is_none_and_cached(self):
+        target = ("127.0.0.1", self.closed_port(), "tcp")
+        results = self.prober.probe_many([target, target])
+        self.assertEqual(results, {target: None})
+        self.assertEqual(self.prober.cached(target)[0], None)
+
+    def test_extract_remotes(self):
+        config = "proto tcp\nport 443\nremote 10.0.0.1\nremote 10.0.0.2 1194 udp\n"
+        self.assertEqual(extract_remotes(config), [("10.0.0.1", 443, "tcp"), ("10.0.0.2", 1194, "udp")])
+
+
+if __name__ == "__main__":
+    unittest.main()
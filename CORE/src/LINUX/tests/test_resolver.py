@@ -0,0 +1,76 @@
+import socket
+import threading
+import unittest
+from unittest import mock
+
+from cyphergate_core.resolver import Resolver
+
+
+def answer(*addresses):
+    infos = []
+    for address in addresses:
+        family = socket.AF_INET6 if ":" in address else socket.AF_INET
+        infos.append((family, socket.SOCK_STREAM, 6, "", (address, 0)))
+    return infos
+
+
+class ResolverTest(unittest.TestCase):
+    def setUp(self):
+        self.resolver = Resolver(ttl=60, negative_ttl=60, workers=2)
+        self.addCleanup(self.resolver.close)
+
+    def test_splits_families_and_caches(self):
+        with mock.patch("socket.getaddrinfo", return_value=answer("10.0.0.1", "10.0.0.1", "2001:db8::1")) as lookup:
+            addresses = self.resolver.lookup("vpn1.opengw.net", timeout=5)
+            self.assertEqual(addresses.ipv4, ["10.0.0.1"])
+            self.assertEqual(addresses.ipv6, ["2001:db8::1"])
+            self.assertIs(self.resolver.lookup("vpn1.opengw.net", timeout=5), addresses)
+        self.assertEqual(lookup.call_count, 1)
+
+    def test_no_such_name_is_cached(self):
+        with mock.patch("socket.getaddrinfo", side_effect=socket.gaierror("no such name")) as lookup:
+            addresses = self.resolver.lookup("missing.opengw.net", timeout=5)
+            self.resolver.lookup("missing.opengw.net", timeout=5)
+        self.assertEqual((addresses.ipv4, addresses.ipv6), ([], []))
+        self.assertEqual(lookup.call_count, 1)
+        self.assertEqual(self.resolver.pending, {})
+
+    def test_other_lookup_errors_are_negative_answers(self):
+        for error in (OSError("resolver down"), ValueError("embedded null byte"), UnicodeError("label too long")):
+            with mock.patch("socket.getaddrinfo", side_effect=error):
+                addresses = self.resolver.lookup(f"{type(error).__name__}.opengw.net", timeout=5)
+            self.assertEqual((addresses.ipv4, addresses.ipv6), ([], []))
+        self.assertEqual(self.resolver.pending, {})
+
+    def test_unexpected_errors_dont_wedge_the_host(self):
+        with mock.patch("socket.getaddrinfo", side_effect=RuntimeError("boom")):
+            with self.assertRaises(RuntimeError):
+                self.resolver.lookup("vpn1.opengw.net", timeout=5)
+        self.assertEqual(self.resolver.pending, {})
+        with mock.patch("socket.getaddrinfo", return_value=answer("10.0.0.1")):
+            self.assertEqual(self.resolver.lookup("vpn1.opengw.net", timeout=5).ipv4, ["10.0.0.1"])
+
+    def test_expired_entries_are_looked_up_again(self):
+        self.resolver.ttl = 0
+        with mock.patch("socket.getaddrinfo", return_value=answer("10.0.0.1")) as lookup:
+            self.resolver.lookup("vpn1.opengw.net", timeout=5)
+            self.resolver.lookup("vpn1.opengw.net", timeout=5)
+        self.assertEqual(lookup.call_count, 2)
+
+    def test_concurrent_requests_share_one_lookup(self):
+        release = threading.Event()
+
+        def slow_lookup(*args, **kwargs):
+            release.wait(5)
+            return answer("10.0.0.1")
+
+        with mock.patch("socket.getaddrinfo", side_effect=slow_lookup) as lookup:
+            futures = [self.resolver.resolve("vpn1.opengw.net") for _ in range(5)]
+            release.set()
+            results = [future.result(5) for future in futures]
+        self.assertEqual(lookup.call_count, 1)
+        self.assertTrue(all(result is results[0] for result in results))
+
+
+if __name__ == "__main__":
+    unittest.main()
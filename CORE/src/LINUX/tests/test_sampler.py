@@ -0,0 +1,73 @@
+import threading
+import unittest
+
+from cyphergate_core.sampler import FakeCounters, TimeSeries, TunnelSampler, format_rate
+
+
+class StepCounters:
+    # Counters that move by a fixed amount per read
+    def __init__(self, rx_step, tx_step, fail_after=None):
+        self.rx = self.tx = 0
+        self.rx_step, self.tx_step = rx_step, tx_step
+        self.reads = 0
+        self.fail_after = fail_after
+
+    def read(self):
+        self.reads += 1
+        if self.fail_after is not None and self.reads > self.fail_after:
+            raise OSError("interface gone")
+        self.rx += self.rx_step
+        self.tx += self.tx_step
+        return self.rx, self.tx
+
+
+class TunnelSamplerTest(unittest.TestCase):
+    def collect(self, counters, count, probe=None):
+        samples = []
+        done = threading.Event()
+
+        def on_sample(sample):
+            samples.append(sample)
+            if len(samples) >= count:
+                done.set()
+
+        sampler = TunnelSampler(counters, probe=probe, interval=0.01, rtt_interval=0, on_sample=on_sample)
+        sampler.start()
+        done.wait(5)
+        sampler.stop()
+        return sampler, samples[:count]
+
+    def test_rates_from_counter_deltas(self):
+        sampler, samples = self.collect(StepCounters(10_000, 1_000), 5)
+        self.assertEqual(len(samples), 5)
+        for sample in samples:
+            self.assertGreater(sample.rx_rate, sample.tx_rate)
+            self.assertEqual(sample.rx_bytes - samples[0].rx_bytes, (sample.tx_bytes - samples[0].tx_bytes) * 10)
+        self.assertIsNotNone(sampler.series.latest())
+
+    def test_rtt_probe_and_failures(self):
+        answers = iter([12.5, OSError("timed out")] + [7.0] * 100)
+
+        def probe():
+            answer = next(answers)
+            if isinstance(answer, Exception):
+                raise answer
+            return answer
+
+        _, samples = self.collect(FakeCounters(), 3, probe=probe)
+        self.assertEqual([sample.rtt for sample in samples], [12.5, None, 7.0])
+
+    def test_time_series_window(self):
+        series = TimeSeries(capacity=3)
+        for second in range(5):
+            series.append(type("Sample", (), {"time": float(second)})())
+        self.assertEqual([sample.time for sample in series.window(1)], [3.0, 4.0])
+        self.assertEqual(len(series.samples), 3)
+
+    def test_format_rate(self):
+        self.assertEqual(format_rate(125), "1 kbps")
+        self.assertEqual(format_rate(125_000_000), "1.0 Gbps")
+
+
+if __name__ == "__main__":
+    unittest.main()
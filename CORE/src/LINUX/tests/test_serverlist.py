@@ -0,0 +1,67 @@
+import base64
+import io
+import os
+import tempfile
+import unittest
+
+from cyphergate_core.serverlist import iter_terminated, parse_lines, read_server_list
+
+HEADER = (b"*vpn_servers\r\n"
+          b"#HostName,IP,Score,Ping,Speed,CountryLong,CountryShort,NumVpnSessions,Uptime,"
+          b"TotalUsers,TotalTraffic,LogType,Operator,Message,OpenVPN_ConfigData_Base64\r\n")
+
+
+def row(host, country="Japan", code="JP", ping="12", config=None):
+    config = config or f"client\r\nremote {host} 1194\r\n"
+    fields = [host, "10.0.0.1", "100", ping, "5000000", country, code, "3", "1000", "10", "2000",
+              "2weeks", "op", ""]
+    return ",".join(fields).encode() + b"," + base64.b64encode(config.encode()) + b"\r\n"
+
+
+class ServerListTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "servers.csv")
+
+    def write(self, body):
+        with open(self.path, "wb") as f:
+            f.write(body)
+
+    def test_configs_are_read_back_by_offset(self):
+        self.write(HEADER + row("vpn1") + row("vpn2", "Korea", "KR") + b"*\r\n")
+        servers = read_server_list(self.path)
+        self.assertEqual([server.country for server in servers], ["Japan", "Korea"])
+        self.assertEqual((servers[1].country_code, servers[1].ping, servers[1].speed), ("KR", 12, 5000000))
+        self.assertEqual(servers[1].config.decode(), "client\r\nremote vpn2 1194\r\n")
+        self.assertEqual(servers[0].config.read_b64(), base64.b64encode(b"client\r\nremote vpn1 1194\r\n"))
+
+    def test_streamed_copy_has_the_same_offsets(self):
+        # What a download does: lines without terminators, copied to the cache as they are parsed
+        body = HEADER + row("vpn1") + row("vpn2")
+        out = io.BytesIO()
+        servers = parse_lines(iter_terminated(body.splitlines()), self.path, out=out)
+        self.write(out.getvalue())
+        self.assertEqual(servers[1].config.decode(), "client\r\nremote vpn2 1194\r\n")
+
+    def test_changed_file_is_detected(self):
+        self.write(HEADER + row("vpn1"))
+        ref = read_server_list(self.path)[0].config
+        # Same length, different bytes: only the CRC can tell
+        self.write(HEADER + row("vpn1", config="client\r\nremote vpn9 1194\r\n"))
+        with self.assertRaises(ValueError):
+            ref.read_b64()
+        self.write(HEADER)
+        with self.assertRaises(ValueError):
+            ref.read_b64()
+
+    def test_malformed_rows_are_skipped(self):
+        self.write(HEADER + b"garbage\r\n" + b"a,b,c\r\n" + row("vpn1", ping="-") + row("vpn2") + b"*\r\n")
+        servers = read_server_list(self.path)
+        self.assertEqual(len(servers), 2)
+        self.assertIsNone(servers[0].ping)
+        self.assertEqual(servers[1].config.decode(), "client\r\nremote vpn2 1194\r\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,159 @@
+import getpass
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+from cyphergate_core.logpipe import LogPipeline
+from cyphergate_core.management import ManagementClient
+from cyphergate_core.session import OpenVPNSession
+
+FAKE_OPENVPN = [sys.executable, os.path.join(os.path.dirname(__file__), "fake_openvpn.py")]
+WAIT = 10
+
+
+class Recorder:
+    # Collects a session's callbacks; done is set on the first terminal one
+    def __init__(self):
+        self.states = []
+        self.connected = None
+        self.failed = None
+        self.exit_code = None
+        self.done = threading.Event()
+        self.events = []
+
+    def attach(self, session):
+        session.on_state = lambda state, detail: self.states.append((state, detail))
+        session.on_connected = self.on_connected
+        session.on_failed = self.on_failed
+        session.on_exit = self.on_exit
+
+    def on_connected(self, handshake_time):
+        self.connected = handshake_time
+        self.done.set()
+
+    def on_failed(self, reason):
+        self.failed = reason
+        self.done.set()
+
+    def on_exit(self, code):
+        self.exit_code = code
+        self.done.set()
+
+
+@unittest.skipIf(os.name == "nt", "the fake serves the Unix socket form of --management")
+class OpenVPNSessionTest(unittest.TestCase):
+    def start(self, mode, connect_timeout=WAIT):
+        self.log_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.log_dir.cleanup)
+        self.log = LogPipeline(os.path.join(self.log_dir.name, "openvpn.log"))
+        self.addCleanup(self.log.close)
+        session = OpenVPNSession(
+            FAKE_OPENVPN, "test.ovpn",
+            popen_kwargs={
+                "env": dict(os.environ, FAKE_OPENVPN_MODE=mode),
+                "stdout": subprocess.PIPE, "stderr": subprocess.STDOUT
+            },
+            connect_timeout=connect_timeout
+        )
+        recorder = Recorder()
+        recorder.attach(session)
+        session.start()
+        self.reader = self.log.attach(session.process.stdout, on_event=recorder.events.append)
+        self.addCleanup(self.reader.join, WAIT)
+        self.addCleanup(session.stop)
+        return session, recorder
+
+    def output(self):
+        self.reader.join(WAIT)
+        return "\n".join(self.log.tail())
+
+    def test_hold_release_then_connected(self):
+        session, recorder = self.start("ok")
+        self.assertTrue(recorder.done.wait(WAIT))
+        self.assertIsNone(recorder.failed)
+        self.assertTrue(session.connected)
+        self.assertEqual(session.tunnel_ip, "10.8.0.6")
+        self.assertGreaterEqual(recorder.connected, 0)
+        # Every state after the hold arrives, so state on went in before hold release
+        self.assertEqual([state for state, _ in recorder.states][0], "RESOLVE")
+        self.assertEqual(recorder.states[-1], ("CONNECTED", "SUCCESS"))
+
+    def test_management_socket_is_private(self):
+        session, recorder = self.start("ok")
+        self.assertTrue(recorder.done.wait(WAIT))
+        endpoint = session.endpoint
+        self.assertTrue(endpoint.address.endswith("mgmt.sock"))
+        args = session.args(endpoint)
+        self.assertNotIn("127.0.0.1", args)
+        self.assertEqual(args[args.index("--management-client-user") + 1], getpass.getuser())
+        self.assertTrue(session.stop())
+        self.assertIn("FAKE mode=0o700", self.output())
+        self.assertFalse(os.path.exists(endpoint.dir))
+
+    def test_auth_failed(self):
+        session, recorder = self.start("auth_failed")
+        self.assertTrue(recorder.done.wait(WAIT))
+        self.assertIn("auth-failure", recorder.failed)
+        self.assertFalse(session.connected)
+        self.output()
+        self.assertIn("auth_failed", [event.kind for event in recorder.events])
+
+    def test_tls_error(self):
+        session, recorder = self.start("tls_error")
+        self.assertTrue(recorder.done.wait(WAIT))
+        self.assertEqual(recorder.failed, "OpenVPN exited with code 1 before connecting")
+        self.output()
+        errors = [event.data["error"] for event in recorder.events if event.kind == "tls_error"]
+        self.assertIn("TLS Error: TLS handshake failed", errors)
+
+    def test_timeout_reports_last_state(self):
+        session, recorder = self.start("hang", connect_timeout=1)
+        self.assertTrue(recorder.done.wait(WAIT))
+        self.assertEqual(recorder.failed, "No connection after 1s (last state: ADD_ROUTES)")
+        self.assertIsNotNone(session.process.poll())
+
+    def test_disconnect(self):
+        session, recorder = self.start("ok")
+        self.assertTrue(recorder.done.wait(WAIT))
+        self.assertTrue(session.stop())
+        self.assertEqual(session.process.returncode, 0)
+        self.assertIn("FAKE command=signal SIGTERM", self.output())
+        # A user disconnect is neither a failure nor an unexpected exit
+        time.sleep(0.2)
+        self.assertIsNone(recorder.failed)
+        self.assertIsNone(recorder.exit_code)
+
+
+class ManagementPasswordTest(unittest.TestCase):
+    def test_password_prompt(self):
+        # The Windows form: host, port and a password file
+        with tempfile.TemporaryDirectory() as directory:
+            password_file = os.path.join(directory, "mgmt.pw")
+            with open(password_file, "w") as f:
+                f.write("s3cret\n")
+            with socket.socket() as probe:
+                probe.bind(("127.0.0.1", 0))
+                port = probe.getsockname()[1]
+            process = subprocess.Popen(
+                FAKE_OPENVPN + ["--management", "127.0.0.1", str(port), password_file], stdout=subprocess.DEVNULL
+            )
+            self.addCleanup(process.wait)
+            self.addCleanup(process.kill)
+            events = []
+            client = ManagementClient(("127.0.0.1", port), "s3cret", on_event=lambda kind, payload: events.append(kind))
+            client.connect(WAIT)
+            client.start()
+            deadline = time.monotonic() + WAIT
+            while "HOLD" not in events and time.monotonic() < deadline:
+                time.sleep(0.05)
+            client.close()
+            self.assertEqual(events, ["INFO", "HOLD"])
+
+
+if __name__ == "__main__":
+    unittest.main()
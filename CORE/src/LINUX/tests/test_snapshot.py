@@ -0,0 +1,76 @@
+import os
+import struct
+import tempfile
+import unittest
+
+from cyphergate_core.bench import generate_csv
+from cyphergate_core.cache import ServerListCache, file_sha256
+from cyphergate_core.serverlist import read_server_list
+from cyphergate_core.snapshot import MAGIC, VERSION, read_snapshot, write_snapshot
+from cyphergate_core.store import country_index
+
+FIELDS = ("host", "ip", "country", "country_code", "ping", "speed", "sessions",
+          "score", "uptime", "total_users", "total_traffic", "operator")
+
+
+def row(record):
+    config = record.config
+    return tuple(getattr(record, name) for name in FIELDS) + (config.path, config.offset, config.length, config.crc)
+
+
+class SnapshotTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.csv_path = os.path.join(directory.name, "serverlist.csv")
+        self.path = os.path.join(directory.name, "serverlist.snapshot")
+        with open(self.csv_path, "wb") as f:
+            f.write(generate_csv(50))
+        self.records = read_server_list(self.csv_path)
+        self.sha256 = file_sha256(self.csv_path)
+
+    def test_round_trip(self):
+        write_snapshot(self.path, self.records, self.sha256)
+        records, index = read_snapshot(self.path, self.csv_path, self.sha256)
+        self.assertEqual([row(record) for record in records], [row(record) for record in self.records])
+        self.assertEqual(index, country_index(self.records))
+        # Config refs still point into the CSV
+        self.assertEqual(records[7].config.decode(), self.records[7].config.decode())
+
+    def test_missing_ping_survives(self):
+        self.records[0].ping = None
+        write_snapshot(self.path, self.records, self.sha256)
+        self.assertIsNone(read_snapshot(self.path, self.csv_path, self.sha256)[0][0].ping)
+
+    def test_stale_or_damaged_snapshot_is_ignored(self):
+        write_snapshot(self.path, self.records, self.sha256)
+        self.assertIsNone(read_snapshot(self.path, self.csv_path, "00" * 32))
+        with open(self.path, "r+b") as f:
+            f.truncate(os.path.getsize(self.path) - 3)
+        self.assertIsNone(read_snapshot(self.path, self.csv_path, self.sha256))
+        self.assertIsNone(read_snapshot(self.path + ".missing", self.csv_path, self.sha256))
+
+    def test_other_version_is_ignored(self):
+        write_snapshot(self.path, self.records, self.sha256)
+        with open(self.path, "r+b") as f:
+            f.seek(len(MAGIC))
+            f.write(struct.pack("<H", VERSION - 1))
+        self.assertIsNone(read_snapshot(self.path, self.csv_path, self.sha256))
+
+    def test_cache_rebuilds_a_stale_snapshot(self):
+        cache = ServerListCache(self.csv_path)
+        records, index = cache.load()
+        self.assertIsNone(index)  # parsed from the CSV
+        self.assertEqual(len(cache.load()[0]), 50)
+        self.assertIsNotNone(cache.load()[1])  # from the snapshot
+        # A different CSV under the same name: the old snapshot no longer matches
+        with open(self.csv_path, "wb") as f:
+            f.write(generate_csv(30, seed=1))
+        cache = ServerListCache(self.csv_path)
+        records, index = cache.load()
+        self.assertIsNone(index)
+        self.assertEqual(len(records), 30)
+
+
+if __name__ == "__main__":
+    unittest.main()
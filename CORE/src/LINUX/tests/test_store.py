@@ -0,0 +1,74 @@
+import unittest
+
+from cyphergate_core.store import ServerRecord, ServerStore
+
+
+def record(host, country, code, ping, speed):
+    return ServerRecord(host, host, country, code, ping, speed, 1, None)
+
+
+def hosts(store, country, order):
+    return [server.host for server in store.servers(country, order)]
+
+
+class ByRtt:
+    # Stand-in Ranker: the lower the measured RTT the better, unmeasured last
+    def rank(self, records):
+        for server in records:
+            server.rank = -(server.rtt if server.rtt is not None else 1000)
+        return records
+
+
+class ServerStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.store = ServerStore([
+            record("jp1", "Japan", "JP", 40, 1_000),
+            record("kr1", "Korea", "KR", 10, 9_000),
+            record("jp2", "Japan", "JP", None, 5_000),
+            record("jp3", "Japan", "JP", 20, 3_000),
+        ])
+        self.jp1, _, self.jp2, self.jp3 = self.store.records
+
+    def test_countries_and_orders(self):
+        self.assertEqual(self.store.countries(), ["Japan", "Korea"])
+        self.assertEqual(len(self.store), 4)
+        # A missing ping sorts last
+        self.assertEqual(hosts(self.store, "Japan", "ping"), ["jp3", "jp1", "jp2"])
+        self.assertEqual(hosts(self.store, "Japan", "speed"), ["jp2", "jp3", "jp1"])
+        self.assertEqual(hosts(self.store, "Korea", "ping"), ["kr1"])
+
+    def test_unknown_country(self):
+        self.assertEqual(self.store.servers("Narnia"), [])
+
+    def test_rtt_order(self):
+        # Measured first, then the rest in reported-ping order
+        self.jp1.rtt, self.jp3.rtt = 30.0, 50.0
+        self.assertEqual(hosts(self.store, "Japan", "rtt"), ["jp1", "jp3", "jp2"])
+
+    def test_rerank_moves_only_the_score_order(self):
+        store = ServerStore(self.store.records, ByRtt())
+        self.jp2.rtt = 5.0
+        store.rerank(ByRtt())
+        self.assertEqual(hosts(store, "Japan", "score")[0], "jp2")
+        self.assertEqual(hosts(store, "Japan", "ping"), ["jp3", "jp1", "jp2"])
+        self.jp1.rtt = 1.0
+        store.rerank(ByRtt())
+        self.assertEqual(hosts(store, "Japan", "score"), ["jp1", "jp2", "jp3"])
+
+    def test_filtered_keeps_orders_and_shares_records(self):
+        self.jp1.rtt, self.jp3.rtt = 30.0, 50.0
+        japan = self.store.filtered(lambda country, code: code == "JP", ByRtt())
+        self.assertEqual(japan.countries(), ["Japan"])
+        self.assertEqual(len(japan), 3)
+        self.assertEqual(hosts(japan, "Japan", "ping"), ["jp3", "jp1", "jp2"])
+        self.assertEqual(hosts(japan, "Japan", "speed"), ["jp2", "jp3", "jp1"])
+        self.assertEqual(hosts(japan, "Japan", "score"), ["jp1", "jp3", "jp2"])
+        self.assertIs(japan.servers("Japan")[0], self.jp3)
+        # Filtering again starts from the whole list, not from this selection
+        korea = japan.filtered(lambda country, code: country == "Korea")
+        self.assertEqual(korea.countries(), ["Korea"])
+        self.assertEqual(hosts(korea, "Korea", "ping"), ["kr1"])
+
+
+if __name__ == "__main__":
+    unittest.main()
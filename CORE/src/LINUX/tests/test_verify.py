@@ -0,0 +1,97 @@
+import threading
+import unittest
+from urllib.parse import urlsplit
+
+import requests
+
+from cyphergate_core.verify import Verification, check_dns, check_ipv6
+
+
+class FakeResponse:
+    def __init__(self, payload):
+        self.payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.payload
+
+
+class FakeHttp:
+    def __init__(self, geo):
+        self.geo = geo
+        self.urls = []
+
+    def get(self, url, timeout=None, retries=None):
+        self.urls.append(url)
+        return FakeResponse({"dns": {"ip": "10.9.9.9", "geo": self.geo}})
+
+
+class CheckDnsTest(unittest.TestCase):
+    def test_every_check_asks_a_new_name(self):
+        http = FakeHttp("Japan - Example ISP")
+        self.assertEqual(check_dns(http, 1, "Japan"), (True, "10.9.9.9 (Japan - Example ISP)"))
+        check_dns(http, 1, "Japan")
+        hosts = [urlsplit(url).hostname for url in http.urls]
+        self.assertNotEqual(hosts[0], hosts[1])
+        self.assertTrue(all(host.endswith(".edns.ip-api.com") and len(host.split(".")[0]) == 32 for host in hosts))
+
+    def test_resolver_elsewhere_is_a_leak(self):
+        ok, value = check_dns(FakeHttp("Germany - Home ISP"), 1, "Japan")
+        self.assertFalse(ok)
+        self.assertIn("possible DNS leak", value)
+
+
+class Ipv6Http:
+    # Answers the IPv6 lookup with `address`, or fails to connect when it is None
+    def __init__(self, address):
+        self.address = address
+
+    def get_text(self, url, timeout=None, retries=None):
+        if self.address is None:
+            raise requests.ConnectionError("no route")
+        return self.address
+
+
+class CheckIpv6Test(unittest.TestCase):
+    def test_reachable_without_ipv6_in_the_tunnel_is_a_leak(self):
+        ok, value = check_ipv6(Ipv6Http("2001:db8::1"), 1, tunnel_ipv6=False)
+        self.assertFalse(ok)
+        self.assertEqual(value, "2001:db8::1, possible IPv6 leak")
+
+    def test_reachable_through_the_tunnel(self):
+        self.assertEqual(check_ipv6(Ipv6Http("2001:db8::1"), 1, tunnel_ipv6=True), (None, "2001:db8::1"))
+
+    def test_unreachable(self):
+        self.assertEqual(check_ipv6(Ipv6Http(None), 1, tunnel_ipv6=False), (True, "not reachable (no IPv6 leak)"))
+        self.assertEqual(check_ipv6(Ipv6Http(None), 1, tunnel_ipv6=True), (None, "not reachable"))
+
+
+class VerificationTest(unittest.TestCase):
+    def test_results_then_close_once(self):
+        closed = []
+        done = threading.Event()
+        verification = Verification(
+            {"a": lambda: (True, "fine"), "b": lambda: (None, "info")},
+            timeout=5, on_done=lambda v: done.set(), close=lambda: closed.append(1)
+        )
+        verification.start()
+        self.assertTrue(done.wait(5))
+        verification.cancel()
+        self.assertEqual(closed, [1])
+        self.assertEqual(verification.summary(), "✅ a: fine\nℹ️ b: info")
+
+    def test_cancel_closes(self):
+        closed = []
+        release = threading.Event()
+        verification = Verification({"slow": lambda: release.wait(5) and (True, "late")}, close=lambda: closed.append(1))
+        verification.start()
+        verification.cancel()
+        release.set()
+        self.assertEqual(closed, [1])
+        self.assertEqual(verification.results, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+
+from cyphergate_core.sampler import Sample
+from cyphergate_core.watchdog import HealthWatchdog
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def sample(rx_bytes, tx_rate=1000, rtt=20.0):
+    return Sample(0, 0, tx_rate, rtt, rx_bytes, 0)
+
+
+class HealthWatchdogTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.watchdog = HealthWatchdog(rtt_timeout=30, stall_seconds=20, reconnect_grace=30, clock=self.clock)
+
+    def run_for(self, seconds, make_sample):
+        # One sample a second, like the sampler; returns the first failover reason
+        for second in range(seconds):
+            self.clock.now += 1
+            reason = self.watchdog.check(make_sample(second))
+            if reason:
+                return reason
+        return None
+
+    def test_healthy_tunnel(self):
+        self.assertIsNone(self.run_for(120, lambda second: sample(second * 1000)))
+
+    def test_stalled_traffic(self):
+        reason = self.run_for(120, lambda second: sample(5000))
+        self.assertEqual(reason, "traffic stalled for 20s")
+
+    def test_idle_tunnel_is_not_stalled(self):
+        # Nothing sent, so nothing is owed back
+        self.assertIsNone(self.run_for(120, lambda second: sample(5000, tx_rate=0)))
+
+    def test_no_tunnel(self):
+        self.watchdog.observe_state("RECONNECTING")
+        reason = self.run_for(120, lambda second: sample(second * 1000))
+        self.assertEqual(reason, "no tunnel for 30s")
+
+    def test_reconnected_in_time(self):
+        self.watchdog.observe_state("RECONNECTING")
+        self.assertIsNone(self.run_for(20, lambda second: sample(second * 1000)))
+        self.watchdog.observe_state("CONNECTED")
+        self.assertIsNone(self.run_for(120, lambda second: sample(second * 1000)))
+
+    def test_no_rtt_reply_while_receiving(self):
+        # A blocked probe target alone doesn't condemn a tunnel that carries traffic
+        self.assertIsNone(self.run_for(120, lambda second: sample(second * 1000, rtt=None)))
+
+    def test_no_rtt_reply_and_nothing_received(self):
+        # Idle (nothing sent either), so only the RTT rule can notice
+        reason = self.run_for(120, lambda second: sample(5000, tx_rate=0, rtt=None))
+        self.assertEqual(reason, "no latency reply or incoming traffic for 30s")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -6,37 +6,52 @@ import os
 import sys
 import subprocess
 import requests
-import csv
-import base64
 from plyer import notification
+from cyphergate_core import control
+from cyphergate_core.engine import Engine
+from cyphergate_core.racer import race_report
+from cyphergate_core.sampler import describe
 from PySide6.QtWidgets import (
-    QApplication, QWidget, QVBoxLayout, QTableWidget, QTableWidgetItem,
+    QApplication, QWidget, QVBoxLayout, QTableView, QHeaderView,
     QPushButton, QLabel, QMessageBox, QHBoxLayout, QComboBox, QSystemTrayIcon,
     QMenu, QSizePolicy, QGraphicsOpacityEffect
 )
 from PySide6.QtGui import QIcon, QAction, QFont, QPainter, QColor, QPen
-from PySide6.QtCore import Qt, QPropertyAnimation, QEasingCurve, QTimer, QRectF, QSize, QEvent
+from PySide6.QtCore import Qt, QObject, Signal, QPropertyAnimation, QEasingCurve, QTimer, QRectF, QSize, QEvent, QLockFile
+from PySide6.QtCore import QAbstractTableModel, QAbstractProxyModel, QModelIndex, QParallelAnimationGroup, QElapsedTimer, QFileSystemWatcher
+from PySide6.QtNetwork import QLocalServer
+import threading
 import time
-import re
-from datetime import datetime
+from collections import deque
 
-API_URL = "http://www.vpngate.net/api/iphone/"
 VPN_ROOT=os.path.expanduser("~\\.config\\cyphergate")
-VPN_DIR = os.path.expanduser(f"{VPN_ROOT}/servers")
-LOGS_DIR = os.path.join(VPN_ROOT, "logs")
-CACHE_FILE = os.path.join(f"{VPN_ROOT}/cache", "serverlist.csv")
-COUNTRIES_CONF = os.path.join(f"{VPN_ROOT}","countries.conf")
-os.makedirs(VPN_DIR, exist_ok=True)
-os.makedirs(os.path.dirname(CACHE_FILE), exist_ok=True)
-os.makedirs(os.path.dirname(COUNTRIES_CONF), exist_ok=True)
-os.makedirs(LOGS_DIR, exist_ok=True)
-
-if not os.path.exists(COUNTRIES_CONF):
-    with open(COUNTRIES_CONF, "w") as f:
-        f.write("# Example:\nJapan\nUnited States\nIndia\nGermany")
+
+SORT_ORDERS = {
+    "Sort: Best Score": "score",
+    "Sort: Reported Ping": "ping",
+    "Sort: Speed": "speed",
+    "Sort: Measured RTT": "rtt",
+}
+
+STATE_LABELS = {
+    "LAUNCHING": "Starting OpenVPN",
+    "RESOLVE": "Resolving server",
+    "TCP_CONNECT": "Opening TCP connection",
+    "CONNECTING": "Connecting",
+    "WAIT": "Waiting for server",
+    "AUTH": "Authenticating",
+    "GET_CONFIG": "Fetching tunnel config",
+    "ASSIGN_IP": "Assigning IP",
+    "ADD_ROUTES": "Adding routes",
+    "RECONNECTING": "Reconnecting",
+    "EXITING": "Exiting",
+}
 
 VERSION = "1.0.1"
 
+# Race probes run with --dev null, so they need neither admin rights nor a TAP adapter
+RACE_COMMAND = [r"bin\openvpn.exe"]
+
 # ────────────────────────────────────────────────────────
 # Spinner Widget
 # ────────────────────────────────────────────────────────
@@ -66,6 +81,352 @@ class SpinnerWidget(QWidget):
         painter.rotate(self.angle)
         painter.drawArc(QRectF(-radius, -radius, 2*radius, 2*radius), 0, 120 * 16)
 
+# ────────────────────────────────────────────────────────
+# Background Task
+# ────────────────────────────────────────────────────────
+
+class BackgroundTask(QObject):
+    # Runs a blocking callable on a daemon thread and hands the result back to the UI thread via signals
+    succeeded = Signal(object)
+    failed = Signal(object)
+    finished = Signal()
+
+    def __init__(self, fn, *args, parent=None):
+        super().__init__(parent)
+        self.fn = fn
+        self.args = args
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def run(self):
+        try:
+            result = self.fn(*self.args)
+        except Exception as e:
+            self.failed.emit(e)
+        else:
+            self.succeeded.emit(result)
+        self.finished.emit()
+
+class SessionEvents(QObject):
+    # Marshals Engine callbacks (fired on worker threads) onto the UI thread
+    state_changed = Signal(object, str, str)
+    connected = Signal(object, float)
+    failed = Signal(object, str)
+    exited = Signal(object, object)
+    race_won = Signal(object, object)
+    race_failed = Signal(object)
+    verify_result = Signal(object, object)
+    verify_done = Signal(object)
+    log_event = Signal(object, object)
+    sampled = Signal(object, object)
+    failover = Signal(object, object, object, str)
+
+class ControlServer(QObject):
+    # Serves the local control API (cyphergate_core/control.py) on the UI
+    # thread; connect and disconnect go through the same paths as the buttons
+    def __init__(self, window, name):
+        super().__init__(window)
+        self.window = window
+        self.subscribers = set()
+        self.server = QLocalServer(self)
+        self.server.setSocketOptions(QLocalServer.UserAccessOption)
+        self.server.newConnection.connect(self.on_new_connection)
+        # Only the instance lock holder gets here, so a leftover socket belongs to a crashed instance
+        QLocalServer.removeServer(name)
+        if not self.server.listen(name):
+            # The window works without it; only `cyphergate ctl` and a second launch can't reach it
+            message = f"Control socket unavailable: {self.server.errorString()}"
+            window.engine.log.append(message)
+            window.status_label.setToolTip(message)
+
+    def on_new_connection(self):
+        while self.server.hasPendingConnections():
+            client = self.server.nextPendingConnection()
+            client.readyRead.connect(lambda client=client: self.on_ready_read(client))
+            client.disconnected.connect(lambda client=client: self.on_disconnected(client))
+
+    def on_disconnected(self, client):
+        self.subscribers.discard(client)
+        client.deleteLater()
+
+    def on_ready_read(self, client):
+        while client.canReadLine():
+            try:
+                reply = self.handle(client, control.decode(bytes(client.readLine())))
+            except Exception as e:
+                reply = {"ok": False, "error": str(e)}
+            client.write(control.encode(reply))
+
+    def handle(self, client, request):
+        window, engine = self.window, self.window.engine
+        cmd = request.get("cmd")
+        if cmd == "list":
+            return control.list_reply(engine, request)
+        if cmd == "status":
+            return control.engine_status(engine)
+        if cmd == "subscribe":
+            self.subscribers.add(client)
+            return {"ok": True}
+        if cmd == "show":
+            window.tray_restore()
+            return {"ok": True}
+        if cmd == "disconnect":
+            if not engine.busy() and window.prepare_task is None:
+                return {"ok": False, "error": "not connected"}
+            window.stop_vpn()
+            return {"ok": True}
+        if cmd == "connect":
+            if engine.busy() or window.prepare_task is not None:
+                return {"ok": False, "error": "Disconnect the current VPN session first."}
+            if request.get("server"):
+                server = control.find_server(engine.store, request["server"])
+                if server is None:
+                    return {"ok": False, "error": f"no server {request['server']!r} in the current list"}
+                # Deferred so the reply doesn't wait on an error dialog
+                QTimer.singleShot(0, lambda: window.start_vpn_connection(server))
+                return {"ok": True, "server": control.server_row(server)}
+            country = control.match_country(engine.store, request.get("country") or "")
+            if country is None:
+                return {"ok": False, "error": "give a server, or a country from the list"}
+            window.country_dropdown.setCurrentText(country)
+            QTimer.singleShot(0, window.auto_connect_fastest)
+            return {"ok": True, "country": country}
+        return {"ok": False, "error": f"unknown command {cmd!r}"}
+
+    def publish(self, event):
+        data = control.encode(event)
+        for client in list(self.subscribers):
+            client.write(data)
+
+# ────────────────────────────────────────────────────────
+# Server Table Models
+# ────────────────────────────────────────────────────────
+class ServerTableModel(QAbstractTableModel):
+    # Every record in the store, one row each; the view only asks for the cells it paints
+    COLUMNS = ("Country", "Ping", "RTT", "Speed", "Users")
+    CELL_COLOR = QColor("#E5C100")
+    CELLS = (
+        lambda server: server.country,
+        lambda server: server.ping_text,
+        lambda server: server.rtt_text,
+        lambda server: server.speed_text,
+        lambda server: server.users_text,
+    )
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.records = []
+
+    def set_records(self, records):
+        self.beginResetModel()
+        self.records = records
+        self.endResetModel()
+
+    def refresh(self):
+        # Measurements were written into the records in place
+        if self.records:
+            self.dataChanged.emit(self.index(0, 0), self.index(len(self.records) - 1, len(self.COLUMNS) - 1))
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.records)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            return self.CELLS[index.column()](self.records[index.row()])
+        if role == Qt.TextAlignmentRole:
+            return Qt.AlignCenter
+        if role == Qt.ForegroundRole:
+            return self.CELL_COLOR
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.COLUMNS[section]
+        return super().headerData(section, orientation, role)
+
+class CountryProxyModel(QAbstractProxyModel):
+    # One country in one sort order, mapped straight onto the store's prebuilt
+    # index, so switching country or order doesn't walk the whole list
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rows = []
+        self.positions = None
+
+    def setSourceModel(self, model):
+        super().setSourceModel(model)
+        model.modelAboutToBeReset.connect(self.on_source_about_to_reset)
+        model.modelReset.connect(self.endResetModel)
+        model.dataChanged.connect(self.on_source_changed)
+
+    def on_source_about_to_reset(self):
+        self.beginResetModel()
+        self.rows = []
+        self.positions = None
+
+    def on_source_changed(self, top_left, bottom_right, roles=()):
+        if self.rows:
+            self.dataChanged.emit(self.index(0, 0), self.index(len(self.rows) - 1, self.columnCount() - 1))
+
+    def set_view(self, store, country, order):
+        self.beginResetModel()
+        self.rows = store.ids(country, order)
+        self.positions = None
+        self.endResetModel()
+
+    def server(self, row):
+        return self.sourceModel().records[self.rows[row]]
+
+    def mapToSource(self, proxy_index):
+        if not proxy_index.isValid():
+            return QModelIndex()
+        return self.sourceModel().index(self.rows[proxy_index.row()], proxy_index.column())
+
+    def mapFromSource(self, source_index):
+        if not source_index.isValid():
+            return QModelIndex()
+        if self.positions is None:
+            self.positions = {source: row for row, source in enumerate(self.rows)}
+        row = self.positions.get(source_index.row())
+        if row is None:
+            return QModelIndex()
+        return self.index(row, source_index.column())
+
+    def index(self, row, column, parent=QModelIndex()):
+        if parent.isValid() or not (0 <= row < len(self.rows)) or not (0 <= column < self.columnCount()):
+            return QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, index=None):
+        if index is None:
+            return super().parent()  # QObject.parent()
+        return QModelIndex()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() or self.sourceModel() is None else self.sourceModel().columnCount()
+
+# ────────────────────────────────────────────────────────
+# Cell Animator
+# ────────────────────────────────────────────────────────
+class CellAnimator(QObject):
+    # Pops in the cells of the rows currently on screen. Labels are started a few
+    # per frame within FRAME_BUDGET_MS, at most MAX_CONCURRENT run at once and the
+    # whole wave is squeezed into MAX_TOTAL_MS; anything still queued past that is dropped
+    FRAME_MS = 16
+    FRAME_BUDGET_MS = 4
+    MAX_CONCURRENT = 40
+    MAX_TOTAL_MS = 1500
+    DURATION_MS = 400
+    ROW_STAGGER_MS = 100
+    CELL_STAGGER_MS = 50
+
+    def __init__(self, table, parent=None):
+        super().__init__(parent)
+        self.table = table
+        self.pending = deque()
+        self.running = {}
+        self.clock = QElapsedTimer()
+        self.timer = QTimer(self)
+        self.timer.setInterval(self.FRAME_MS)
+        self.timer.timeout.connect(self.tick)
+
+    def animate(self):
+        # A new wave replaces whatever is still playing
+        self.cancel()
+        model = self.table.model()
+        first = self.table.rowAt(0)
+        if first == -1:
+            return
+        last = self.table.rowAt(self.table.viewport().height() - 1)
+        if last == -1:
+            last = model.rowCount() - 1
+        columns = model.columnCount()
+
+        span = self.ROW_STAGGER_MS * (last - first) + self.CELL_STAGGER_MS * (columns - 1)
+        scale = min(1.0, (self.MAX_TOTAL_MS - self.DURATION_MS) / span) if span else 1.0
+        for i in range(last - first + 1):
+            for j in range(columns):
+                delay = (self.ROW_STAGGER_MS * i + self.CELL_STAGGER_MS * j) * scale
+                self.pending.append((delay, first + i, j))
+        self.clock.start()
+        self.timer.start()
+
+    def tick(self):
+        elapsed = self.clock.elapsed()
+        if elapsed > self.MAX_TOTAL_MS:
+            self.pending.clear()
+        deadline = time.perf_counter() + self.FRAME_BUDGET_MS / 1000
+        while (self.pending and self.pending[0][0] <= elapsed and len(self.running) < self.MAX_CONCURRENT
+               and time.perf_counter() < deadline):
+            _, row, column = self.pending.popleft()
+            self.start_cell(row, column)
+        if not self.pending and not self.running:
+            self.timer.stop()
+
+    def start_cell(self, row, column):
+        index = self.table.model().index(row, column)
+        if not index.isValid():
+            return
+        cell_rect = self.table.visualRect(index)
+        start_rect = QRectF(
+            cell_rect.center().x() - cell_rect.width() * 0.1,
+            cell_rect.center().y() - cell_rect.height() * 0.1,
+            cell_rect.width() * 0.2,
+            cell_rect.height() * 0.2
+        ).toRect()
+
+        anim_label = QLabel(index.data(), self.table.viewport())
+        anim_label.setStyleSheet("color: #E5C100; font-family: monospace; background: transparent;")
+        anim_label.setAlignment(Qt.AlignCenter)
+        anim_label.setGeometry(start_rect)
+        anim_label.show()
+
+        effect = QGraphicsOpacityEffect(anim_label)
+        effect.setOpacity(0)
+        anim_label.setGraphicsEffect(effect)
+
+        fade_anim = QPropertyAnimation(effect, b"opacity")
+        fade_anim.setStartValue(0)
+        fade_anim.setEndValue(1)
+        fade_anim.setDuration(self.DURATION_MS)
+        fade_anim.setEasingCurve(QEasingCurve.OutCubic)
+
+        geo_anim = QPropertyAnimation(anim_label, b"geometry")
+        geo_anim.setStartValue(start_rect)
+        geo_anim.setEndValue(cell_rect)
+        geo_anim.setDuration(self.DURATION_MS)
+        geo_anim.setEasingCurve(QEasingCurve.OutBack)
+
+        group = QParallelAnimationGroup(self)
+        group.addAnimation(fade_anim)
+        group.addAnimation(geo_anim)
+        group.finished.connect(lambda: self.finish(anim_label))
+        self.running[anim_label] = group
+        group.start()
+
+    def finish(self, label):
+        group = self.running.pop(label, None)
+        if group is not None:
+            group.deleteLater()
+            label.deleteLater()
+
+    def cancel(self):
+        self.timer.stop()
+        self.pending.clear()
+        for label, group in self.running.items():
+            group.stop()
+            group.deleteLater()
+            label.deleteLater()
+        self.running.clear()
+
 # ────────────────────────────────────────────────────────
 # Main Application Class
 # ────────────────────────────────────────────────────────
@@ -80,7 +441,49 @@ class CypherGate(QWidget):
         self.setWindowFlag(Qt.FramelessWindowHint)
         self.setWindowTitle("CypherGate")
         self.setGeometry(100, 100, 800, 550)
-        self.vpn_process = None
+        self.session = None
+        self.session_events = SessionEvents(self)
+        self.session_events.state_changed.connect(self.on_session_state)
+        self.session_events.connected.connect(self.on_session_connected)
+        self.session_events.failed.connect(self.on_session_failed)
+        self.session_events.exited.connect(self.on_session_exited)
+        self.session_events.race_won.connect(self.on_race_won)
+        self.session_events.race_failed.connect(self.on_race_failed)
+        self.session_events.verify_result.connect(self.on_verify_result)
+        self.session_events.verify_done.connect(self.on_verify_done)
+        self.session_events.log_event.connect(self.on_log_event)
+        self.session_events.sampled.connect(self.on_sample)
+        self.session_events.failover.connect(self.on_failover)
+        self.race = None
+        self.verification = None
+        self.control = None  # ControlServer, once __main__ has taken the instance lock
+        self.engine = Engine(
+            VPN_ROOT, [r"bin\openvpn.exe"], race_command=RACE_COMMAND,
+            popen_kwargs={"creationflags": subprocess.CREATE_NO_WINDOW},
+            race_popen_kwargs={
+                "creationflags": subprocess.CREATE_NO_WINDOW,
+                "stdout": subprocess.DEVNULL,
+                "stderr": subprocess.DEVNULL
+            }
+        )
+        events = self.session_events
+        self.engine.on_state = events.state_changed.emit
+        self.engine.on_connected = events.connected.emit
+        self.engine.on_failed = events.failed.emit
+        self.engine.on_exit = events.exited.emit
+        self.engine.on_race_won = events.race_won.emit
+        self.engine.on_race_failed = events.race_failed.emit
+        self.engine.on_log_event = events.log_event.emit
+        self.engine.on_sample = events.sampled.emit
+        self.engine.on_failover = events.failover.emit
+        self.server_model = ServerTableModel(self)
+        self.server_view = CountryProxyModel(self)
+        self.server_view.setSourceModel(self.server_model)
+        self.fetch_task = None
+        self.probe_task = None
+        self.prepare_task = None
+        self.update_task = None
+        self.from_cache = False
 
         self.setStyleSheet("""
             QWidget {
@@ -104,7 +507,7 @@ class CypherGate(QWidget):
             QPushButton:hover {
                 background-color: #C9A227;
             }
-            QTableWidget::item:selected {
+            QTableView::item:selected {
                 background-color: #E5C100;
                 color: #000000;
                 font-weight: bold;
@@ -156,20 +559,30 @@ class CypherGate(QWidget):
         title.setStyleSheet("font-weight: bold; font-size: 18px;")
         layout.addWidget(title)
 
+        filter_layout = QHBoxLayout()
         self.country_dropdown = QComboBox()
         self.country_dropdown.currentTextChanged.connect(self.filter_servers)
-        layout.addWidget(self.country_dropdown)
-
-        self.table = QTableWidget()
-        self.table.setColumnCount(4)
-        self.table.setHorizontalHeaderLabels(["Country", "Ping", "Speed", "Users"])
-        self.table.setSelectionBehavior(QTableWidget.SelectRows)
-        self.table.setSelectionMode(QTableWidget.SingleSelection)
+        filter_layout.addWidget(self.country_dropdown, 1)
+
+        self.sort_dropdown = QComboBox()
+        self.sort_dropdown.addItems(SORT_ORDERS)
+        self.sort_dropdown.currentTextChanged.connect(self.on_sort_changed)
+        filter_layout.addWidget(self.sort_dropdown)
+        layout.addLayout(filter_layout)
+
+        self.table = QTableView()
+        self.table.setModel(self.server_view)
+        self.table.setSelectionBehavior(QTableView.SelectRows)
+        self.table.setSelectionMode(QTableView.SingleSelection)
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        # Sizing to contents would measure every row; stretch instead
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         layout.addWidget(self.table)
+        self.cell_animator = CellAnimator(self.table, self)
 
         btn_layout = QHBoxLayout()
         self.refresh_btn = QPushButton("\U0001F504 Refresh")
-        self.refresh_btn.clicked.connect(self.load_servers)
+        self.refresh_btn.clicked.connect(lambda: self.refresh_servers(force=True))
         btn_layout.addWidget(self.refresh_btn)
 
         self.connect_btn = QPushButton("\U0001F517 Connect")
@@ -195,9 +608,26 @@ class CypherGate(QWidget):
         self.status_label.setAlignment(Qt.AlignCenter)
         layout.addWidget(self.status_label)
 
+        # Live throughput/RTT of the connected tunnel, fed by the engine's sampler
+        self.stats_label = QLabel()
+        self.stats_label.setAlignment(Qt.AlignCenter)
+        self.stats_label.hide()
+        layout.addWidget(self.stats_label)
+
+        self.verify_label = QLabel()
+        self.verify_label.setAlignment(Qt.AlignCenter)
+        self.verify_label.hide()
+        layout.addWidget(self.verify_label)
+
         self.setLayout(layout)
         self.load_servers()
 
+        # countries.conf edits re-filter the loaded list; the folder is watched
+        # too because editors often save by replacing the file
+        self.countries_watcher = QFileSystemWatcher([VPN_ROOT, self.engine.countries_file], self)
+        self.countries_watcher.fileChanged.connect(self.on_countries_changed)
+        self.countries_watcher.directoryChanged.connect(self.on_countries_changed)
+
         opacity_effect = QGraphicsOpacityEffect()
         self.setGraphicsEffect(opacity_effect)
 
@@ -240,264 +670,446 @@ class CypherGate(QWidget):
 # Core VPN Logic
 #────────────────────────────────────────────────────────
 
-    def load_allowed_countries(self):
-        if os.path.exists(COUNTRIES_CONF):
-            with open(COUNTRIES_CONF, "r", encoding="utf-8") as f:
-                return [line.strip() for line in f if line.strip()]
-        return None  # No filter if config missing
-
     def load_servers(self):
-        try:
-            response = requests.get(API_URL, timeout=30)
-            response.raise_for_status()
-            data = response.text
-            
-            with open(CACHE_FILE, "w", encoding="utf-8") as f:
-                f.write(data)
+        # Render whatever is on disk right away, then revalidate against VPNGate in the background
+        if self.engine.cache.exists():
+            try:
+                self.apply_servers(self.engine.read_cached())
+                self.from_cache = True
+            except Exception:
+                pass
+        self.refresh_servers()
+
+    def refresh_servers(self, force=False):
+        # force: the Refresh button, which asks VPNGate even inside the cache TTL
+        if self.fetch_task is not None:
+            return  # A fetch is already in flight
+        self.refresh_btn.setEnabled(False)
+        self.fetch_task = BackgroundTask(self.engine.fetch, None, force, parent=self)
+        self.fetch_task.succeeded.connect(self.on_servers_fetched)
+        self.fetch_task.failed.connect(self.on_servers_fetch_failed)
+        self.fetch_task.finished.connect(self.on_fetch_finished)
+        self.fetch_task.start()
+
+    def on_servers_fetched(self, store):
+        self.from_cache = False
+        if store is None:
+            # Cached list is still current; only load it if nothing is shown yet
+            if not self.engine.store and self.engine.cache.exists():
+                self.apply_servers(self.engine.read_cached())
+            return
+        self.apply_servers(store)
 
-        except Exception as e:
-            if os.path.exists(CACHE_FILE):
-                with open(CACHE_FILE, "r", encoding="utf-8") as f:
-                    data = f.read()
-                QMessageBox.warning(self, "Offline Mode", "Failed to fetch VPN servers online. Loaded from cache.")
-            else:
-                QMessageBox.critical(self, "Error", f"Failed to fetch VPN servers and no cache found:\n{e}")
+    def on_servers_fetch_failed(self, e):
+        if self.from_cache:
+            QMessageBox.warning(self, "Offline Mode", "Failed to fetch VPN servers online. Loaded from cache.")
+        elif self.engine.cache.exists():
+            try:
+                self.apply_servers(self.engine.read_cached())
+                self.from_cache = True
+            except Exception as cache_error:
+                QMessageBox.critical(self, "Error", f"Failed to fetch VPN servers and cache is unreadable:\n{cache_error}")
                 return
+            QMessageBox.warning(self, "Offline Mode", "Failed to fetch VPN servers online. Loaded from cache.")
+        else:
+            QMessageBox.critical(self, "Error", f"Failed to fetch VPN servers and no cache found:\n{e}")
 
-        lines = data.splitlines()[2:]
-        reader = csv.reader(lines)
-        servers = []
-        countries = set()
-
-        allowed_countries = self.load_allowed_countries()
-
-        for row in reader:
-            if len(row) < 15:
-                continue
-            country = row[5]
-            if allowed_countries and country not in allowed_countries:
-                continue  # Skip this country if not allowed
+    def on_fetch_finished(self):
+        self.fetch_task.deleteLater()
+        self.fetch_task = None
+        self.refresh_btn.setEnabled(True)
 
-            ping = row[3] + " ms"
-            speed = str(int(int(row[4]) / 1000)) + " kbps"
-            users = row[2]
-            config_b64 = row[-1]
-            servers.append((country, ping, speed, users, config_b64))
-            countries.add(country)
+    def apply_servers(self, store):
+        self.engine.apply(store)
+        self.server_model.set_records(store.records)
+        countries = store.countries()
+        current = self.country_dropdown.currentText()
 
-        self.all_servers = servers
+        self.country_dropdown.blockSignals(True)
         self.country_dropdown.clear()
-        self.country_dropdown.addItems(sorted(countries))
+        self.country_dropdown.addItems(countries)
+        if current in countries:
+            self.country_dropdown.setCurrentText(current)
+        self.country_dropdown.blockSignals(False)
         if countries:
             self.filter_servers(self.country_dropdown.currentText())
 
+    def on_countries_changed(self, path):
+        countries_file = self.engine.countries_file
+        if countries_file not in self.countries_watcher.files() and os.path.exists(countries_file):
+            self.countries_watcher.addPath(countries_file)
+        store = self.engine.reload_countries()
+        if store is not None:
+            self.apply_servers(store)
+
+    def current_order(self):
+        return SORT_ORDERS[self.sort_dropdown.currentText()]
+
     def filter_servers(self, country):
-        filtered = [s for s in self.all_servers if s[0] == country]
+        order = self.current_order()
+        self.populate_table(country, order)
+        self.engine.prepare_ahead(country)
+        if order == "rtt":
+            self.measure_latency(country)
 
-        def parse_ping(ping_str):
-            try:
-                return int(ping_str.split()[0])
-            except ValueError:
-                return float('inf')
-
-        filtered.sort(key=lambda s: parse_ping(s[1]))
-        self.populate_table(filtered)
-
-    def populate_table(self, servers):
-        self.table.setRowCount(len(servers))
-        self.filtered_servers = servers
-
-        for i, (country, ping, speed, users, _) in enumerate(servers):
-            row_data = [country, ping, speed, users]
-
-            for j, text in enumerate(row_data):
-                item = QTableWidgetItem(text)
-                item.setTextAlignment(Qt.AlignCenter)
-                item.setForeground(QColor("#E5C100"))
-                self.table.setItem(i, j, item)
-
-                cell_rect = self.table.visualItemRect(item)
-                start_rect = QRectF(
-                    cell_rect.center().x() - cell_rect.width() * 0.1,
-                    cell_rect.center().y() - cell_rect.height() * 0.1,
-                    cell_rect.width() * 0.2,
-                    cell_rect.height() * 0.2
-                ).toRect()
-
-                anim_label = QLabel(text, self.table.viewport())
-                anim_label.setStyleSheet("color: #E5C100; font-family: monospace; background: transparent;")
-                anim_label.setAlignment(Qt.AlignCenter)
-                anim_label.setGeometry(start_rect)
-                anim_label.show()
-
-                effect = QGraphicsOpacityEffect(anim_label)
-                effect.setOpacity(0)
-                anim_label.setGraphicsEffect(effect)
-
-                fade_anim = QPropertyAnimation(effect, b"opacity", self)
-                fade_anim.setStartValue(0)
-                fade_anim.setEndValue(1)
-                fade_anim.setDuration(400)
-                fade_anim.setEasingCurve(QEasingCurve.OutCubic)
-
-                geo_anim = QPropertyAnimation(anim_label, b"geometry", self)
-                geo_anim.setStartValue(start_rect)
-                geo_anim.setEndValue(cell_rect)
-                geo_anim.setDuration(400)
-                geo_anim.setEasingCurve(QEasingCurve.OutBack)
-
-                delay = 100 * i + 50 * j
-                QTimer.singleShot(delay, lambda a=fade_anim: a.start())
-                QTimer.singleShot(delay, lambda a=geo_anim: a.start())
-                QTimer.singleShot(delay + 400, anim_label.deleteLater)
-
-        self.table.resizeColumnsToContents()
-        if self.table.rowCount() > 0:
+    def on_sort_changed(self, _):
+        self.filter_servers(self.country_dropdown.currentText())
+
+    def measure_latency(self, country):
+        if self.probe_task is not None:
+            return
+        servers = self.engine.servers(country, "ping")
+        if not servers:
+            return
+        self.probe_task = BackgroundTask(self.engine.measure, servers, parent=self)
+        self.probe_task.succeeded.connect(lambda _: self.on_latency_measured(country))
+        self.probe_task.finished.connect(self.on_probe_finished)
+        self.probe_task.start()
+
+    def on_latency_measured(self, country):
+        self.server_model.refresh()
+        if country == self.country_dropdown.currentText() and self.current_order() in ("rtt", "score"):
+            self.populate_table(country, self.current_order())
+
+    def on_probe_finished(self):
+        self.probe_task.deleteLater()
+        self.probe_task = None
+
+    def populate_table(self, country, order):
+        self.server_view.set_view(self.engine.store, country, order)
+        if self.server_view.rowCount() > 0:
             self.table.selectRow(0)
+        self.cell_animator.animate()
 
     def connect_vpn(self):
-        selected = self.table.currentRow()
+        selected = self.table.currentIndex().row()
         if selected == -1:
             QMessageBox.warning(self, "No Selection", "Please select a VPN server.")
             return
-        self.start_vpn_connection(self.filtered_servers[selected])
+        self.start_vpn_connection(self.server_view.server(selected))
 
     def auto_connect_fastest(self):
-        if not self.filtered_servers:
+        if self.server_view.rowCount() == 0:
             QMessageBox.warning(self, "No Servers", "No servers available to auto-connect.")
             return
-        self.start_vpn_connection(self.filtered_servers[0])
+        # Best composite score, whatever order the table is currently showing
+        candidates = self.engine.best(
+            self.country_dropdown.currentText(), self.engine.settings.getint("connection", "race_candidates")
+        )
+        if len(candidates) > 1:
+            self.race_servers(candidates)
+        else:
+            self.start_vpn_connection(candidates[0] if candidates else self.server_view.server(0))
+
+    def race_servers(self, servers):
+        if self.engine.busy() or self.prepare_task is not None:
+            QMessageBox.warning(self, "Already Connected", "Disconnect the current VPN session first.")
+            return
+        prepared = [(server, self.engine.preparer.cached(server)) for server in servers]
+        if all(config is not None for _, config in prepared):
+            self.launch_race(prepared)
+            return
+        # Candidates that weren't prepared ahead are prepared off the UI thread
+        task = self.prepare_task = BackgroundTask(self.engine.prepare_all, servers, parent=self)
+        task.succeeded.connect(lambda prepared: self.on_race_prepared(task, prepared))
+        task.failed.connect(lambda e: self.on_prepare_failed(task, e))
+        task.finished.connect(task.deleteLater)
+        self.start_spinner()
+        self.status_label.setText(f"⏳ Preparing {len(servers)} servers in {servers[0].country}...")
+        self.connect_btn.setEnabled(False)
+        self.disconnect_btn.setEnabled(True)
+        task.start()
+
+    def on_race_prepared(self, task, prepared):
+        if task is not self.prepare_task:
+            return  # cancelled with Disconnect
+        self.prepare_task = None
+        self.launch_race(prepared)
+
+    def launch_race(self, prepared):
+        try:
+            self.race = self.engine.start_race(prepared)
+        except Exception as e:
+            self.reset_connection_ui()
+            QMessageBox.critical(self, "Connection Failed", str(e))
+            return
+        self.start_spinner()
+        self.status_label.setText(f"🏁 Racing {len(self.race.entries)} servers in {prepared[0][0].country}...")
+        self.connect_btn.setEnabled(False)
+        self.disconnect_btn.setEnabled(True)
+
+    def on_race_won(self, race, winner):
+        if race is not self.race:
+            return
+        self.race = None
+        self.status_label.setToolTip(race_report(race.entries))
+        self.start_vpn_connection(winner.server)
+
+    def on_race_failed(self, race):
+        if race is not self.race:
+            return
+        self.race = None
+        self.publish({"event": "failed", "reason": "None of the candidates completed a handshake"})
+        self.reset_connection_ui()
+        QMessageBox.critical(
+            self, "Connection Failed",
+            "None of the candidates completed a handshake:\n\n" + race_report(race.entries)
+        )
 
     def start_vpn_connection(self, server):
-        def extract_remote_host(config):
-            match = re.search(r'^remote\s+([^\s]+)', config, re.MULTILINE)
-            return match.group(1) if match else None
+        if self.engine.busy() or self.prepare_task is not None:
+            QMessageBox.warning(self, "Already Connected", "Disconnect the current VPN session first.")
+            return
 
-        def server_supports_ipv6(host):
-            try:
-                result = subprocess.run(["nslookup", "-query=AAAA", host], capture_output=True, text=True, creationflags=subprocess.CREATE_NO_WINDOW)
-                return "::" in result.stdout or "IPv6 address" in result.stdout
-            except:
-                return False
-
-        country, ping, speed, users, config_b64 = server
-        ovpn_path = os.path.join(VPN_DIR, f"{country}.ovpn")
-
-        config = base64.b64decode(config_b64).decode(errors='ignore')
-
-        # Inject ciphers if missing
-        if "data-ciphers" not in config:
-            config += "\ndata-ciphers AES-256-GCM:AES-128-GCM:CHACHA20-POLY1305:AES-128-CBC\n"
-        if "cipher" not in config:
-            config += "\ncipher AES-128-CBC\n"
-
-        # Handle IPv6 logic
-        host = extract_remote_host(config)
-        if host and server_supports_ipv6(host):
-            if "tun-ipv6" not in config:
-                config += "\n".join([
-                    "\n", "tun-ipv6",
-                    "push-peer-info",
-                    "redirect-gateway def1 ipv6",
-                    "route-ipv6 2000::/3 ::1"
-                ]) + "\n"
-        else:
-            # Disable IPv6 temporarily to prevent DNS leaks
-            subprocess.Popen(["netsh", "interface", "ipv6", "set", "state", "disabled"],
-                             stdout=subprocess.DEVNULL,
-                             stderr=subprocess.DEVNULL,
-                             creationflags=subprocess.CREATE_NO_WINDOW
-                             )
-
-        with open(ovpn_path, "w") as f:
-            f.write(config)
-
-        try:            
-            self.log_file = os.path.join(LOGS_DIR, f"cyphergate_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.txt")
-            self.log_file_handle = open(self.log_file, "w")
-            self.log_file_handle.write(f"\n\n===== VPN Session Started: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} =====\n")
-
-            self.vpn_process = subprocess.Popen(
-                [r"bin\openvpn.exe", "--config", ovpn_path],
-                creationflags=subprocess.CREATE_NO_WINDOW,
-                stdout=self.log_file_handle,
-                stderr=self.log_file_handle
-            )
-            self.start_spinner()
-            QApplication.processEvents()
-            start = time.time()
-            while time.time() - start < 15:
-                QApplication.processEvents()
-            self.stop_spinner(f"🔒 Connected to {country}")
-
-            self.status_label.setText(f"🔒 Connected to {country}")
-            self.connect_btn.setEnabled(False)
-            self.disconnect_btn.setEnabled(True)
-            self.show_connection_info(country, ping, speed, users)
+        # Usually ready: filter_servers() prepares every country's top servers ahead
+        prepared = self.engine.preparer.cached(server)
+        if prepared is not None:
+            self.launch_vpn(server)
+            return
+        # Otherwise the DNS lookup and patched config are made off the UI thread
+        task = self.prepare_task = BackgroundTask(self.engine.prepare, server, parent=self)
+        task.succeeded.connect(lambda _: self.on_prepared(task, server))
+        task.failed.connect(lambda e: self.on_prepare_failed(task, e))
+        task.finished.connect(task.deleteLater)
+        self.start_spinner()
+        self.status_label.setText(f"⏳ Preparing {server.country} ({server.host})...")
+        self.connect_btn.setEnabled(False)
+        self.disconnect_btn.setEnabled(True)
+        task.start()
+
+    def on_prepared(self, task, server):
+        if task is not self.prepare_task:
+            return  # cancelled with Disconnect
+        self.prepare_task = None
+        self.launch_vpn(server)
+
+    def on_prepare_failed(self, task, e):
+        if task is not self.prepare_task:
+            return
+        self.prepare_task = None
+        self.reset_connection_ui()
+        QMessageBox.critical(self, "Connection Failed", str(e))
 
+    def launch_vpn(self, server):
+        try:
+            # openvpn's output goes to the engine's log pipeline (logs/openvpn.log)
+            self.session = self.engine.connect(server)
         except Exception as e:
+            self.reset_connection_ui()
             QMessageBox.critical(self, "Connection Failed", str(e))
-    
-        finally:
-            if self.log_file_handle and not self.log_file_handle.closed:
-                self.log_file_handle.close()
+            return
 
+        self.active_server = server
+        self.start_spinner()
+        self.status_label.setText(f"⏳ Connecting to {server.country}...")
+        self.connect_btn.setEnabled(False)
+        self.disconnect_btn.setEnabled(True)
+
+    def on_session_state(self, session, state, detail):
+        if session is not self.session:
+            return  # late event from a session we already dropped
+        self.publish({"event": "state", "state": state, "detail": detail})
+        country = self.active_server.country
+        if session.connected:
+            if state == "RECONNECTING":
+                self.status_label.setText(f"🔄 Reconnecting to {country}...")
+            elif state == "CONNECTED":
+                self.status_label.setText(f"🔒 Connected to {country}")
+            return
+        self.status_label.setText(f"⏳ {country}: {STATE_LABELS.get(state, state.title())}...")
 
-    def show_connection_info(self, country, ping, speed, users):
-        try:
-            ipv4 = requests.get("https://ipinfo.io/ip", timeout=10).text.strip()
-            ipv6 = requests.get("https://api64.ipify.org", timeout=10).text.strip()
-        except:
-            ipv4 = "Unknown"
-            ipv6 = "Unknown"
+    def on_session_connected(self, session, handshake_time):
+        if session is not self.session:
+            return
+        self.publish({
+            "event": "connected", "server": control.server_row(self.active_server), "handshake_time": round(handshake_time, 2)
+        })
+        self.stop_spinner(f"🔒 Connected to {self.active_server.country} ({handshake_time:.1f}s)")
+        self.start_verification(session)
+
+    def on_session_failed(self, session, reason):
+        if session is not self.session:
+            return
+        self.publish({"event": "failed", "reason": reason})
+        self.reset_connection_ui()
+        # The reason already carries openvpn's last error; the recent log goes under "Show Details"
+        box = QMessageBox(QMessageBox.Critical, "Connection Failed", reason, parent=self)
+        box.setDetailedText("\n".join(self.engine.log.tail(50)))
+        box.exec()
+
+    def on_log_event(self, session, event):
+        if session is not self.session:
+            return
+        if event.is_error:
+            self.status_label.setToolTip(event.line)
+
+    def on_session_exited(self, session, code):
+        if session is not self.session:
+            return
+        self.publish({"event": "exited", "code": code})
+        self.reset_connection_ui()
         notification.notify(
-            title="CypherGate VPN Connected",
-            message=f"{country} | New IPv4: {ipv4}",
+            title="CypherGate VPN Disconnected",
+            message=f"OpenVPN exited unexpectedly (code {code}).",
             app_name="CypherGate"
         )
-        msg = (f"🌐 Connected to {country}\n"
-               f"🏓 Ping: {ping}\n"
-               f"🚀 Speed: {speed}\n"
-               f"👥 Users: {users}\n"
-               f"🔑 Your new IPv4: {ipv4}\n"
-               f"🔑 Your new IPv6: {ipv6}")
-        QMessageBox.information(self, "VPN Connected", msg)
 
-    def disconnect_vpn(self):
-        if self.vpn_process:
-            self.vpn_process.terminate()
-            self.vpn_process.wait()
-            self.vpn_process = None
-            self.status_label.setText("🔓 Disconnected")
-            self.connect_btn.setEnabled(True)
-            self.disconnect_btn.setEnabled(False)
-            self.log_file_handle.close()
-            subprocess.Popen(["netsh", "interface", "ipv6", "set", "state", "enabled"], 
-                            stdout=subprocess.DEVNULL,
-                            stderr=subprocess.DEVNULL,
-                            creationflags=subprocess.CREATE_NO_WINDOW
-                            )
-            QMessageBox.information(self, "VPN Disconnected", "VPN connection has been terminated.")
+    def reset_connection_ui(self):
+        self.session = None
+        self.stop_verification()
+        self.stats_label.clear()
+        self.stats_label.hide()
+        self.tray_icon.setToolTip("🌐 CypherGate VPN")
+        self.stop_spinner("🔓 Disconnected")
+        self.connect_btn.setEnabled(True)
+        self.disconnect_btn.setEnabled(False)
+
+
+    def on_failover(self, old_session, new_session, server, reason):
+        # The engine's watchdog gave up on the tunnel and picked the next server itself
+        if old_session is not self.session:
+            return
+        reason = reason.splitlines()[0]
+        self.publish({"event": "failover", "reason": reason, "server": control.server_row(server) if server else None})
+        if new_session is None:
+            self.reset_connection_ui()
             notification.notify(
                 title="CypherGate VPN Disconnected",
-                message="VPN connection has been terminated.",
+                message=f"Connection lost ({reason}) and no other server could take over.",
                 app_name="CypherGate"
             )
+            return
+        self.stop_verification()
+        self.session = new_session
+        self.active_server = server
+        self.start_spinner()
+        self.status_label.setText(f"🔁 {reason}; switching to {server.country} ({server.host})...")
+        notification.notify(
+            title="CypherGate VPN Failover",
+            message=f"{reason}. Switching to {server.country} ({server.host}).",
+            app_name="CypherGate"
+        )
+
+    def on_sample(self, session, sample):
+        if session is not self.session:
+            return
+        self.publish(dict(control.sample_row(sample), event="sample"))
+        stats = describe(sample)
+        self.stats_label.setText(stats)
+        self.stats_label.show()
+        self.tray_icon.setToolTip(f"🌐 CypherGate VPN\n🔒 {self.active_server.country}\n{stats}")
+
+    def start_verification(self, session):
+        # IPv4/IPv6/DNS/route checks run concurrently off the UI thread; each
+        # line shows up under the status as soon as its check finishes
+        events = self.session_events
+        self.verify_label.setText("🔎 Verifying connection...")
+        self.verify_label.show()
+        self.verification = self.engine.verify(
+            session, self.active_server,
+            on_result=events.verify_result.emit,
+            on_done=events.verify_done.emit
+        )
+
+    def stop_verification(self):
+        if self.verification:
+            self.verification.cancel()
+            self.verification = None
+        self.verify_label.clear()
+        self.verify_label.hide()
+
+    def on_verify_result(self, verification, result):
+        if verification is not self.verification:
+            return
+        self.verify_label.setText(verification.summary())
+
+    def on_verify_done(self, verification):
+        if verification is not self.verification:
+            return
+        self.publish({
+            "event": "verified",
+            "checks": {name: {"ok": result.ok, "value": str(result.value)} for name, result in verification.results.items()}
+        })
+        self.show_connection_info(self.active_server, verification)
+
+    def show_connection_info(self, server, verification):
+        country = server.country
+        ipv4 = verification.results["ipv4"]
+        ip = ipv4.value if ipv4.ok is not False else "Unknown"
+        notification.notify(
+            title="CypherGate VPN Connected",
+            message=f"{country} | New IP: {ip}",
+            app_name="CypherGate"
+        )
+        msg = (f"🌐 Connected to {country}\n"
+               f"🏓 Ping: {server.ping_text}\n"
+               f"🚀 Speed: {server.speed_text}\n"
+               f"👥 Users: {server.users_text}\n\n"
+               f"{verification.summary()}")
+        QMessageBox.information(self, "VPN Connected", msg)
+
+    def disconnect_vpn(self):
+        try:
+            if self.stop_vpn():
+                QMessageBox.information(self, "VPN Disconnected", "VPN connection has been terminated.")
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Failed to disconnect:\n{e}")
+
+    def stop_vpn(self):
+        # Cancels a race or preparation, or ends the tunnel (True); raises if openvpn won't exit
+        if self.prepare_task is not None:
+            self.prepare_task = None
+            self.reset_connection_ui()
+            self.publish({"event": "disconnected"})
+            return False
+        if self.race:
+            self.engine.disconnect()
+            self.race = None
+            self.reset_connection_ui()
+            self.publish({"event": "disconnected"})
+            return False
+        if not self.session:
+            return False
+        self.engine.disconnect()
+        self.reset_connection_ui()
+        self.publish({"event": "disconnected"})
+        notification.notify(
+            title="CypherGate VPN Disconnected",
+            message="VPN connection has been terminated.",
+            app_name="CypherGate"
+        )
+        return True
+
+    def publish(self, event):
+        # Pushes an event to `ctl subscribe` clients
+        if self.control is not None:
+            self.control.publish(event)
 
 #────────────────────────────────────────────────────────
 # Update Check
 #────────────────────────────────────────────────────────
 
+    def fetch_latest_version(self):
+        return self.engine.http_client().get_text(
+            "https://raw.githubusercontent.com/Cypher-Monarch/CypherGate/main/Versions/windows_version.txt"
+        )
+
     def check_for_updates(self):
-        try:
-            response = requests.get("https://raw.githubusercontent.com/Cypher-Monarch/CypherGate/main/Versions/windows_version.txt", timeout=5)
-            latest_version = response.text.strip()
-            if latest_version != VERSION:
-                QMessageBox.information(
-                    self, "Update Available",
-                    f"A new version {latest_version} is available! Please update for the latest features and fixes."
-                )
-        except requests.RequestException as e:
+        # Runs in the background so a slow GitHub never delays the window
+        self.update_task = BackgroundTask(self.fetch_latest_version, parent=self)
+        self.update_task.succeeded.connect(self.on_latest_version)
+        self.update_task.failed.connect(self.on_update_check_failed)
+        self.update_task.start()
+
+    def on_latest_version(self, latest_version):
+        if latest_version != VERSION:
+            QMessageBox.information(
+                self, "Update Available",
+                f"A new version {latest_version} is available! Please update for the latest features and fixes."
+            )
+
+    def on_update_check_failed(self, e):
+        if isinstance(e, requests.RequestException):
             QMessageBox.warning(
                 self, "Update Check Failed",
                 f"Could not check for updates: {e}\nYou can manually check on GitHub."
@@ -615,9 +1227,20 @@ class CypherGate(QWidget):
         self.setGraphicsEffect(None)     
 
 if __name__ == "__main__":
+    # One window per user: a second launch brings the running one to the front and exits
+    if control.forward(VPN_ROOT, "show") is not None:
+        sys.exit(0)
     app = QApplication(sys.argv)
+    os.makedirs(VPN_ROOT, exist_ok=True)
+    instance_lock = QLockFile(os.path.join(VPN_ROOT, "instance.lock"))
+    instance_lock.setStaleLockTime(0)  # only a dead owner frees it, however long the window has been open
+    if not instance_lock.tryLock(0):
+        control.forward(VPN_ROOT, "show", wait=10)  # the other one is still starting up
+        sys.exit(0)
     app.setWindowIcon(QIcon("Assets/icon.png"))
     window = CypherGate()
+    window.control = ControlServer(window, control.server_name(VPN_ROOT))
+    app.aboutToQuit.connect(window.engine.close)
     window.show()
 
     # Center the window
@@ -0,0 +1 @@
+# Qt-free engine shared by the CypherGate front-ends
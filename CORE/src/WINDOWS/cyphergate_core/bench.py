@@ -0,0 +1,254 @@
+# Offline benchmark for the fetch -> parse -> index -> filter -> patch pipeline,
+# including startup from the binary snapshot instead of the CSV.
+#
+# Generates a synthetic VPNGate CSV, serves it from a local HTTP stand-in for
+# API_URL with configurable latency and bandwidth, and times each stage with
+# its peak traced memory. Needs no network and no Qt display:
+#
+#   python -m cyphergate_core.bench --rows 1000 10000 100000 --output bench.json
+#   python -m cyphergate_core.bench --rows 10000 --compare bench.json
+
+import argparse
+import base64
+import gc
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .cache import ServerListCache
+from .patching import patch_config
+from .ranking import Ranker
+from .store import ServerStore
+
+HEADER = (
+    "*vpn_servers\r\n"
+    "#HostName,IP,Score,Ping,Speed,CountryLong,CountryShort,NumVpnSessions,Uptime,"
+    "TotalUsers,TotalTraffic,LogType,Operator,Message,OpenVPN_ConfigData_Base64\r\n"
+)
+
+COUNTRIES = (
+    ("Japan", "JP", 40), ("Korea Republic of", "KR", 20), ("United States", "US", 10),
+    ("Thailand", "TH", 5), ("Viet Nam", "VN", 5), ("Russian Federation", "RU", 5),
+    ("India", "IN", 3), ("Germany", "DE", 3), ("United Kingdom", "GB", 2),
+    ("Canada", "CA", 2), ("France", "FR", 2), ("Australia", "AU", 1),
+    ("Brazil", "BR", 1), ("Singapore", "SG", 1),
+)
+
+PATCH_PER_COUNTRY = 10
+SERVE_CHUNK = 16 * 1024
+
+
+def pem_block(rng, name, size):
+    body = base64.encodebytes(rng.randbytes(size)).decode()
+    return f"<{name}>\r\n-----BEGIN CERTIFICATE-----\r\n{body}-----END CERTIFICATE-----\r\n</{name}>\r\n"
+
+
+def synthetic_config(rng, ip):
+    # Same shape as a VPNGate config: comment header, directives, inline CA/cert/key
+    proto = rng.choice(("udp", "tcp"))
+    port = rng.choice((1194, 443, 995, 1195))
+    lines = [
+        "###############################################################################",
+        "# OpenVPN 2.0 Sample Configuration File",
+        "# for PacketiX VPN / SoftEther VPN Server",
+        "###############################################################################",
+        "",
+        "client",
+        "dev tun",
+        f"proto {proto}",
+        f"remote {ip} {port}",
+        "cipher AES-128-CBC",
+        "auth SHA1",
+        "resolv-retry infinite",
+        "nobind",
+        "persist-key",
+        "persist-tun",
+        "client-cert-not-required",
+        "verb 3",
+        "",
+    ]
+    config = "\r\n".join(lines) + pem_block(rng, "ca", 1400) + pem_block(rng, "cert", 900) + pem_block(rng, "key", 900)
+    return base64.b64encode(config.encode()).decode()
+
+
+def generate_csv(rows, seed=0):
+    rng = random.Random(seed)
+    names, codes, weights = zip(*COUNTRIES)
+    out = [HEADER]
+    for i in range(rows):
+        country = rng.choices(range(len(names)), weights)[0]
+        ip = f"{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}"
+        out.append(
+            f"public-vpn-{i},{ip},{rng.randint(1000, 3000000)},{rng.randint(1, 300)},"
+            f"{rng.randint(100000, 900000000)},{names[country]},{codes[country]},{rng.randint(0, 300)},"
+            f"{rng.randint(60000, 10 ** 10)},{rng.randint(1, 10 ** 6)},{rng.randint(1, 10 ** 13)},"
+            f"2weeks,Operator {i}'s owner,,{synthetic_config(rng, ip)}\r\n"
+        )
+    out.append("*\r\n")
+    return "".join(out).encode()
+
+
+class StandInServer:
+    # Serves one body with a fixed delay before the response and an optional
+    # bandwidth cap (bytes/second), like a slow VPNGate
+    def __init__(self, body, latency=0.0, bandwidth=0):
+        outer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                time.sleep(outer.latency)
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain")
+                self.send_header("Content-Length", str(len(outer.body)))
+                self.end_headers()
+                for i in range(0, len(outer.body), SERVE_CHUNK):
+                    chunk = outer.body[i:i + SERVE_CHUNK]
+                    self.wfile.write(chunk)
+                    if outer.bandwidth:
+                        time.sleep(len(chunk) / outer.bandwidth)
+
+            def log_message(self, *args):
+                pass
+
+        self.body = body
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}/api/iphone/"
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def measure(stages, name, fn, *args):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn(*args)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    stages[name] = {"seconds": round(elapsed, 6), "peak_bytes": peak}
+    return result
+
+
+def filter_all(store):
+    count = 0
+    for country in store.countries():
+        for order in ("score", "ping", "speed"):
+            count += len(store.servers(country, order))
+    return count
+
+
+def patch_top(store):
+    for country in store.countries():
+        for server in store.servers(country, "score")[:PATCH_PER_COUNTRY]:
+            patch_config(server.config.decode(), {"fast_io": True})
+
+
+def run(rows, latency, bandwidth, seed):
+    from .httpclient import HttpClient  # only needed for the fetch stage
+
+    body = generate_csv(rows, seed)
+    stages = {}
+    with tempfile.TemporaryDirectory() as tmp, StandInServer(body, latency, bandwidth) as server:
+        cache = ServerListCache(os.path.join(tmp, "serverlist.csv"))
+        http = HttpClient(retries=0)  # the same client the app fetches with, minus retries
+        records = measure(stages, "fetch_parse", lambda: cache.fetch(http.get, server.url, force=True))
+        http.close()
+        records = measure(stages, "parse_cached", cache.read)
+        measure(stages, "load_snapshot", cache.load)
+        snapshot_bytes = os.path.getsize(cache.snapshot_path)
+        store = measure(stages, "index_rank", ServerStore, records, Ranker())
+        measure(stages, "filter", filter_all, store)
+        measure(stages, "patch", patch_top, store)
+        del records, store
+    return {"rows": rows, "body_bytes": len(body), "snapshot_bytes": snapshot_bytes, "stages": stages}
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def max_rss_bytes():
+    try:
+        import resource
+    except ImportError:
+        return None  # Windows
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def compare(current, baseline):
+    old_runs = {run["rows"]: run for run in baseline.get("runs", [])}
+    for run in current["runs"]:
+        old = old_runs.get(run["rows"])
+        if not old:
+            continue
+        print(f"\n{run['rows']} rows vs {baseline.get('revision') or 'baseline'}:")
+        for stage, now in run["stages"].items():
+            before = old["stages"].get(stage)
+            if not before or not before["seconds"]:
+                continue
+            ratio = now["seconds"] / before["seconds"]
+            print(f"  {stage:<14} {before['seconds']:>9.4f}s -> {now['seconds']:>9.4f}s  ({ratio:.2f}x)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the CypherGate server list pipeline offline.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000], help="synthetic list sizes")
+    parser.add_argument("--latency", type=float, default=0.0, help="stand-in server delay before responding (s)")
+    parser.add_argument("--bandwidth", type=int, default=0, help="stand-in server bandwidth cap (bytes/s, 0 = none)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="JSON results from an earlier run to compare against")
+    args = parser.parse_args(argv)
+
+    results = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "latency": args.latency,
+        "bandwidth": args.bandwidth,
+        "runs": [],
+    }
+    for rows in args.rows:
+        result = run(rows, args.latency, args.bandwidth, args.seed)
+        results["runs"].append(result)
+        print(f"{rows} rows ({result['body_bytes'] / 1e6:.1f} MB):")
+        for stage, numbers in result["stages"].items():
+            print(f"  {stage:<14} {numbers['seconds']:>9.4f}s  peak {numbers['peak_bytes'] / 1e6:>8.2f} MB")
+        parse, snapshot = result["stages"]["parse_cached"]["seconds"], result["stages"]["load_snapshot"]["seconds"]
+        if snapshot:
+            print(f"  cold start from snapshot ({result['snapshot_bytes'] / 1e6:.1f} MB): {parse / snapshot:.1f}x faster than CSV")
+    results["max_rss_bytes"] = max_rss_bytes()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
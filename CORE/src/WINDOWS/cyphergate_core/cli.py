@@ -0,0 +1,391 @@
+# `cyphergate` command line: list, rank, connect, disconnect, status, tui, ctl.
+#
+#   python -m cyphergate_core list --country Japan
+#   python -m cyphergate_core connect --country Japan
+#   python -m cyphergate_core tui
+#   python -m cyphergate_core ctl status      # ask the running GUI (see control.py)
+#
+# Commands import only what they use: status and disconnect just read the
+# session file; list loads the engine and the history database it ranks
+# with, requests only when it has to download (not with --offline), and
+# never Qt or the OpenVPN session, sampler and watchdog code.
+# `connect` stays in the foreground until the tunnel goes down or it gets
+# SIGINT/SIGTERM (which is what `disconnect` sends it).
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from .control import find_server, match_country, server_row
+
+ROOT = os.path.join(os.path.expanduser("~"), ".config", "cyphergate")
+SESSION_FILE = os.path.join(ROOT, "session.json")
+ORDERS = ("score", "ping", "speed", "rtt")
+
+
+def make_engine():
+    import subprocess
+    from .engine import Engine
+
+    # The tunnel's own output always goes to the engine's log; this is for race probes
+    quiet = {"stdout": subprocess.DEVNULL, "stderr": subprocess.DEVNULL}
+    if os.name == "nt":
+        app_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        return Engine(
+            ROOT, [os.path.join(app_dir, "bin", "openvpn.exe")],
+            popen_kwargs=dict(quiet, creationflags=subprocess.CREATE_NO_WINDOW)
+        )
+
+    import shutil
+    # openvpn usually lives in sbin, which isn't on a regular user's PATH
+    openvpn = shutil.which("openvpn", path=os.pathsep.join([os.environ.get("PATH", ""), "/usr/sbin", "/sbin"])) or "openvpn"
+    if os.geteuid() == 0:
+        return Engine(ROOT, [openvpn], popen_kwargs=quiet)
+    return Engine(
+        ROOT, ["pkexec", openvpn], race_command=[openvpn], popen_kwargs=quiet,
+        kill=lambda process: subprocess.run(["pkexec", "kill", str(process.pid)])
+    )
+
+
+def load(args):
+    engine = make_engine()
+    engine.load(refresh=not args.offline)
+    return engine
+
+
+def print_servers(servers, as_json):
+    rows = [server_row(server) for server in servers]
+    if as_json:
+        print(json.dumps(rows, indent=2))
+        return
+    print(f"{'HOST':<22} {'IP':<16} {'PING':>6} {'RTT':>6} {'SPEED':>12} {'USERS':>6} {'RANK':>6}")
+    for row in rows:
+        rank = "-" if row["rank"] is None else f"{row['rank']:.3f}"
+        print(f"{row['host']:<22} {row['ip']:<16} {row['ping']:>6} {row['rtt']:>6} {row['speed']:>12} {row['users']:>6} {rank:>6}")
+
+
+def find_country(engine, name):
+    country = match_country(engine.store, name)
+    if country is not None:
+        return country
+    raise SystemExit(f"No servers for {name!r}. Available: {', '.join(engine.store.countries()) or 'none'}")
+
+
+def cmd_list(args):
+    engine = load(args)
+    try:
+        if not args.country:
+            counts = {country: len(engine.store.servers(country)) for country in engine.store.countries()}
+            if args.json:
+                print(json.dumps(counts, indent=2))
+            else:
+                for country, count in counts.items():
+                    print(f"{country:<30} {count:>5}")
+            return 0
+        country = find_country(engine, args.country)
+        print_servers(engine.servers(country, args.order)[:args.limit], args.json)
+        return 0
+    finally:
+        engine.close()
+
+
+def cmd_rank(args):
+    engine = load(args)
+    try:
+        country = find_country(engine, args.country)
+        if not args.no_probe:
+            engine.measure(engine.servers(country, "ping"))
+        print_servers(engine.servers(country, "score")[:args.limit], args.json)
+        return 0
+    finally:
+        engine.close()
+
+
+def pick_servers(engine, args):
+    if args.server:
+        server = find_server(engine.store, args.server)
+        if server is None:
+            raise SystemExit(f"No server {args.server!r} in the current list")
+        return [server]
+    if not args.country:
+        raise SystemExit("Give --country or --server")
+    country = find_country(engine, args.country)
+    count = 1 if args.no_race else engine.settings.getint("connection", "race_candidates")
+    return engine.best(country, count)
+
+
+def write_session(info):
+    tmp_path = f"{SESSION_FILE}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(info, f)
+    os.replace(tmp_path, SESSION_FILE)
+
+
+def read_session():
+    try:
+        with open(SESSION_FILE, "r", encoding="utf-8") as f:
+            info = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not pid_alive(info.get("pid", 0)):
+        return None  # left behind by a connect that was killed
+    return info
+
+
+def remove_session():
+    try:
+        os.remove(SESSION_FILE)
+    except OSError:
+        pass
+
+
+def pid_alive(pid):
+    if pid <= 0:
+        return False
+    if os.name == "nt":
+        # os.kill(pid, 0) would terminate the process on Windows
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        code = ctypes.c_ulong()
+        ok = kernel32.GetExitCodeProcess(handle, ctypes.byref(code))
+        kernel32.CloseHandle(handle)
+        return bool(ok) and code.value == 259  # STILL_ACTIVE
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def cmd_connect(args):
+    import signal
+    import threading
+
+    if read_session():
+        raise SystemExit("Already connected; run `cyphergate disconnect` first.")
+    engine = load(args)
+    servers = pick_servers(engine, args)
+    if not servers:
+        raise SystemExit("No servers to connect to")
+
+    done = threading.Event()
+    result = {"code": 1}
+    info = {"pid": os.getpid(), "openvpn_pid": None, "state": "LAUNCHING", "started_at": time.time(), "connected_at": None}
+
+    def connect(server):
+        info.update(server_row(server))
+        session = engine.connect(server)
+        info["openvpn_pid"] = session.process.pid
+        write_session(info)
+        print(f"Connecting to {server.country} ({server.host}, {server.ip})...")
+
+    def on_state(session, state, detail):
+        info["state"] = state
+        write_session(info)
+        print(f"  {state}" + (f" ({detail})" if detail else ""))
+
+    def on_connected(session, handshake_time):
+        info["connected_at"] = time.time()
+        write_session(info)
+        print(f"Connected in {handshake_time:.1f}s. Run `cyphergate disconnect` or press Ctrl+C to stop.")
+        engine.verify(session, engine.server, on_result=lambda verification, result: print(
+            f"  {result.icon} {result.label}: {result.value}"
+        ))
+
+    def on_finished(message, code):
+        print(message, file=sys.stderr if code else sys.stdout)
+        result["code"] = code
+        done.set()
+
+    def on_race_won(race, winner):
+        try:
+            connect(winner.server)
+        except Exception as e:
+            on_finished(f"Connection failed: {e}", 1)
+
+    def on_race_failed(race):
+        from .racer import race_report
+        on_finished("None of the candidates completed a handshake:\n" + race_report(race.entries), 1)
+
+    def on_sample(session, sample):
+        # status reads the session file, so keep the live numbers in it
+        info.update(rx_rate=round(sample.rx_rate), tx_rate=round(sample.tx_rate), rtt=sample.rtt)
+        write_session(info)
+
+    def on_failover(old_session, new_session, server, reason):
+        reason = reason.splitlines()[0]
+        if new_session is None:
+            on_finished(f"Connection lost ({reason}) and no other server could take over.", 1)
+            return
+        info.update(server_row(server), openvpn_pid=new_session.process.pid, state="LAUNCHING", connected_at=None)
+        write_session(info)
+        print(f"{reason}; failing over to {server.country} ({server.host}, {server.ip})...")
+
+    def on_log_event(session, event):
+        if event.is_error or event.kind == "reconnect":
+            print(f"  ! {event.line}", file=sys.stderr)
+
+    engine.on_state = on_state
+    engine.on_connected = on_connected
+    engine.on_failed = lambda session, reason: on_finished(f"Connection failed: {reason}", 1)
+    engine.on_exit = lambda session, code: on_finished(f"OpenVPN exited unexpectedly (code {code}).", 1)
+    engine.on_race_won = on_race_won
+    engine.on_race_failed = on_race_failed
+    engine.on_log_event = on_log_event
+    engine.on_sample = on_sample
+    engine.on_failover = on_failover
+
+    def stop(signum, frame):
+        threading.Thread(target=lambda: (engine.disconnect(), on_finished("Disconnected.", 0)), daemon=True).start()
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        if len(servers) > 1:
+            write_session(info)
+            print(f"Racing {len(servers)} servers in {servers[0].country}...")
+            engine.start_race(engine.prepare_all(servers))
+        else:
+            connect(servers[0])
+        while not done.wait(0.5):
+            pass  # short waits keep Ctrl+C responsive on Windows
+    except Exception as e:
+        print(f"Connection failed: {e}", file=sys.stderr)
+    finally:
+        remove_session()
+        engine.close()
+    return result["code"]
+
+
+def cmd_disconnect(args):
+    import signal
+
+    info = read_session()
+    if info is None:
+        print("Not connected.")
+        return 0
+    if os.name == "nt":
+        # No SIGTERM for console processes on Windows; ending openvpn makes
+        # the connect process clean up and exit on its own
+        pid = info.get("openvpn_pid") or info["pid"]
+    else:
+        pid = info["pid"]
+    os.kill(pid, signal.SIGTERM)
+    for _ in range(100):
+        if not pid_alive(info["pid"]):
+            print("Disconnected.")
+            return 0
+        time.sleep(0.1)
+    print("Disconnect requested; the connect process is still shutting down.", file=sys.stderr)
+    return 1
+
+
+def cmd_status(args):
+    info = read_session()
+    if args.json:
+        print(json.dumps(info, indent=2))
+        return 0
+    if info is None:
+        print("Not connected.")
+        return 0
+    if info.get("connected_at"):
+        minutes = int((time.time() - info["connected_at"]) // 60)
+        print(f"Connected to {info['country']} ({info['host']}, {info['ip']}) for {minutes} min")
+        if info.get("rx_rate") is not None:
+            from .sampler import Sample, describe
+            print(describe(Sample(None, info["rx_rate"], info["tx_rate"], info.get("rtt"), None, None)))
+    elif info.get("host"):
+        print(f"Connecting to {info['country']} ({info['host']}, {info['ip']}): {info['state']}")
+    else:
+        print("Racing candidate servers...")
+    return 0
+
+
+def cmd_tui(args):
+    from .tui import run
+
+    engine = make_engine()
+    try:
+        return run(engine, offline=args.offline)
+    finally:
+        engine.close()
+
+
+def cmd_ctl(args):
+    from .control import ControlClient, control_address
+
+    request = {}
+    if args.action == "list":
+        request = {"country": args.country, "order": args.order, "limit": args.limit}
+    elif args.action == "connect":
+        if not (args.target or args.country):
+            raise SystemExit("Give a server (host or IP) or --country")
+        request = {"server": args.target} if args.target else {"country": args.country}
+    try:
+        client = ControlClient(control_address(ROOT))
+    except OSError:
+        raise SystemExit("CypherGate isn't running.")
+    with client:
+        reply = client.request(args.action, **request)
+        print(json.dumps(reply), flush=True)
+        if args.action == "subscribe" and reply.get("ok"):
+            try:
+                for event in client.events():
+                    print(json.dumps(event), flush=True)
+            except KeyboardInterrupt:
+                pass
+    return 0 if reply.get("ok") else 1
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="cyphergate", description="CypherGate VPNGate client.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    list_parser = commands.add_parser("list", help="list countries, or the servers of one country")
+    list_parser.add_argument("--country")
+    list_parser.add_argument("--order", choices=ORDERS, default="score")
+    list_parser.add_argument("--limit", type=int, default=20)
+    list_parser.set_defaults(func=cmd_list)
+
+    rank_parser = commands.add_parser("rank", help="measure RTTs and rank a country's servers")
+    rank_parser.add_argument("--country", required=True)
+    rank_parser.add_argument("--limit", type=int, default=10)
+    rank_parser.add_argument("--no-probe", action="store_true", help="rank without measuring RTTs first")
+    rank_parser.set_defaults(func=cmd_rank)
+
+    connect_parser = commands.add_parser("connect", help="connect and stay in the foreground")
+    connect_parser.add_argument("--country")
+    connect_parser.add_argument("--server", help="host name or IP from the server list")
+    connect_parser.add_argument("--no-race", action="store_true", help="connect to the best server without racing")
+    connect_parser.set_defaults(func=cmd_connect)
+
+    commands.add_parser("disconnect", help="stop the running connect").set_defaults(func=cmd_disconnect)
+    commands.add_parser("status", help="show the current connection").set_defaults(func=cmd_status)
+    tui_parser = commands.add_parser("tui", help="full-screen terminal interface")
+    tui_parser.set_defaults(func=cmd_tui)
+
+    ctl_parser = commands.add_parser("ctl", help="control the running GUI; prints its JSON replies")
+    ctl_parser.add_argument("action", choices=("list", "connect", "disconnect", "status", "subscribe", "show"))
+    ctl_parser.add_argument("target", nargs="?", help="server host name or IP for connect")
+    ctl_parser.add_argument("--country")
+    ctl_parser.add_argument("--order", choices=ORDERS, default="score")
+    ctl_parser.add_argument("--limit", type=int, default=20)
+    ctl_parser.set_defaults(func=cmd_ctl)
+
+    for sub in (list_parser, rank_parser, connect_parser, tui_parser):
+        sub.add_argument("--offline", action="store_true", help="use the cached server list only")
+    for sub in (list_parser, rank_parser, commands.choices["status"]):
+        sub.add_argument("--json", action="store_true")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
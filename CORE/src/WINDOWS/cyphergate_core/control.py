@@ -0,0 +1,180 @@
+# Control API of a running CypherGate window, and the client side of it.
+#
+# The GUI listens on a local socket: a Unix domain socket at
+# ~/.config/cyphergate/control.sock (owner-only), or a per-user named pipe on
+# Windows. The protocol is one JSON object per line in both directions:
+#
+#   {"cmd": "list"}                          -> {"ok": true, "countries": {"Japan": 12, ...}}
+#   {"cmd": "list", "country": "Japan"}      -> {"ok": true, "servers": [{"host": ...}, ...]}
+#   {"cmd": "connect", "server": "<host or ip>"}
+#   {"cmd": "connect", "country": "Japan"}   -> races the country's best servers, like Auto-Connect
+#   {"cmd": "disconnect"}
+#   {"cmd": "status"}                        -> {"ok": true, "state": "connected", "server": {...}, ...}
+#   {"cmd": "show"}                          -> raises the window (a second launch sends this)
+#   {"cmd": "subscribe"}                     -> {"ok": true}, then one {"event": ...} line per event
+#
+# A country is a full name or two-letter code ("Japan", "jp"), as in
+# countries.conf. Failures come back as {"ok": false, "error": "..."}.
+# connect and disconnect answer once the request is accepted; how it goes
+# arrives as events.
+# Everything here is Qt-free, so scripts talk to the window without starting
+# Qt: `python -m cyphergate_core ctl status`.
+
+import getpass
+import json
+import os
+import socket
+import time
+
+from .countries import CountryFilter
+CONNECT_TIMEOUT = 2.0
+
+
+def control_address(root):
+    if os.name == "nt":
+        return rf"\\.\pipe\cyphergate-{getpass.getuser()}"
+    return os.path.join(root, "control.sock")
+
+
+def server_name(root):
+    # What QLocalServer listens on: a full path on Unix, a bare pipe name on Windows
+    address = control_address(root)
+    return address.rpartition("\\")[2] if os.name == "nt" else address
+
+
+def encode(message):
+    return (json.dumps(message, separators=(",", ":")) + "\n").encode()
+
+
+def decode(line):
+    message = json.loads(line)
+    if not isinstance(message, dict):
+        raise ValueError("expected a JSON object")
+    return message
+
+
+def server_row(server):
+    return {
+        "host": server.host,
+        "ip": server.ip,
+        "country": server.country,
+        "ping": server.ping_text,
+        "rtt": server.rtt_text,
+        "speed": server.speed_text,
+        "users": server.users_text,
+        "rank": None if server.rank is None else round(server.rank, 3),
+    }
+
+
+def sample_row(sample):
+    return {"rx_rate": round(sample.rx_rate), "tx_rate": round(sample.tx_rate), "rtt": sample.rtt}
+
+
+def match_country(store, name):
+    # By full name or two-letter code, the same way countries.conf entries match
+    wanted = CountryFilter.parse(name)
+    if not wanted:
+        return None
+    for country in store.countries():
+        ids = store.ids(country)
+        if ids and wanted.matches(country, store.records[ids[0]].country_code):
+            return country
+    return None
+
+
+def find_server(store, name):
+    for server in store.records:
+        if name in (server.host, server.ip):
+            return server
+    return None
+
+
+def list_reply(engine, request):
+    if not request.get("country"):
+        return {"ok": True, "countries": {name: len(engine.store.ids(name)) for name in engine.store.countries()}}
+    country = match_country(engine.store, request["country"])
+    if country is None:
+        return {"ok": False, "error": f"no servers for {request['country']!r}"}
+    order = request.get("order", "score")
+    if order not in engine.store.ORDERS:
+        return {"ok": False, "error": f"unknown order {order!r}"}
+    servers = engine.servers(country, order)[:int(request.get("limit", 20))]
+    return {"ok": True, "servers": [server_row(server) for server in servers]}
+
+
+def engine_status(engine):
+    race, session, server = engine.race, engine.session, engine.server
+    if race is not None:
+        return {"ok": True, "state": "racing", "candidates": [server_row(entry.server) for entry in race.entries]}
+    if session is None or server is None:
+        return {"ok": True, "state": "disconnected"}
+    status = {
+        "ok": True,
+        "state": "connected" if session.connected else "connecting",
+        "openvpn_state": session.state,
+        "server": server_row(server),
+        "uptime": round(session.uptime()),
+    }
+    sampler = engine.sampler
+    sample = sampler.series.latest() if sampler is not None else None
+    if sample is not None:
+        status.update(sample_row(sample))
+    return status
+
+
+class ControlClient:
+    def __init__(self, address, timeout=CONNECT_TIMEOUT):
+        if os.name == "nt":
+            self.stream = open(address, "r+b", buffering=0)  # named pipe
+        else:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(timeout)
+            try:
+                sock.connect(address)
+            except OSError:
+                sock.close()
+                raise
+            sock.settimeout(None)
+            self.stream = sock.makefile("rwb")
+            sock.close()  # the file keeps the connection open
+
+    def request(self, cmd, **args):
+        self.stream.write(encode(dict(args, cmd=cmd)))
+        self.stream.flush()
+        return self.read()
+
+    def read(self):
+        line = self.stream.readline()
+        if not line:
+            raise ConnectionError("CypherGate closed the control connection")
+        return decode(line)
+
+    def events(self):
+        # After subscribe: every event until the window goes away
+        while True:
+            try:
+                yield self.read()
+            except ConnectionError:
+                return
+
+    def close(self):
+        self.stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def forward(root, cmd="show", wait=0, **args):
+    # Sends one request to a running window; None if none answers within `wait` seconds
+    deadline = time.monotonic() + wait
+    while True:
+        try:
+            with ControlClient(control_address(root)) as client:
+                return client.request(cmd, **args)
+        except (OSError, ValueError):
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(0.1)
@@ -0,0 +1,134 @@
+# One HTTP client for every outbound call (VPNGate, IP lookups, update check).
+#
+# A single pooled requests.Session keeps connections alive between calls and
+# asks for gzip. Each host gets its own (connect, read) timeout. Connection
+# errors, timeouts and 429/5xx answers are retried with full-jitter exponential
+# backoff. After `breaker_threshold` straight failures a host's circuit opens:
+# calls to it fail at once for `breaker_cooldown` seconds, then one trial call
+# is let through to decide whether to close it again.
+
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_TIMEOUT = (5, 15)
+TIMEOUTS = {
+    "www.vpngate.net": (10, 30),
+    "ipinfo.io": (5, 10),
+    "api64.ipify.org": (5, 10),
+    "api6.ipify.org": (3, 8),
+    "raw.githubusercontent.com": (5, 5),
+}
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+USER_AGENT = "CypherGate"
+
+
+class CircuitOpenError(requests.ConnectionError):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.cooldown:
+                # Half-open: let this call through; one more failure re-opens it
+                self.opened_at = None
+                self.failures = self.threshold - 1
+                return True
+            return False
+
+    def retry_in(self):
+        with self.lock:
+            if self.opened_at is None:
+                return 0.0
+            return max(0.0, self.cooldown - (time.monotonic() - self.opened_at))
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+
+class HttpClient:
+    def __init__(self, retries=3, backoff=0.5, max_backoff=8.0, breaker_threshold=5, breaker_cooldown=60, pool_size=4):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self.breakers = {}
+        self.lock = threading.Lock()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(TIMEOUTS), pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Accept-Encoding": "gzip, deflate", "User-Agent": USER_AGENT})
+
+    def breaker(self, host):
+        with self.lock:
+            breaker = self.breakers.get(host)
+            if breaker is None:
+                breaker = self.breakers[host] = CircuitBreaker(self.breaker_threshold, self.breaker_cooldown)
+            return breaker
+
+    def timeout_for(self, url):
+        return TIMEOUTS.get(urlsplit(url).hostname, DEFAULT_TIMEOUT)
+
+    def delay(self, attempt):
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def get(self, url, timeout=None, stream=False, headers=None, retries=None):
+        # Same call shape as requests.get, so it can be handed to ServerListCache.fetch
+        host = urlsplit(url).hostname
+        breaker = self.breaker(host)
+        if timeout is None:
+            timeout = self.timeout_for(url)
+        if retries is None:
+            retries = self.retries
+
+        for attempt in range(retries + 1):
+            if not breaker.allow():
+                raise CircuitOpenError(f"{host} keeps failing; not trying again for {breaker.retry_in():.0f}s")
+            try:
+                response = self.session.get(url, timeout=timeout, stream=stream, headers=headers)
+            except (requests.ConnectionError, requests.Timeout):
+                breaker.record_failure()
+                if attempt == retries:
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    breaker.record_success()
+                    return response
+                breaker.record_failure()
+                if attempt == retries:
+                    return response
+                response.close()
+            time.sleep(self.delay(attempt))
+
+    def get_text(self, url, timeout=None, retries=None):
+        response = self.get(url, timeout=timeout, retries=retries)
+        response.raise_for_status()
+        return response.text.strip()
+
+    def close(self):
+        self.session.close()
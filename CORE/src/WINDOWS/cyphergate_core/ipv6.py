@@ -0,0 +1,67 @@
+# IPv6 on Windows while a tunnel is up.
+#
+# The patched config only routes IPv6 through the tunnel for servers that
+# publish an IPv6 address (the "ipv6" patch option). With any other server,
+# Windows keeps using its own IPv6 route, DNS included, so the IPv6 stack is
+# switched off with netsh for the session and back on once it ends. The
+# engine does this for every front end; other platforms have no switch.
+# IPv6 is only switched back on if this switch turned it off, so a machine
+# where it was off already stays that way. netsh runs on one worker thread,
+# in call order, and its failures go to the log.
+
+import subprocess
+import threading
+
+NETSH_TIMEOUT = 15
+
+
+class IPv6Switch:
+    def __init__(self, log=None):
+        from concurrent.futures import ThreadPoolExecutor
+
+        self.log = log  # line -> None
+        self.disabled = False  # whether we switched IPv6 off
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="netsh")
+        self.lock = threading.Lock()
+
+    def set(self, enabled):
+        with self.lock:
+            if self.executor is not None:
+                self.executor.submit(self.apply, enabled)
+
+    def apply(self, enabled):
+        if enabled and self.disabled:
+            self.disabled = not self.netsh("enabled")
+        elif not enabled and not self.disabled:
+            self.disabled = self.netsh("disabled")
+
+    def netsh(self, state):
+        # True if netsh set the state
+        try:
+            result = subprocess.run(
+                ["netsh", "interface", "ipv6", "set", "state", state],
+                capture_output=True,
+                text=True,
+                timeout=NETSH_TIMEOUT,
+                creationflags=subprocess.CREATE_NO_WINDOW
+            )
+        except (OSError, subprocess.TimeoutExpired) as e:
+            self.note(f"netsh: could not set IPv6 {state}: {e}")
+            return False
+        if result.returncode != 0:
+            output = " ".join((result.stdout + result.stderr).split())
+            self.note(f"netsh: could not set IPv6 {state} (exit {result.returncode}): {output}")
+            return False
+        return True
+
+    def note(self, line):
+        if self.log:
+            self.log(line)
+
+    def close(self):
+        # Switches IPv6 back on if we turned it off, and waits for netsh
+        self.set(True)
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
@@ -0,0 +1,105 @@
+# Ready-to-launch configs for the servers the user is likely to pick next.
+#
+# Preparing a server means everything connect() needs before openvpn can
+# start: reading and decoding its config, working out the patch options
+# (which may mean a DNS lookup for the IPv6 decision) and writing the patched
+# .ovpn. ConfigPreparer does that on a small worker pool and keeps the
+# results in an LRU of at most `capacity` servers, so Connect and Auto-Connect
+# normally just look the path up. Entries are keyed by host and config CRC,
+# so a server whose config changed in a newer list is prepared again, and
+# expire after `ttl` seconds because the DNS answer behind the options does.
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_CAPACITY = 128
+DEFAULT_WORKERS = 4
+DEFAULT_TTL = 5 * 60
+
+
+class PreparedConfig:
+    def __init__(self, path, options):
+        self.path = path
+        self.options = options
+        self.time = time.monotonic()
+
+
+class ConfigPreparer:
+    def __init__(self, build, capacity=DEFAULT_CAPACITY, ttl=DEFAULT_TTL, workers=DEFAULT_WORKERS):
+        self.build = build  # server -> PreparedConfig
+        self.capacity = capacity
+        self.ttl = ttl
+        self.workers = workers
+        self.entries = OrderedDict()  # key -> PreparedConfig, least recently used first
+        self.pending = {}  # key -> Future of the preparation in flight
+        self.executor = None
+        self.lock = threading.Lock()
+
+    def key(self, server):
+        return server.host, server.config.crc
+
+    def cached(self, server):
+        key = self.key(server)
+        with self.lock:
+            prepared = self.entries.get(key)
+            if prepared is None:
+                return None
+            if time.monotonic() - prepared.time >= self.ttl or not os.path.exists(prepared.path):
+                del self.entries[key]  # stale, or pruned from servers/ meanwhile
+                return None
+            self.entries.move_to_end(key)
+            return prepared
+
+    def submit(self, server):
+        # Future of the server's PreparedConfig; shares a preparation already in flight
+        from concurrent.futures import ThreadPoolExecutor
+
+        key = self.key(server)
+        with self.lock:
+            future = self.pending.get(key)
+            if future is None:
+                if self.executor is None:
+                    self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="preparer")
+                future = self.pending[key] = self.executor.submit(self.run, key, server)
+        return future
+
+    def run(self, key, server):
+        try:
+            return self.prepare(key, server)
+        finally:
+            with self.lock:
+                self.pending.pop(key, None)
+
+    def prepare(self, key, server):
+        prepared = self.build(server)
+        with self.lock:
+            self.entries[key] = prepared
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+        return prepared
+
+    def get(self, server):
+        # Blocking; waits for a preparation in flight or does it on this thread
+        prepared = self.cached(server)
+        if prepared is not None:
+            return prepared
+        with self.lock:
+            future = self.pending.get(self.key(server))
+        if future is not None:
+            return future.result()
+        return self.prepare(self.key(server), server)
+
+    def prefetch(self, servers):
+        # Oldest entries make room; never queues more than the cache can hold
+        for server in list(servers)[:self.capacity]:
+            if self.cached(server) is None:
+                self.submit(server)
+
+    def close(self):
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
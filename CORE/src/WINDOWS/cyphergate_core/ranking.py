@@ -0,0 +1,100 @@
+# Composite server ranking.
+#
+# Each metric pulls one column out of the whole record list, is normalised to
+# 0..1 (1 = best) across that column, and contributes its weight to the final
+# score. Work is done column by column over the full list once per load rather
+# than per row on every filter, and new metrics can be plugged in with
+# Ranker.register().
+
+import math
+
+NEUTRAL = 0.5
+
+
+class Metric:
+    def __init__(self, name, getter, higher_is_better=True, log_scale=False):
+        self.name = name
+        self.getter = getter
+        self.higher_is_better = higher_is_better
+        self.log_scale = log_scale
+
+    def column(self, records):
+        values = list(map(self.getter, records))
+        if self.log_scale:
+            values = [math.log1p(v) if v is not None and v > 0 else (0.0 if v is not None else None)
+                      for v in values]
+        return values
+
+    def normalize(self, records):
+        values = self.column(records)
+        known = [v for v in values if v is not None]
+        if not known:
+            return None
+        low = min(known)
+        span = max(known) - low
+        if not span:
+            return [NEUTRAL if v is None else 1.0 for v in values]
+        if self.higher_is_better:
+            return [NEUTRAL if v is None else (v - low) / span for v in values]
+        return [NEUTRAL if v is None else 1.0 - (v - low) / span for v in values]
+
+
+DEFAULT_METRICS = (
+    Metric("ping", lambda r: r.ping, higher_is_better=False, log_scale=True),
+    Metric("rtt", lambda r: r.rtt, higher_is_better=False, log_scale=True),
+    Metric("speed", lambda r: r.speed, log_scale=True),
+    Metric("score", lambda r: r.score, log_scale=True),
+    Metric("uptime", lambda r: r.uptime, log_scale=True),
+    Metric("load", lambda r: r.sessions, higher_is_better=False),
+    Metric("success", lambda r: r.success_rate),
+    Metric("connect_time", lambda r: r.connect_time, higher_is_better=False),
+)
+
+DEFAULT_WEIGHTS = {
+    "ping": 1.0,
+    "rtt": 2.0,
+    "speed": 1.0,
+    "score": 0.5,
+    "uptime": 0.5,
+    "load": 0.5,
+    "success": 1.5,
+    "connect_time": 0.5,
+}
+
+
+class Ranker:
+    def __init__(self, weights=None, metrics=DEFAULT_METRICS):
+        self.weights = dict(DEFAULT_WEIGHTS)
+        if weights:
+            self.weights.update(weights)
+        self.metrics = {metric.name: metric for metric in metrics}
+
+    def register(self, metric, weight):
+        self.metrics[metric.name] = metric
+        self.weights[metric.name] = weight
+
+    def rank(self, records):
+        # Writes record.rank for every record, in one column-wise pass per metric
+        n = len(records)
+        totals = [0.0] * n
+        weight_sum = 0.0
+        for name, metric in self.metrics.items():
+            weight = self.weights.get(name, 0.0)
+            if weight <= 0:
+                continue
+            column = metric.normalize(records)
+            if column is None:
+                continue  # no data for this metric anywhere (e.g. nothing probed yet)
+            totals = [t + weight * v for t, v in zip(totals, column)]
+            weight_sum += weight
+
+        if weight_sum:
+            for record, total in zip(records, totals):
+                record.rank = total / weight_sum
+        return records
+
+
+def ranker_from_settings(settings):
+    if not settings.has_section("ranking"):
+        return Ranker()
+    return Ranker({name: settings.getfloat("ranking", name) for name in settings.options("ranking")})
@@ -0,0 +1,169 @@
+# Live tunnel throughput and latency.
+#
+# One daemon thread wakes every `interval` seconds, reads the tunnel's byte
+# counters and turns the deltas into rates; every `rtt_interval` seconds it
+# also times a TCP connect to `rtt_target`, which goes through the tunnel once
+# the default route points into it. Samples land in a fixed-size TimeSeries.
+#
+# Counter sources all have read() -> (rx_bytes, tx_bytes):
+#   SysfsCounters       /sys/class/net/<tun>/statistics (Linux, exact, cheap)
+#   ManagementCounters  the session's >BYTECOUNT totals (any platform, coarser)
+#   FakeCounters        synthetic traffic for tests and benchmarks
+
+import random
+import threading
+import time
+from collections import deque
+
+from .prober import probe_tcp
+
+DEFAULT_INTERVAL = 1.0
+DEFAULT_RTT_INTERVAL = 5.0
+DEFAULT_CAPACITY = 300
+DEFAULT_RTT_TARGET = ("1.1.1.1", 443)
+
+
+class SysfsCounters:
+    def __init__(self, device):
+        self.device = device
+        self.paths = [f"/sys/class/net/{device}/statistics/{name}" for name in ("rx_bytes", "tx_bytes")]
+
+    def read(self):
+        values = []
+        for path in self.paths:
+            with open(path, "rb") as f:
+                values.append(int(f.read()))
+        return values[0], values[1]
+
+
+class ManagementCounters:
+    def __init__(self, session):
+        self.session = session
+
+    def read(self):
+        return self.session.bytes_in, self.session.bytes_out
+
+
+class FakeCounters:
+    # Traffic at roughly rx_rate/tx_rate bytes per second, +-jitter
+    def __init__(self, rx_rate=500_000, tx_rate=50_000, jitter=0.2, clock=time.monotonic):
+        self.rx_rate = rx_rate
+        self.tx_rate = tx_rate
+        self.jitter = jitter
+        self.clock = clock
+        self.last = clock()
+        self.rx = 0
+        self.tx = 0
+
+    def read(self):
+        now = self.clock()
+        elapsed, self.last = now - self.last, now
+        self.rx += int(self.rx_rate * elapsed * random.uniform(1 - self.jitter, 1 + self.jitter))
+        self.tx += int(self.tx_rate * elapsed * random.uniform(1 - self.jitter, 1 + self.jitter))
+        return self.rx, self.tx
+
+
+class Sample:
+    __slots__ = ("time", "rx_rate", "tx_rate", "rtt", "rx_bytes", "tx_bytes")
+
+    def __init__(self, time, rx_rate, tx_rate, rtt, rx_bytes, tx_bytes):
+        self.time = time
+        self.rx_rate = rx_rate  # bytes/s
+        self.tx_rate = tx_rate
+        self.rtt = rtt  # ms, latest measurement (None until the first one succeeds)
+        self.rx_bytes = rx_bytes
+        self.tx_bytes = tx_bytes
+
+
+class TimeSeries:
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.samples = deque(maxlen=capacity)
+        self.lock = threading.Lock()
+
+    def append(self, sample):
+        with self.lock:
+            self.samples.append(sample)
+
+    def latest(self):
+        with self.lock:
+            return self.samples[-1] if self.samples else None
+
+    def window(self, seconds):
+        # Samples from the last `seconds` seconds, oldest first
+        with self.lock:
+            if not self.samples:
+                return []
+            cutoff = self.samples[-1].time - seconds
+            return [sample for sample in self.samples if sample.time >= cutoff]
+
+
+def format_rate(rate):
+    bits = rate * 8
+    for unit in ("bps", "kbps", "Mbps"):
+        if bits < 1000:
+            return f"{bits:.0f} {unit}"
+        bits /= 1000
+    return f"{bits:.1f} Gbps"
+
+
+def describe(sample):
+    rtt = "-" if sample.rtt is None else f"{sample.rtt:.0f} ms"
+    return f"⬇ {format_rate(sample.rx_rate)}  ⬆ {format_rate(sample.tx_rate)}  RTT {rtt}"
+
+
+class TunnelSampler:
+    def __init__(self, counters, probe=None, interval=DEFAULT_INTERVAL, rtt_interval=DEFAULT_RTT_INTERVAL,
+                 capacity=DEFAULT_CAPACITY, on_sample=None):
+        self.counters = counters
+        self.probe = probe  # () -> RTT in ms, None or an exception when it fails
+        self.interval = interval
+        self.rtt_interval = rtt_interval
+        self.series = TimeSeries(capacity)
+        self.on_sample = on_sample  # (Sample)
+        self.rtt = None
+        self.stopped = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def measure_rtt(self):
+        try:
+            self.rtt = self.probe()
+        except OSError:
+            self.rtt = None
+
+    def read(self):
+        try:
+            rx, tx = self.counters.read()
+        except (OSError, ValueError):
+            return None  # interface not up yet, or already gone
+        return time.monotonic(), rx, tx
+
+    def run(self):
+        last = self.read()
+        next_rtt = time.monotonic()
+        while not self.stopped.wait(self.interval):
+            if self.probe and time.monotonic() >= next_rtt:
+                self.measure_rtt()
+                next_rtt = time.monotonic() + self.rtt_interval
+            current = self.read()
+            if current is None:
+                continue
+            if last is not None:
+                elapsed = max(current[0] - last[0], 1e-6)
+                rx, tx = current[1], current[2]
+                sample = Sample(
+                    time.time(), max(0, rx - last[1]) / elapsed, max(0, tx - last[2]) / elapsed, self.rtt, rx, tx
+                )
+                self.series.append(sample)
+                if self.on_sample and not self.stopped.is_set():
+                    self.on_sample(sample)
+            last = current
+
+
+def tcp_rtt_probe(target=DEFAULT_RTT_TARGET, timeout=2.0):
+    host, port = target
+    return lambda: probe_tcp(host, port, timeout) * 1000
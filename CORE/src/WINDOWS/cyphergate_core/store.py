@@ -0,0 +1,146 @@
+# Typed, indexed view of the parsed server list.
+#
+# Records hold numeric columns so sorting never re-parses display strings, and
+# the store builds a per-country index with pre-sorted orderings once per load.
+# Looking up a country is then a dict hit plus O(k) over its own rows.
+
+UNKNOWN_PING = float("inf")
+
+
+class ServerRecord:
+    __slots__ = (
+        "host", "ip", "country", "country_code", "ping", "speed", "sessions", "config",
+        "score", "uptime", "total_users", "total_traffic", "operator", "rtt",
+        "success_rate", "connect_time", "rank"
+    )
+
+    def __init__(self, host, ip, country, country_code, ping, speed, sessions, config,
+                 score=0, uptime=0, total_users=0, total_traffic=0, operator=""):
+        self.host = host
+        self.ip = ip
+        self.country = country
+        self.country_code = country_code
+        self.ping = ping          # ms as reported by VPNGate, None if missing
+        self.speed = speed        # bits per second
+        self.sessions = sessions  # current VPN sessions ("users")
+        self.config = config      # ConfigRef, decoded on demand
+        self.score = score                  # VPNGate's own quality score
+        self.uptime = uptime                # ms since the server came up
+        self.total_users = total_users
+        self.total_traffic = total_traffic  # bytes
+        self.operator = operator
+        self.rtt = None           # ms measured by LatencyProber, None if unknown
+        self.success_rate = None  # share of past attempts that connected (HistoryStore)
+        self.connect_time = None  # median past handshake time in seconds (HistoryStore)
+        self.rank = 0.0           # composite score from Ranker, higher is better
+
+    @property
+    def ping_text(self):
+        return f"{self.ping} ms" if self.ping is not None else "? ms"
+
+    @property
+    def speed_text(self):
+        return f"{self.speed // 1000} kbps"
+
+    @property
+    def rtt_text(self):
+        return f"{self.rtt:.0f} ms" if self.rtt is not None else "—"
+
+    @property
+    def users_text(self):
+        return str(self.sessions)
+
+    def sort_ping(self):
+        return self.ping if self.ping is not None else UNKNOWN_PING
+
+    def sort_rtt(self):
+        # Unmeasured servers go after measured ones, in reported-ping order
+        return (self.rtt if self.rtt is not None else UNKNOWN_PING, self.sort_ping())
+
+
+def country_index(records):
+    # The orderings that depend only on the list itself (and so can be snapshotted)
+    rows = {}
+    for i, record in enumerate(records):
+        rows.setdefault(record.country, []).append(i)
+    return {
+        country: {
+            "ping": sorted(ids, key=lambda i: records[i].sort_ping()),
+            "speed": sorted(ids, key=lambda i: -records[i].speed),
+        }
+        for country, ids in rows.items()
+    }
+
+
+class ServerStore:
+    ORDERS = ("score", "ping", "speed", "rtt")
+
+    def __init__(self, records=(), ranker=None, index=None):
+        # `index` is a country_index() of the same records, e.g. from a snapshot
+        self.records = list(records)
+        self.index = {}
+        self.source = None  # the unfiltered store this one was selected from
+        if ranker is not None:
+            ranker.rank(self.records)
+        self.build_index(index)
+
+    def build_index(self, static=None):
+        records = self.records
+        if static is None:
+            static = country_index(records)
+        for country, orders in static.items():
+            self.index[country] = {
+                "score": sorted(orders["ping"], key=lambda i: -records[i].rank),
+                "ping": orders["ping"],
+                "speed": orders["speed"],
+            }
+
+    def rerank(self, ranker):
+        # Called after new measurements arrive; only the score ordering moves
+        ranker.rank(self.records)
+        records = self.records
+        for orders in self.index.values():
+            # Swap in a new list so readers on other threads never see a half-sorted one
+            orders["score"] = sorted(orders["score"], key=lambda i: -records[i].rank)
+
+    def filtered(self, keep, ranker=None):
+        # Store with only the countries keep(country, code) accepts, ranked
+        # among themselves. It shares the record objects and reuses the
+        # per-country orderings, so re-filtering after a countries.conf edit
+        # doesn't re-parse or re-sort.
+        source = self.source or self
+        records, static = [], {}
+        for country, orders in source.index.items():
+            ids = orders["ping"]
+            if not ids or not keep(country, source.records[ids[0]].country_code):
+                continue
+            new_ids = {}
+            for i in ids:
+                new_ids[i] = len(records)
+                records.append(source.records[i])
+            static[country] = {"ping": [new_ids[i] for i in ids], "speed": [new_ids[i] for i in orders["speed"]]}
+        store = ServerStore(records, ranker, static)
+        store.source = source
+        return store
+
+    def __len__(self):
+        return len(self.records)
+
+    def countries(self):
+        return sorted(self.index)
+
+    def ids(self, country, order="ping"):
+        # Row ids of one country in the given order; prebuilt orders are
+        # returned as-is, so don't mutate the list
+        orders = self.index.get(country)
+        if not orders:
+            return []
+        if order == "rtt":
+            # Measurements change after every probe, so this one isn't prebuilt
+            records = self.records
+            return sorted(orders["ping"], key=lambda i: records[i].sort_rtt())
+        return orders[order]
+
+    def servers(self, country, order="ping"):
+        records = self.records
+        return [records[i] for i in self.ids(country, order)]
@@ -0,0 +1,141 @@
+# Tunnel health checks and the optional hot standby behind automatic failover.
+#
+# HealthWatchdog is fed the connected session's management states and the
+# sampler's samples and says when the tunnel should be given up on:
+#   - no successful in-tunnel RTT probe and no incoming bytes at all for
+#     `rtt_timeout` seconds (the probe goes to one host, which may just be
+#     blocked or rate-limited from this exit while the tunnel works fine);
+#   - bytes going out but nothing coming back for `stall_seconds`;
+#   - stuck outside CONNECTED (RECONNECTING, WAIT, ...) for `reconnect_grace`.
+# The openvpn process dying is reported by the session itself.
+#
+# HotStandby keeps a handshake open to the next-best server with the racers'
+# --dev null setup: no privileges, no routes, so it can't disturb the live
+# tunnel. It can't carry traffic, but when failover comes the engine already
+# knows a server that completed a handshake seconds ago and goes there first
+# instead of trying candidates blind. A standby that drops is replaced by the
+# next candidate.
+
+import threading
+import time
+
+from .racer import RACE_ARGS
+from .session import OpenVPNSession
+
+DEFAULT_RTT_TIMEOUT = 30
+DEFAULT_STALL_SECONDS = 20
+DEFAULT_RECONNECT_GRACE = 30
+
+
+class HealthWatchdog:
+    def __init__(self, rtt_timeout=DEFAULT_RTT_TIMEOUT, stall_seconds=DEFAULT_STALL_SECONDS,
+                 reconnect_grace=DEFAULT_RECONNECT_GRACE, clock=time.monotonic):
+        self.rtt_timeout = rtt_timeout
+        self.stall_seconds = stall_seconds
+        self.reconnect_grace = reconnect_grace
+        self.clock = clock
+        now = clock()
+        self.last_rtt = now
+        self.last_rx = now
+        self.last_rx_growth = now
+        self.last_rx_bytes = None
+        self.down_since = None
+
+    def observe_state(self, state):
+        if state == "CONNECTED":
+            self.down_since = None
+        elif self.down_since is None:
+            self.down_since = self.clock()
+
+    def check(self, sample):
+        # Reason to fail over, or None while the tunnel looks healthy
+        now = self.clock()
+        if sample.rtt is not None:
+            self.last_rtt = now
+        if sample.rx_bytes != self.last_rx_bytes:
+            self.last_rx_growth = now
+        if sample.rx_bytes != self.last_rx_bytes or sample.tx_rate == 0:
+            # Receiving, or not sending anything that would need an answer
+            self.last_rx = now
+        self.last_rx_bytes = sample.rx_bytes
+
+        if self.down_since is not None and now - self.down_since >= self.reconnect_grace:
+            return f"no tunnel for {now - self.down_since:.0f}s"
+        silent = now - max(self.last_rtt, self.last_rx_growth)
+        if silent >= self.rtt_timeout:
+            return f"no latency reply or incoming traffic for {silent:.0f}s"
+        if now - self.last_rx >= self.stall_seconds:
+            return f"traffic stalled for {now - self.last_rx:.0f}s"
+        return None
+
+
+class HotStandby:
+    def __init__(self, command, config_path, popen_kwargs=None, timeout=30):
+        self.command = command
+        self.config_path = config_path  # server -> patched config path
+        self.popen_kwargs = popen_kwargs or {}
+        self.timeout = timeout
+        self.candidates = []
+        self.session = None
+        self.server = None
+        self.lock = threading.Lock()
+
+    def start(self, candidates):
+        # Hold a handshake to the first candidate that completes one
+        self.stop()
+        with self.lock:
+            self.candidates = list(candidates)
+        self.open_next()
+
+    def open_next(self):
+        while True:
+            with self.lock:
+                if not self.candidates:
+                    return
+                server = self.candidates.pop(0)
+            try:
+                session = OpenVPNSession(
+                    self.command, self.config_path(server),
+                    popen_kwargs=self.popen_kwargs,
+                    connect_timeout=self.timeout,
+                    extra_args=RACE_ARGS
+                )
+            except (OSError, ValueError):
+                continue
+            session.on_failed = lambda reason: self.handle_lost(session)
+            session.on_exit = lambda code: self.handle_lost(session)
+            with self.lock:
+                self.session, self.server = session, server
+            try:
+                session.start()
+            except OSError:
+                self.handle_lost(session)
+            return
+
+    def handle_lost(self, session):
+        with self.lock:
+            if session is not self.session:
+                return
+            self.session = self.server = None
+        self.open_next()
+
+    def ready(self):
+        session = self.session
+        return self.server if session is not None and session.connected else None
+
+    def take(self):
+        # The standby's server if its handshake is up; stops the standby either way
+        server = self.ready()
+        self.stop()
+        return server
+
+    def stop(self, wait=False):
+        with self.lock:
+            session, self.session, self.server = self.session, None, None
+            self.candidates = []
+        if session is None:
+            return
+        if wait:
+            session.stop()
+        else:
+            threading.Thread(target=session.stop, daemon=True).start()